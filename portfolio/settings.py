@@ -1,7 +1,8 @@
 """
 Django settings for portfolio project.
 
-Generated by 'django-admin startproject' using Django 5.0.6.
+Generated by 'django-admin startproject' using Django 5.0.6. Runs on 5.0 and later;
+SQLite's IMMEDIATE transaction mode (below) is only set on Django 5.1+.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/topics/settings/
@@ -12,6 +13,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+
+import django
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -81,6 +84,27 @@ DATABASES = {
     }
 }
 
+# Take the write lock when a transaction starts, so a writer waits on busy_timeout
+# instead of failing with "database is locked" mid-transaction. The option needs
+# Django 5.1+ (the project was started on 5.0.6); older versions keep SQLite's
+# deferred transactions.
+if django.VERSION >= (5, 1):
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+
+# Run on every new SQLite connection (upload_excel.sqlite_tuning). busy_timeout (ms)
+# is how long a connection waits for a lock; synchronous=normal syncs less often
+# (durable in WAL mode except on power loss); cache_size in KiB when negative;
+# mmap_size in bytes. The journal mode is stored in the database file, so it is not
+# set here: switch a deployment's database to WAL, which lets readers keep reading
+# while an upload writes, once with `python manage.py sqlite_journal_mode wal`.
+# `python manage.py benchmark_sqlite_concurrency` compares profiles.
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'synchronous': 'normal',
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -127,3 +151,69 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Rows per INSERT when an upload writes its MutualFundData records in bulk
+MUTUAL_FUND_DATA_BATCH_SIZE = 500
+
+# "diff": an upload only updates changed holdings, inserts new ones and deletes exits
+# (keyed on ISIN + instrument type); "replace": delete all of the scheme's rows and reinsert
+MUTUAL_FUND_DATA_WRITE_MODE = 'diff'
+
+# Read uploads with the streaming openpyxl reader (stops at the "Grand Total" row);
+# set to False to fall back to pd.read_excel
+EXCEL_STREAMING_READER = True
+
+# Uploads are parsed by `python manage.py run_ingestion_worker`; number of uploads
+# it parses at once and seconds between polls of an empty queue
+INGESTION_WORKERS = 2
+INGESTION_POLL_INTERVAL = 2
+# Seconds after which a running job is taken to be left behind by a stopped worker;
+# a worker re-queues those when it starts. Keep it above the longest parse.
+INGESTION_STALE_AFTER = 1800
+
+# Same as Django's default upload handlers, but each upload is SHA-256 hashed as it
+# streams in so identical re-uploads of a scheme skip parsing
+FILE_UPLOAD_HANDLERS = [
+    'upload_excel.upload_handlers.HashingMemoryFileUploadHandler',
+    'upload_excel.upload_handlers.HashingTemporaryFileUploadHandler',
+]
+
+# Parsed holdings tables are cached per (file hash, read options, sheet) so re-processing
+# a workbook skips openpyxl; least recently used entries are evicted above the size limit.
+# `python manage.py parsed_sheet_cache --clear / --warm` manages it.
+# Entries are plain JSON (the sheet's cell values), never pickles, so reading one cannot run
+# code; they are still trusted as the sheet's contents, so keep the directory writable only
+# by this app and out of MEDIA_ROOT or any other upload location.
+PARSED_SHEET_CACHE = True
+PARSED_SHEET_CACHE_DIR = BASE_DIR / 'cache' / 'parsed_sheets'
+PARSED_SHEET_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# `python manage.py export_holdings` writes the snapshot holdings to Parquet, one file per
+# AMC and portfolio month, rewriting only partitions whose snapshots changed. It needs
+# pyarrow or fastparquet and stops with an error when neither is installed.
+# With ANALYTICS_EXPORT_AFTER_INGESTION the ingestion worker runs it whenever its queue drains.
+ANALYTICS_EXPORT_DIR = BASE_DIR / 'exports' / 'holdings'
+ANALYTICS_EXPORT_COMPRESSION = 'zstd'
+ANALYTICS_EXPORT_AFTER_INGESTION = False
+
+# Most rows /holdings/export.xlsx exports. A workbook has to be written in full before
+# the download starts, so larger exports are refused with a pointer to the CSV export,
+# which streams; `python manage.py dump_holdings out.xlsx` has no limit.
+HOLDINGS_EXPORT_XLSX_MAX_ROWS = 100000
+
+# NAVAll.txt that `python manage.py sync_amfi_schemes` reads AMCs and schemes from;
+# a local path to a saved copy works too (offline syncs and benchmarks)
+AMFI_NAV_SOURCE = 'https://www.amfiindia.com/spages/NAVAll.txt'
+
+# Ingestion progress (rows written per scheme, workbooks queued) and parse errors of
+# upload_excel go to the console; set the level to DEBUG to also see each sheet's summary
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'upload_excel': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
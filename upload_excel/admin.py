@@ -1,10 +1,10 @@
 from django.contrib import admin
-from.models import UploadedFile, AMC , MutualFundScheme , MutualFundData
+from.models import UploadedFile, AMC , MutualFundScheme , MutualFundData, IngestionJob, PortfolioSnapshot, Instrument, AmfiScheme, UploadEvent, HoldingExposure
 from django.utils.safestring import mark_safe
 # Register your models here.
 
 class UploadedFileAdmin(admin.ModelAdmin):
-    list_display = ('amc', 'scheme', 'file', 'category_total',  'display_top_sectors', 'display_top_holdings', 'created_at', 'update_logs')
+    list_display = ('amc', 'scheme', 'file', 'category_total',  'display_top_sectors', 'display_top_holdings', 'created_at')
 
     def display_top_sectors(self, obj):
         return mark_safe(f"<pre>{obj.top_sectors}</pre>") if obj.top_sectors else "No Data"
@@ -29,4 +29,45 @@ admin.site.register(MutualFundScheme, MutualFundSchemeAdmin)
 class MutualFundDataAdmin(admin.ModelAdmin):
     list_display = ('amc','scheme','instrument_type', 'instrument_name', 'industry_rating', 'quantity', 'market_value', 'isin', 'processed_at')
     list_filter = ('amc','scheme', 'processed_at')
-admin.site.register(MutualFundData, MutualFundDataAdmin)
\ No newline at end of file
+admin.site.register(MutualFundData, MutualFundDataAdmin)
+
+
+class IngestionJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'amc', 'scheme', 'status', 'progress', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status', 'amc')
+admin.site.register(IngestionJob, IngestionJobAdmin)
+
+
+class PortfolioSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('scheme', 'portfolio_date', 'amc', 'updated_at')
+    list_filter = ('amc', 'portfolio_date')
+admin.site.register(PortfolioSnapshot, PortfolioSnapshotAdmin)
+
+
+class InstrumentAdmin(admin.ModelAdmin):
+    list_display = ('isin', 'name', 'industry_rating')
+    search_fields = ('isin', 'name')
+admin.site.register(Instrument, InstrumentAdmin)
+
+
+class AmfiSchemeAdmin(admin.ModelAdmin):
+    list_display = ('scheme_code', 'scheme_name', 'isin_growth', 'isin_reinvestment', 'last_nav_date')
+    search_fields = ('scheme_name', 'isin_growth', 'isin_reinvestment')
+admin.site.register(AmfiScheme, AmfiSchemeAdmin)
+
+
+class UploadEventAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'scheme', 'outcome', 'rows_parsed', 'rows_written', 'queue_seconds', 'parse_seconds',
+                    'write_seconds', 'message')
+    list_filter = ('outcome', 'amc')
+    list_select_related = ('scheme',)
+    date_hierarchy = 'created_at'
+admin.site.register(UploadEvent, UploadEventAdmin)
+
+
+class HoldingExposureAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'label', 'key', 'scheme', 'amc', 'market_value', 'percentage_to_nav', 'holdings')
+    list_filter = ('kind', 'amc')
+    list_select_related = ('scheme', 'amc')
+    search_fields = ('key', 'label')
+admin.site.register(HoldingExposure, HoldingExposureAdmin)
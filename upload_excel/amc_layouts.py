@@ -0,0 +1,221 @@
+# amc_layouts.py
+
+import re
+from functools import lru_cache
+
+from .section_tagging import compile_sections
+
+# How each AMC lays out its monthly portfolio sheet. parse_portfolio_sheet() in
+# excel_processing runs every layout; onboarding an AMC means adding an entry here.
+#
+#   header_row      - 0-based row of the column headers, or None to use the first row
+#                     that contains the name column
+#   columns         - canonical column -> {
+#                         "aliases":  header names, the first one present is used,
+#                         "patterns": regexes tried (in sheet order) when no alias is present,
+#                         "convert":  "number" (non-numeric -> 0) or "percent" ("7.5%" -> 7.5),
+#                         "fill":     value for empty cells of an unconverted column,
+#                         "required": the sheet is rejected without this column,
+#                     }
+#                     Canonical columns: name, isin, industry, sector (grouped for the top
+#                     sectors, defaults to industry), quantity, market_value, nav, yield, ytc.
+#   sections        - (kind, keyword, category) rules on the lowercased name, first match
+#                     wins (kinds: startswith, contains, exact, word)
+#   passthrough     - section headers that do not change the current category
+#   terminators     - (kind, keyword) rules for the row where the holdings table ends
+#   holdings        - "isin_rows": non-header, non-total rows with an ISIN;
+#                     "all_rows": every row of the table, section headers included
+#   skip_names      - rows whose name contains one of these are neither holdings nor totals
+#   totals          - how "... Total" rows feed the category totals: "sum" adds every one,
+#                     "once_per_block" adds a category once per block of holdings
+#                     (initial_totals: categories already counted before the first block),
+#                     None ignores them
+#   header_totals   - categories whose total is the market value on their section header
+#                     row (the last one wins); "all" for every section category
+#   category_total  - output key -> categories added up in that order; None reports every
+#                     section category
+#   lowercase_names - store instrument names lowercased
+#   top_holding_names - "stored" names, or the "original" cell text
+AMC_LAYOUTS = {
+    "JM Financial Mutual Fund": {
+        "header_row": 3,
+        "columns": {
+            "name": {"aliases": ["Name of the Instruments"]},
+            "isin": {"aliases": ["ISIN"], "fill": ''},
+            "industry": {"aliases": ["Industry/Rating"]},
+            "quantity": {"aliases": ["Quantity", "Quantity/Face Value"], "convert": "number"},
+            "market_value": {"aliases": ["Market Value (Rs. In Lakhs)"], "convert": "number"},
+            "nav": {"aliases": ["% age to NAV"], "fill": 0},
+            "yield": {"aliases": ["Yield %"], "convert": "percent"},
+            "ytc": {"aliases": ["^YTC (AT1/Tier 2 bonds)"]},
+        },
+        "sections": [
+            ("startswith", "equity", "Equity"),
+            ("startswith", "debt", "Debt"),
+            ("contains", "triparty repo", "Reverse Repo/Corporate"),
+            ("startswith", "money market", "Money Market"),
+            ("startswith", "government securities", "Government Securities"),
+            ("startswith", "cash & cash equivalents", "Cash & Cash Equivalents"),
+            ("contains", "reverse repo", "Reverse Repo/Corporate"),
+            ("contains", "corporate debt repo", "Reverse Repo/Corporate"),
+            ("startswith", "alternative investment", "Alternative Investment Funds Units"),
+            ("startswith", "net current assets", "Net Current Assets"),
+            ("startswith", "other", "Others"),
+        ],
+        "passthrough": ["Net Current Assets"],
+        "terminators": [("startswith", "grand total"), ("startswith", "net assets")],
+        "holdings": "isin_rows",
+        "skip_names": ["subtotal"],
+        "totals": "once_per_block",
+        "initial_totals": [
+            'Equity', 'Debt', 'Money Market', 'Cash & Cash Equivalents', 'Government Securities',
+            'Alternative Investment Funds Units', 'Reverse Repo/Corporate', 'Net Current AssetsOthers',
+        ],
+        "header_totals": ["Net Current Assets"],
+        "category_total": {
+            'Equity': ['Equity'],
+            'Debt': ['Debt'],
+            'Others': ['Money Market', 'Others', 'Reverse Repo/Corporate', 'Alternative Investment Funds Units',
+                       'Net Current Assets', 'Government Securities', 'Cash & Cash Equivalents'],
+            'Total Market Value': ['Equity', 'Debt', 'Money Market', 'Cash & Cash Equivalents',
+                                   'Reverse Repo/Corporate', 'Net Current Assets',
+                                   'Alternative Investment Funds Units', 'Government Securities', 'Others'],
+        },
+        "lowercase_names": True,
+        "top_holding_names": "stored",
+    },
+    "SBI Mutual Fund": {
+        "header_row": 5,
+        "columns": {
+            "name": {"aliases": ["Name of the Instrument / Issuer"]},
+            "isin": {"aliases": ["ISIN"], "fill": ''},
+            "industry": {"aliases": ["Industry / Rating"]},
+            "sector": {"aliases": ["Rating / Industry^"]},
+            "quantity": {"aliases": ["Quantity", "Quantity/Face Value"], "convert": "number", "required": True},
+            "market_value": {"aliases": ["Market value (Rs. in Lakhs)"], "patterns": [r"(?i)market value"],
+                             "convert": "number", "required": True},
+            "nav": {"aliases": ["% to AUM"], "convert": "number", "required": True},
+            "yield": {"aliases": ["YTM %"], "convert": "number", "required": True},
+            "ytc": {"aliases": ["YTC %##"], "fill": 0},
+        },
+        "sections": [
+            ("startswith", "equity", "Equity"),
+            ("startswith", "debt", "Debt"),
+            ("startswith", "money market", "Money Market"),
+            ("startswith", "other", "Others"),
+        ],
+        "passthrough": [],
+        "terminators": [("startswith", "grand total")],
+        "holdings": "isin_rows",
+        "skip_names": [],
+        "totals": "sum",
+        "header_totals": [],
+        "category_total": {
+            'Equity': ['Equity'],
+            'Debt': ['Debt'],
+            'Money Market': ['Money Market'],
+            'Others': ['Others'],
+            'Total Market Value': ['Equity', 'Debt', 'Others', 'Money Market'],
+        },
+        "lowercase_names": False,
+        "top_holding_names": "stored",
+    },
+    "ICICI Prudential Mutual Fund": {
+        "header_row": 3,
+        "columns": {
+            "name": {"aliases": ["Company/Issuer/Instrument Name"]},
+            "isin": {"aliases": ["ISIN"], "fill": ''},
+            "industry": {"aliases": ["Industry / Rating"]},
+            "sector": {"aliases": ["Industry/Rating"]},
+            "quantity": {"aliases": ["Quantity", "Quantity/Face Value"], "convert": "number", "required": True},
+            "market_value": {"patterns": [r"(?i)Exposure/Market\s?Value\(Rs\.Lakh\)"],
+                             "convert": "number", "required": True},
+            "nav": {"aliases": ["% to Nav"], "convert": "number", "required": True},
+            "yield": {"aliases": ["Yield of the instrument"], "convert": "number", "required": True},
+            "ytc": {"aliases": ["Yield to Call @"], "fill": 0},
+        },
+        # Matched rows are still stored as holdings, they only switch the current category.
+        "sections": [
+            ("word", "equity & equity related instruments", "Equity"),
+            ("startswith", "debt ", "Debt"),
+            ("word", "money market", "Money Market"),
+            ("exact", "reverse repo", "Reverse Repo"),
+            ("word", "treps", "Treps"),
+            ("startswith", "gold ", "Gold"),
+            ("exact", "units of real estate investment trust (reits)", "Units of Real Estate Investment Trust (REITs)"),
+            ("exact", "units of an alternative investment fund (aif)", "Units of an Alternative Investment Fund (AIF)"),
+            ("word", "net current assets", "Net Current Assets"),
+            ("word", "others", "Others"),
+            ("word", "units of mutual funds", "Units of Mutual Funds"),
+        ],
+        "passthrough": [],
+        "terminators": [("contains", "total net assets")],
+        "holdings": "all_rows",
+        "skip_names": [],
+        "totals": None,
+        "header_totals": "all",
+        "category_total": None,
+        "lowercase_names": True,
+        "top_holding_names": "original",
+    },
+}
+
+COLUMN_DEFAULTS = {
+    'name': '', 'isin': '', 'industry': '', 'quantity': 0, 'market_value': 0,
+    'nav': 0, 'yield': None, 'ytc': None,
+}
+
+
+@lru_cache(maxsize=None)
+def compile_layout(amc_name):
+    """
+    The AMC's layout with everything the parser needs precomputed, or None if the
+    AMC has no layout. Compiled once per process.
+    """
+    spec = AMC_LAYOUTS.get(amc_name)
+    if spec is None:
+        return None
+
+    columns = {}
+    usecols = []
+    for key, column in spec['columns'].items():
+        column = {
+            'aliases': list(column.get('aliases', [])),
+            'patterns': [re.compile(pattern) for pattern in column.get('patterns', [])],
+            'convert': column.get('convert'),
+            'fill': column.get('fill'),
+            'required': column.get('required', False),
+        }
+        columns[key] = column
+        usecols += column['aliases'] + column['patterns']
+
+    sections = tuple(tuple(rule) for rule in spec['sections'])
+    compile_sections(sections)  # warm the shared matcher cache
+
+    header_totals = spec.get('header_totals') or []
+    if header_totals == 'all':
+        header_totals = [category for _, _, category in sections]
+
+    return {
+        **spec,
+        'amc': amc_name,
+        'columns': columns,
+        'usecols': usecols,
+        'name_columns': columns['name']['aliases'],
+        'sections': sections,
+        'header_totals': set(header_totals),
+        'section_categories': list(dict.fromkeys(category for _, _, category in sections)),
+    }
+
+
+def resolve_columns(layout, df_columns):
+    """Canonical column -> the sheet's column for it (missing columns are left out)."""
+    resolved = {}
+    for key, column in layout['columns'].items():
+        name = next((alias for alias in column['aliases'] if alias in df_columns), None)
+        if name is None:
+            name = next((col for col in df_columns
+                         if any(pattern.match(col) for pattern in column['patterns'])), None)
+        if name is not None:
+            resolved[key] = name
+    return resolved
@@ -0,0 +1,159 @@
+# analytics_export.py
+
+import datetime
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+
+import pandas as pd
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .models import PortfolioSnapshot, SnapshotHolding
+
+MANIFEST = '_manifest.json'
+PARTITION_FILE = 'holdings.parquet'
+
+# Text columns are written dictionary-encoded (categoricals), which is what makes
+# repeated names, ISINs and ratings cheap in the files
+TEXT_COLUMNS = ['scheme_name', 'instrument_name', 'isin', 'industry_rating', 'instrument_type']
+
+
+def export_dir():
+    return str(getattr(settings, 'ANALYTICS_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'exports', 'holdings')))
+
+
+def export_compression():
+    """Parquet codec of the exported files (settings.ANALYTICS_EXPORT_COMPRESSION)."""
+    return getattr(settings, 'ANALYTICS_EXPORT_COMPRESSION', 'zstd')
+
+
+def export_after_ingestion():
+    """Whether run_ingestion_worker exports changed partitions once its queue drains."""
+    return getattr(settings, 'ANALYTICS_EXPORT_AFTER_INGESTION', False)
+
+
+def parquet_engine_available():
+    """pandas writes Parquet through pyarrow or fastparquet, neither of which is a hard dependency."""
+    return any(importlib.util.find_spec(name) for name in ('pyarrow', 'fastparquet'))
+
+
+def require_parquet_engine():
+    if not parquet_engine_available():
+        raise ImproperlyConfigured("Writing Parquet needs pyarrow or fastparquet (pip install pyarrow).")
+
+
+def partition_path(amc_id, month):
+    """Hive-style directory of a partition, so pandas/pyarrow read amc_id and month back as columns."""
+    return os.path.join(f'amc_id={amc_id}', f'month={month}')
+
+
+def partition_fingerprints(amc_ids=None):
+    """
+    (amc_id, month) -> fingerprint of the snapshots in that partition. A snapshot is re-stamped
+    (updated_at) whenever its month is re-ingested, so a partition's fingerprint
+    changes exactly when one of its snapshots is added, rewritten or deleted.
+    """
+    snapshots = PortfolioSnapshot.objects.order_by('id')
+    if amc_ids:
+        snapshots = snapshots.filter(amc_id__in=amc_ids)
+    members = defaultdict(list)
+    for snapshot_id, amc_id, portfolio_date, updated_at in snapshots.values_list(
+            'id', 'amc_id', 'portfolio_date', 'updated_at'):
+        members[amc_id, portfolio_date.strftime('%Y-%m')].append(f'{snapshot_id}:{updated_at.isoformat()}')
+    return {partition: hashlib.sha256('|'.join(ids).encode()).hexdigest() for partition, ids in members.items()}
+
+
+def partition_frame(amc_id, month):
+    """The holdings of every snapshot in one partition, one column per field."""
+    year, number = (int(part) for part in month.split('-'))
+    start = datetime.date(year, number, 1)
+    end = datetime.date(year + number // 12, number % 12 + 1, 1)
+    rows = (SnapshotHolding.objects
+            .filter(snapshot__amc_id=amc_id, snapshot__portfolio_date__gte=start, snapshot__portfolio_date__lt=end)
+            .order_by('snapshot_id', 'id')
+            .values_list('snapshot__scheme_id', 'snapshot__scheme__scheme_name', 'snapshot__portfolio_date',
+                         'label__instrument_name', 'label__isin', 'label__industry_rating',
+                         'label__instrument_type', 'label__instrument_id', 'quantity', 'market_value',
+                         'percentage_to_nav', 'yield_percentage', 'ytc'))
+    df = pd.DataFrame.from_records(rows.iterator(chunk_size=2000), columns=[
+        'scheme_id', 'scheme_name', 'portfolio_date', 'instrument_name', 'isin', 'industry_rating',
+        'instrument_type', 'instrument_id', 'quantity', 'market_value', 'percentage_to_nav',
+        'yield_percentage', 'ytc'])
+    df['portfolio_date'] = pd.to_datetime(df['portfolio_date'])
+    df['instrument_id'] = df['instrument_id'].astype('Int64')
+    df['quantity'] = df['quantity'].astype('Int64')
+    for column in TEXT_COLUMNS:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def read_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST)) as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(root, manifest):
+    fd, tmp_path = tempfile.mkstemp(dir=root, suffix='.tmp')
+    with os.fdopen(fd, 'w') as tmp:
+        json.dump(manifest, tmp, indent=1, sort_keys=True)
+    os.replace(tmp_path, os.path.join(root, MANIFEST))
+
+
+def write_partition(root, path, df):
+    directory = os.path.join(root, path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False, compression=export_compression())
+        os.replace(tmp_path, os.path.join(directory, PARTITION_FILE))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def export_holdings(amc_ids=None, full=False, root=None):
+    """
+    Write the snapshot holdings as one Parquet file per (AMC, portfolio month)
+    under `root` (settings.ANALYTICS_EXPORT_DIR), skipping partitions whose
+    snapshots are unchanged since the last export (see partition_fingerprints)
+    and removing partitions whose snapshots are gone. `full` rewrites everything.
+
+    Returns {"written": [...], "unchanged": n, "removed": [...]}. Raises
+    ImproperlyConfigured, before touching `root`, when no Parquet engine is installed.
+    """
+    require_parquet_engine()
+    root = root or export_dir()
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root)  # path -> {"amc_id", "month", "fingerprint"}
+    fingerprints = partition_fingerprints(amc_ids)
+    report = {"written": [], "unchanged": 0, "removed": []}
+
+    current = set()
+    for (amc_id, month), fingerprint in sorted(fingerprints.items()):
+        path = partition_path(amc_id, month)
+        current.add(path)
+        if not full and manifest.get(path, {}).get('fingerprint') == fingerprint:
+            report["unchanged"] += 1
+            continue
+        write_partition(root, path, partition_frame(amc_id, month))
+        manifest[path] = {'amc_id': amc_id, 'month': month, 'fingerprint': fingerprint}
+        write_manifest(root, manifest)  # after every partition, so an interrupted run resumes
+        report["written"].append(path)
+
+    for path in sorted(set(manifest) - current):
+        if amc_ids and manifest[path]['amc_id'] not in amc_ids:
+            continue
+        shutil.rmtree(os.path.join(root, path), ignore_errors=True)
+        del manifest[path]
+        report["removed"].append(path)
+    write_manifest(root, manifest)
+    return report
@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class UploadExcelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'upload_excel'
+
+    def ready(self):
+        from .sqlite_tuning import apply_pragmas
+        connection_created.connect(apply_pragmas, dispatch_uid='upload_excel.sqlite_pragmas')
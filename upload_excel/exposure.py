@@ -0,0 +1,140 @@
+# exposure.py
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .holdings_api import InvalidQuery, parse_ids
+from .instruments import canonical_name
+from .models import HoldingExposure, MutualFundData
+
+
+def canonical_industry(text):
+    """Key of an industry/rating: case and spacing differences between AMCs' sheets do not matter."""
+    return ' '.join(str(text).split()).casefold()
+
+
+def exposure_rows(holdings):
+    """
+    Unsaved HoldingExposure rows of a MutualFundData queryset, from two GROUP BY
+    queries: per (scheme, ISIN), and per (scheme, industry/rating as printed),
+    merged on canonical_industry(). ISINs are named after their Instrument, and
+    rows with a blank industry take the Instrument's.
+    """
+    rows = []
+    for scheme_id, amc_id, isin, name, market_value, nav, count in (
+            holdings.exclude(Q(isin__isnull=True) | Q(isin=''))
+            .values('scheme_id', 'scheme__amc_id', 'isin')
+            .annotate(name=Coalesce(NullIf(Max('instrument__name'), Value('')), Max('instrument_name')),
+                      total=Sum('market_value'), nav=Sum('percentage_to_nav'), count=Count('id'))
+            .values_list('scheme_id', 'scheme__amc_id', 'isin', 'name', 'total', 'nav', 'count')):
+        rows.append(HoldingExposure(kind=HoldingExposure.ISIN, key=isin, label=(name or '')[:255], scheme_id=scheme_id,
+                                    amc_id=amc_id, market_value=market_value or 0, percentage_to_nav=nav,
+                                    holdings=count))
+
+    industries = {}
+    for scheme_id, amc_id, industry, market_value, nav, count in (
+            holdings.annotate(industry=Coalesce(NullIf('industry_rating', Value('')), F('instrument__industry_rating')))
+            .exclude(Q(industry__isnull=True) | Q(industry=''))
+            .values('scheme_id', 'scheme__amc_id', 'industry')
+            .annotate(total=Sum('market_value'), nav=Sum('percentage_to_nav'), count=Count('id'))
+            .values_list('scheme_id', 'scheme__amc_id', 'industry', 'total', 'nav', 'count')):
+        key = canonical_industry(industry)
+        if not key:
+            continue
+        row = industries.get((scheme_id, key))
+        if row is None:
+            industries[scheme_id, key] = HoldingExposure(
+                kind=HoldingExposure.INDUSTRY, key=key[:255], label=industry.strip()[:255], scheme_id=scheme_id,
+                amc_id=amc_id, market_value=market_value or 0, percentage_to_nav=nav, holdings=count)
+            continue
+        row.label = canonical_name(row.label, industry.strip()[:255])
+        row.market_value += market_value or 0
+        if nav is not None:
+            row.percentage_to_nav = (row.percentage_to_nav or 0) + nav
+        row.holdings += count
+    return rows + list(industries.values())
+
+
+def update_scheme_exposure(scheme_id, batch_size=500):
+    """Replace the scheme's HoldingExposure rows with ones built from its current holdings. Returns the row count."""
+    rows = exposure_rows(MutualFundData.objects.filter(scheme_id=scheme_id))
+    with transaction.atomic():
+        HoldingExposure.objects.filter(scheme_id=scheme_id).delete()
+        HoldingExposure.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_exposure(scheme_ids=None, batch_size=500, schemes_per_pass=200):
+    """
+    Rebuild the reverse index of `scheme_ids` (every scheme with holdings when
+    None), `schemes_per_pass` schemes per GROUP BY pass. Returns (schemes, rows written).
+    """
+    rebuild_all = scheme_ids is None
+    if rebuild_all:
+        scheme_ids = list(MutualFundData.objects.filter(scheme__isnull=False).order_by('scheme_id')
+                          .values_list('scheme_id', flat=True).distinct())
+    written = 0
+    with transaction.atomic():
+        if rebuild_all:
+            HoldingExposure.objects.all().delete()
+        for start in range(0, len(scheme_ids), schemes_per_pass):
+            chunk = scheme_ids[start:start + schemes_per_pass]
+            rows = exposure_rows(MutualFundData.objects.filter(scheme_id__in=chunk))
+            if not rebuild_all:
+                HoldingExposure.objects.filter(scheme_id__in=chunk).delete()
+            HoldingExposure.objects.bulk_create(rows, batch_size=batch_size)
+            written += len(rows)
+    return len(scheme_ids), written
+
+
+def exposure(kind, key, amc_ids=(), scheme_ids=()):
+    """
+    Aggregated exposure of the schemes (optionally only those of `amc_ids` /
+    `scheme_ids`) to one ISIN or industry, read in one lookup on exposure_key_amc_idx:
+
+        {"kind", "key", "label", "market_value", "schemes", "holdings",
+         "amcs": [{"amc_id", "amc_name", "market_value", "schemes"}],
+         "by_scheme": [{"scheme_id", "scheme_name", "amc_id", "market_value", "percentage_to_nav", "holdings"}]}
+
+    AMCs and schemes are largest market value first. % to NAV is per scheme
+    only, in the units the AMC's sheet uses.
+    """
+    key = key.strip().upper() if kind == HoldingExposure.ISIN else canonical_industry(key)
+    rows = HoldingExposure.objects.filter(kind=kind, key=key)
+    if amc_ids:
+        rows = rows.filter(amc_id__in=amc_ids)
+    if scheme_ids:
+        rows = rows.filter(scheme_id__in=scheme_ids)
+
+    result = {"kind": kind, "key": key, "label": "", "market_value": 0, "schemes": 0, "holdings": 0,
+              "amcs": [], "by_scheme": []}
+    amcs = {}
+    for scheme_id, scheme_name, amc_id, amc_name, label, market_value, nav, holdings in rows.values_list(
+            'scheme_id', 'scheme__scheme_name', 'amc_id', 'amc__name', 'label', 'market_value', 'percentage_to_nav',
+            'holdings'):
+        result["label"] = canonical_name(result["label"], label)
+        result["market_value"] += market_value
+        result["schemes"] += 1
+        result["holdings"] += holdings
+        amc = amcs.setdefault(amc_id, {"amc_id": amc_id, "amc_name": amc_name, "market_value": 0, "schemes": 0})
+        amc["market_value"] += market_value
+        amc["schemes"] += 1
+        result["by_scheme"].append({"scheme_id": scheme_id, "scheme_name": scheme_name, "amc_id": amc_id,
+                                    "market_value": round(market_value, 2), "percentage_to_nav": nav,
+                                    "holdings": holdings})
+    result["market_value"] = round(result["market_value"], 2)
+    for amc in amcs.values():
+        amc["market_value"] = round(amc["market_value"], 2)
+    result["amcs"] = sorted(amcs.values(), key=lambda amc: amc["market_value"], reverse=True)
+    result["by_scheme"].sort(key=lambda row: row["market_value"], reverse=True)
+    return result
+
+
+def exposure_query(params):
+    """exposure() of a QueryDict: exactly one of isin and industry, plus repeatable amc and scheme ids."""
+    given = [kind for kind in (HoldingExposure.ISIN, HoldingExposure.INDUSTRY) if params.get(kind, '').strip()]
+    if len(given) != 1:
+        raise InvalidQuery("Give exactly one of isin and industry.")
+    return exposure(given[0], params[given[0]], amc_ids=parse_ids(params, 'amc'),
+                    scheme_ids=parse_ids(params, 'scheme'))
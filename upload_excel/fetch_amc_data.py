@@ -37,46 +37,281 @@
 #     print("AMC & Mutual Fund Schemes Updated in Database!")
 
 
+import datetime
+import logging
+import os
+from collections import namedtuple
+
 import requests
-from upload_excel.models import AMC, MutualFundScheme
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from upload_excel.models import AMC, AmfiScheme, AmfiSource, MutualFundScheme, NavHistory
 
 AMFI_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
 
-def fetch_mutual_fund_schemes():
-    response = requests.get(AMFI_URL)
-    if response.status_code == 200:
-        data = response.text.splitlines()
-        amc_schemes = {}
-        current_amc = None
-
-        for line in data:
-            line = line.strip()
-            if not line or "Open Ended Schemes" in line:
-                continue  # Skip empty lines and headers
-
-            # Identify AMC Names (non-numeric lines)
-            if not line[0].isdigit():  
-                current_amc = line.strip()
-                if current_amc not in amc_schemes:
-                    amc_schemes[current_amc] = []  # Initialize list for schemes
-            else:
-                # Extract scheme details safely
-                scheme_details = line.split(";")
-                if len(scheme_details) >= 4:  # Ensure enough fields exist
-                    scheme_name = scheme_details[3].strip()
-                    if scheme_name:  # Avoid empty scheme names
-                        amc_schemes[current_amc].append(scheme_name)
-
-        return amc_schemes
-    else:
-        print(" Failed to fetch data from AMFI.")
+logger = logging.getLogger(__name__)
+
+# One scheme line of NAVAll.txt, with the AMC and category headers above it
+NavRecord = namedtuple('NavRecord', 'amc category scheme_code isin_growth isin_reinvestment scheme_name nav nav_date')
+# Fields of a scheme line: code;ISIN growth;ISIN reinvestment;name;NAV;date
+NAVALL_FIELDS = 6
+
+
+def amfi_source():
+    """URL or local path of NAVAll.txt (settings.AMFI_NAV_SOURCE); a saved copy makes syncs work offline."""
+    return str(getattr(settings, 'AMFI_NAV_SOURCE', AMFI_URL))
+
+
+def is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def stream_response(response):
+    try:
+        response.encoding = response.encoding or 'utf-8'
+        yield from response.iter_lines(decode_unicode=True)
+    finally:
+        response.close()
+
+
+def stream_file(path):
+    with open(path, encoding='utf-8', errors='replace') as navall:
+        yield from navall
+
+
+def open_source(source=None, validators=None):
+    """
+    Start reading NAVAll.txt from a URL or a local file, line by line.
+
+    `validators` ({"etag", "last_modified"}) are those of the previous read: a
+    URL is requested conditionally with them and a file is compared on its
+    size and modification time. Returns (lines, validators), where lines is None
+    when the source has not changed. Download errors raise requests'
+    exceptions (OSError subclasses), as do unreadable files.
+    """
+    source = source or amfi_source()
+    validators = validators or {}
+    if is_url(source):
+        headers = {}
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+        response = requests.get(source, headers=headers, stream=True, timeout=60)
+        if response.status_code == 304:
+            response.close()
+            return None, validators
+        if response.status_code != 200:
+            response.close()
+            response.raise_for_status()
+            raise requests.HTTPError(f"Unexpected status {response.status_code}", response=response)
+        current = {'etag': response.headers.get('ETag', ''), 'last_modified': response.headers.get('Last-Modified', '')}
+        return stream_response(response), current
+
+    stat = os.stat(source)
+    current = {'etag': f'{stat.st_size}-{stat.st_mtime_ns}',
+               'last_modified': datetime.datetime.fromtimestamp(stat.st_mtime, datetime.timezone.utc).isoformat()}
+    if validators.get('etag') == current['etag']:
+        return None, validators
+    return stream_file(source), current
+
+
+def parse_nav(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None  # "N.A."
+
+
+def parse_nav_date(text):
+    try:
+        return datetime.datetime.strptime(text, '%d-%b-%Y').date()
+    except ValueError:
+        return None
+
+
+def iter_navall(lines):
+    """
+    NavRecords of the scheme lines of NAVAll.txt, in file order. The file is a
+    header line, then category lines ("Open Ended Schemes(...)") and AMC name
+    lines each followed by "code;ISIN growth;ISIN reinvestment;name;NAV;date" lines.
+    A scheme line is told apart by its NAVALL_FIELDS fields and numeric code, not
+    by a leading digit: AMC names such as "360 ONE Mutual Fund" start with one.
+    """
+    amc = category = None
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        fields = [field.strip() for field in line.split(';')]
+        if len(fields) == NAVALL_FIELDS and fields[0].isdigit():
+            if not fields[3] or amc is None:
+                continue
+            yield NavRecord(
+                amc=amc,
+                category=category or '',
+                scheme_code=int(fields[0]),
+                isin_growth='' if fields[1] == '-' else fields[1],
+                isin_reinvestment='' if fields[2] == '-' else fields[2],
+                scheme_name=fields[3],
+                nav=parse_nav(fields[4]),
+                nav_date=parse_nav_date(fields[5]),
+            )
+        elif ';' in line:
+            continue  # The column header
+        elif line.endswith(')') and 'Schemes' in line:
+            category = line
+        else:
+            amc = line
+
+
+def parse_schemes(records):
+    """AMC name -> scheme names, in file order."""
+    amc_schemes = {}
+    for record in records:
+        amc_schemes.setdefault(record.amc, []).append(record.scheme_name)
+    return amc_schemes
+
+
+def fetch_mutual_fund_schemes(source=None):
+    try:
+        lines, _ = open_source(source)
+    except OSError:
+        logger.warning("Failed to fetch data from AMFI.")
         return {}
+    return parse_schemes(iter_navall(lines))
+
+
+def sync_schemes(amc_data, batch_size=1000):
+    """
+    Insert the AMCs and schemes of `amc_data` (AMC name -> scheme names) that are not
+    stored yet. Existing names are loaded once and compared as sets, and only the
+    new rows are bulk-inserted, all in one transaction.
+
+    Returns {"amcs_added", "amcs_unchanged", "schemes_added", "schemes_unchanged"}.
+    """
+    amc_data = {amc_name: schemes for amc_name, schemes in amc_data.items() if amc_name}  # Ensure valid AMC names
+    with transaction.atomic():
+        amc_ids = dict(AMC.objects.values_list('name', 'id'))
+        new_amcs = [AMC(name=amc_name) for amc_name in amc_data if amc_name not in amc_ids]
+        AMC.objects.bulk_create(new_amcs, batch_size=batch_size, ignore_conflicts=True)
+        if new_amcs:
+            amc_ids.update(AMC.objects.filter(name__in=[amc.name for amc in new_amcs]).values_list('name', 'id'))
+
+        existing = set(MutualFundScheme.objects.filter(amc_id__in=[amc_ids[name] for name in amc_data])
+                       .values_list('amc_id', 'scheme_name'))
+        wanted = dict.fromkeys((amc_ids[amc_name], scheme)
+                               for amc_name, schemes in amc_data.items() for scheme in schemes)
+        new_schemes = [MutualFundScheme(amc_id=amc_id, scheme_name=scheme)
+                       for amc_id, scheme in wanted if (amc_id, scheme) not in existing]
+        MutualFundScheme.objects.bulk_create(new_schemes, batch_size=batch_size)
+
+    return {
+        "amcs_added": len(new_amcs),
+        "amcs_unchanged": len(amc_data) - len(new_amcs),
+        "schemes_added": len(new_schemes),
+        "schemes_unchanged": len(wanted) - len(new_schemes),
+    }
+
+
+AMFI_SCHEME_FIELDS = ['scheme', 'scheme_name', 'category', 'isin_growth', 'isin_reinvestment', 'last_nav_date']
+
 
-def save_amc_data():
-    amc_data = fetch_mutual_fund_schemes()
-    for amc_name, schemes in amc_data.items():
-        if amc_name:  # Ensure valid AMC names
-            amc_obj, created = AMC.objects.get_or_create(name=amc_name)
-            for scheme in schemes:
-                MutualFundScheme.objects.get_or_create(amc=amc_obj, scheme_name=scheme)
-    print(" AMC & Mutual Fund Schemes Updated in Database!")
+def refresh_amfi(source=None, force=False, batch_size=1000):
+    """
+    Read NAVAll.txt once, streaming, and store what it lists: new AMCs and schemes
+    (sync_schemes), every AMFI scheme code with its ISINs (AmfiScheme) and the NAVs
+    newer than the last one seen for each scheme code (NavHistory).
+
+    A source whose validators match the previous read is not read at all, unless
+    `force`. Returns the sync_schemes counts plus "not_modified", "amfi_schemes_saved",
+    "navs_added" and "navs_unchanged" (NAVs not newer than the stored ones).
+    """
+    source = source or amfi_source()
+    state = AmfiSource.objects.filter(source=source).first()
+    validators = None if force or state is None else {'etag': state.etag, 'last_modified': state.last_modified}
+    lines, validators = open_source(source, validators)
+    counts = {"not_modified": lines is None, "amcs_added": 0, "amcs_unchanged": 0, "schemes_added": 0,
+              "schemes_unchanged": 0, "amfi_schemes_saved": 0, "navs_added": 0, "navs_unchanged": 0}
+    if lines is None:
+        return counts
+
+    stored = {row[0]: row[1:] for row in AmfiScheme.objects.values_list('scheme_code', *(
+        'scheme_id' if field == 'scheme' else field for field in AMFI_SCHEME_FIELDS))}
+    amc_data, records, navs, last_date = {}, {}, [], None
+    for record in iter_navall(lines):
+        amc_data.setdefault(record.amc, []).append(record.scheme_name)
+        records[record.scheme_code] = record
+        previous = stored.get(record.scheme_code)
+        if record.nav_date is None or (previous and previous[-1] and record.nav_date <= previous[-1]):
+            counts["navs_unchanged"] += 1
+            continue
+        navs.append(NavHistory(amfi_scheme_id=record.scheme_code, nav_date=record.nav_date, nav=record.nav))
+        last_date = max(last_date or record.nav_date, record.nav_date)
+
+    with transaction.atomic():
+        counts.update(sync_schemes(amc_data, batch_size=batch_size))
+        scheme_ids = {}
+        for scheme_id, amc_name, scheme_name in (MutualFundScheme.objects.order_by('id')
+                                                 .values_list('id', 'amc__name', 'scheme_name')):
+            scheme_ids.setdefault((amc_name, scheme_name), scheme_id)
+
+        changed = []
+        for code, record in records.items():
+            previous = stored.get(code)
+            nav_date = record.nav_date
+            if previous and previous[-1] and (nav_date is None or previous[-1] > nav_date):
+                nav_date = previous[-1]
+            values = (scheme_ids.get((record.amc, record.scheme_name)), record.scheme_name, record.category,
+                      record.isin_growth, record.isin_reinvestment, nav_date)
+            if values != previous:
+                changed.append(AmfiScheme(scheme_code=code, **dict(zip(
+                    ['scheme_id'] + AMFI_SCHEME_FIELDS[1:], values))))
+        AmfiScheme.objects.bulk_create(changed, batch_size=batch_size, update_conflicts=True,
+                                       unique_fields=['scheme_code'], update_fields=AMFI_SCHEME_FIELDS)
+        NavHistory.objects.bulk_create(navs, batch_size=batch_size, ignore_conflicts=True)
+        AmfiSource.objects.update_or_create(source=source, defaults={
+            'etag': validators['etag'], 'last_modified': validators['last_modified'],
+            'last_nav_date': max(filter(None, [last_date, state and state.last_nav_date]), default=None),
+            'fetched_at': timezone.now()})
+
+    counts["amfi_schemes_saved"] = len(changed)
+    counts["navs_added"] = len(navs)
+    return counts
+
+
+def latest_navs(isins):
+    """
+    ISIN -> {"scheme_code", "scheme_name", "nav", "nav_date"} of the AMFI schemes whose
+    units carry those ISINs (growth or reinvestment), with their latest stored NAV.
+    Joins portfolio holdings of fund units to scheme codes and NAVs.
+    """
+    isins = [isin for isin in set(isins) if isin]
+    latest = NavHistory.objects.filter(amfi_scheme=OuterRef('pk')).order_by('-nav_date')
+    schemes = (AmfiScheme.objects.filter(Q(isin_growth__in=isins) | Q(isin_reinvestment__in=isins))
+               .annotate(nav=Subquery(latest.values('nav')[:1]), nav_date=Subquery(latest.values('nav_date')[:1]))
+               .values('scheme_code', 'scheme_name', 'isin_growth', 'isin_reinvestment', 'nav', 'nav_date'))
+    wanted = set(isins)
+    result = {}
+    for scheme in schemes:
+        for isin in (scheme.pop('isin_growth'), scheme.pop('isin_reinvestment')):
+            if isin in wanted:
+                result[isin] = scheme
+    return result
+
+
+def save_amc_data(source=None):
+    try:
+        counts = refresh_amfi(source)
+    except OSError:
+        logger.warning("Failed to fetch data from AMFI.")
+        return {}
+    if counts["not_modified"]:
+        logger.info("NAVAll.txt unchanged since the last refresh.")
+        return counts
+    logger.info("AMC & Mutual Fund Schemes Updated in Database! %d AMC(s) and %d scheme(s) added, %d AMC(s) and "
+                "%d scheme(s) unchanged; %d NAV(s) recorded.", counts['amcs_added'], counts['schemes_added'],
+                counts['amcs_unchanged'], counts['schemes_unchanged'], counts['navs_added'])
+    return counts
@@ -1,7 +1,21 @@
 from django import forms
-from .models import UploadedFile
+from .models import UploadedFile, AMC
 
 class UploadFileForm(forms.ModelForm):
     class Meta:
         model = UploadedFile
         fields = ['amc', 'scheme', 'file']
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A scheme keeps a single UploadedFile (uploadedfile_unique_scheme) whose file
+        # upload_file_view replaces, so validate against that record instead of a new one
+        scheme_id = str(self.data.get('scheme', '')) if self.is_bound else ''
+        if self.instance.pk is None and scheme_id.isdigit():
+            self.instance = UploadedFile.objects.filter(scheme_id=scheme_id).first() or self.instance
+
+
+class UploadWorkbookForm(forms.Form):
+    """A whole multi-sheet portfolio workbook of one AMC, one sheet per scheme."""
+    amc = forms.ModelChoiceField(queryset=AMC.objects.all())
+    file = forms.FileField()
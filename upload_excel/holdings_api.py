@@ -0,0 +1,145 @@
+# holdings_api.py
+
+import base64
+import json
+
+from django.db.models import Q
+
+from .models import MutualFundData
+
+# Columns a caller may ask for with ?fields=
+HOLDING_FIELDS = ['id', 'amc_id', 'scheme_id', 'instrument_name', 'isin', 'industry_rating', 'instrument_type',
+                  'quantity', 'market_value', 'percentage_to_nav', 'yield_percentage', 'ytc', 'processed_at']
+DEFAULT_FIELDS = ['id', 'scheme_id', 'instrument_name', 'isin', 'industry_rating', 'instrument_type',
+                  'quantity', 'market_value', 'percentage_to_nav']
+
+# Query parameter -> lookup; each may be repeated to match any of several values.
+# ISINs go through the Instrument table so the lookup uses mfdata_instrument_scheme_idx.
+FILTERS = {
+    'instrument_type': 'instrument_type',
+    'industry_rating': 'industry_rating',
+    'isin': 'instrument__isin',
+    'scheme': 'scheme_id',
+    'amc': 'amc_id',
+}
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+class InvalidQuery(ValueError):
+    """A query parameter that cannot be honoured; its message is returned to the caller."""
+
+
+def encode_cursor(market_value, pk):
+    return base64.urlsafe_b64encode(json.dumps([market_value, pk]).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(market_value, id) of the last row of the previous page."""
+    try:
+        market_value, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(pk, int) or not (market_value is None or isinstance(market_value, (int, float))):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise InvalidQuery("Invalid cursor.")
+    return market_value, pk
+
+
+def page_rows(holdings, cursor, columns, count):
+    """
+    Up to `count` rows of `holdings` after `cursor` ((market_value, id) or None) in
+    ORDER BY market_value DESC, id, with NULL market values last.
+
+    The cursor condition always includes market_value <= the cursor's value, so SQLite
+    starts the index scan at the cursor instead of filtering from the top; the NULL
+    rows are read once the valued ones run out.
+    """
+    rows = []
+    if cursor is None or cursor[0] is not None:
+        valued = holdings.filter(market_value__isnull=False)
+        if cursor is not None:
+            market_value, pk = cursor
+            valued = valued.filter(Q(market_value__lt=market_value) | Q(id__gt=pk), market_value__lte=market_value)
+        rows = list(valued.order_by('-market_value', 'id').values(*columns)[:count])
+        if len(rows) == count:
+            return rows
+        nulls = holdings.filter(market_value__isnull=True)
+    else:
+        nulls = holdings.filter(market_value__isnull=True, id__gt=cursor[1])
+    return rows + list(nulls.order_by('id').values(*columns)[:count - len(rows)])
+
+
+def parse_fields(value):
+    if not value:
+        return list(DEFAULT_FIELDS)
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in HOLDING_FIELDS]
+    if unknown:
+        raise InvalidQuery(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(HOLDING_FIELDS)}.")
+    return fields
+
+
+def parse_limit(value):
+    if not value:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidQuery("limit must be an integer.")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise InvalidQuery(f"limit must be between 1 and {MAX_LIMIT}.")
+    return limit
+
+
+def parse_ids(params, name):
+    """The ids given for a repeatable query parameter."""
+    values = [value for value in params.getlist(name) if value != '']
+    if not all(value.isdigit() for value in values):
+        raise InvalidQuery(f"{name} must be an id.")
+    return [int(value) for value in values]
+
+
+def filter_holdings(holdings, params, filters=FILTERS):
+    """`holdings` narrowed by the `filters` (query parameter -> lookup) given in `params` (a QueryDict)."""
+    for param, lookup in filters.items():
+        values = [value for value in params.getlist(param) if value != '']
+        if not values:
+            continue
+        if param in ('scheme', 'amc') and not all(value.isdigit() for value in values):
+            raise InvalidQuery(f"{param} must be an id.")
+        holdings = holdings.filter(**{f'{lookup}__in': values})
+    return holdings
+
+
+def holdings_page(params, scheme_id=None):
+    """
+    One page of MutualFundData rows, largest market value first, as
+    {"results": [...], "next_cursor": str or None, "limit": n}.
+
+    `params` is a QueryDict: fields, limit, cursor and the FILTERS. Pages are
+    keyset-paginated on (market_value, id), so every page is an index range
+    scan of mfdata_scheme_value_idx (one scheme), mfdata_amc_value_idx (one
+    AMC) or mfdata_value_idx, however deep the page.
+    """
+    fields = parse_fields(params.get('fields'))
+    limit = parse_limit(params.get('limit'))
+
+    holdings = MutualFundData.objects.all()
+    if scheme_id is not None:
+        holdings = holdings.filter(scheme_id=scheme_id)
+    holdings = filter_holdings(holdings, params)
+    cursor = decode_cursor(params['cursor']) if params.get('cursor') else None
+
+    # id and market_value are always read for the cursor, then dropped if not asked for
+    rows = page_rows(holdings, cursor, list(dict.fromkeys(fields + ['id', 'market_value'])), limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['market_value'], rows[-1]['id'])
+    extra = {'id', 'market_value'} - set(fields)
+    if extra:
+        for row in rows:
+            for field in extra:
+                del row[field]
+    return {"results": rows, "next_cursor": next_cursor, "limit": limit}
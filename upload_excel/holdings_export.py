@@ -0,0 +1,144 @@
+# holdings_export.py
+
+import csv
+import datetime
+import io
+
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from openpyxl import Workbook
+
+from .holdings_api import InvalidQuery, filter_holdings
+from .models import MutualFundData, PortfolioSnapshot, SnapshotHolding
+
+# (header, MutualFundData lookup, SnapshotHolding lookup) of every exported column, in file order.
+# id is the row's id in its own table; processed_at of a snapshot holding is when its month was last ingested.
+EXPORT_COLUMNS = [
+    ('id', 'id', 'id'),
+    ('amc', 'amc__name', 'snapshot__amc__name'),
+    ('scheme_id', 'scheme_id', 'snapshot__scheme_id'),
+    ('scheme', 'scheme__scheme_name', 'snapshot__scheme__scheme_name'),
+    ('portfolio_date', 'portfolio_date', 'snapshot__portfolio_date'),
+    ('instrument_name', 'instrument_name', 'label__instrument_name'),
+    ('isin', 'isin', 'label__isin'),
+    ('industry_rating', 'industry_rating', 'label__industry_rating'),
+    ('instrument_type', 'instrument_type', 'label__instrument_type'),
+    ('quantity', 'quantity', 'quantity'),
+    ('market_value', 'market_value', 'market_value'),
+    ('percentage_to_nav', 'percentage_to_nav', 'percentage_to_nav'),
+    ('yield_percentage', 'yield_percentage', 'yield_percentage'),
+    ('ytc', 'ytc', 'ytc'),
+    ('processed_at', 'processed_at', 'snapshot__updated_at'),
+]
+
+# The holdings API filters (holdings_api.FILTERS) on SnapshotHolding rows
+SNAPSHOT_FILTERS = {
+    'instrument_type': 'label__instrument_type',
+    'industry_rating': 'label__industry_rating',
+    'isin': 'label__isin',
+    'scheme': 'snapshot__scheme_id',
+    'amc': 'snapshot__amc_id',
+}
+
+CHUNK_SIZE = 2000
+XLSX_MAX_ROWS = 1048576  # rows per worksheet, header included; longer exports continue on a new sheet
+
+
+def xlsx_row_limit():
+    """Most rows the XLSX endpoint exports (settings.HOLDINGS_EXPORT_XLSX_MAX_ROWS); the command has no limit."""
+    return getattr(settings, 'HOLDINGS_EXPORT_XLSX_MAX_ROWS', 100000)
+
+
+def parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} must be a date (YYYY-MM-DD).")
+
+
+def export_queryset(params):
+    """
+    Holdings to export as value tuples in EXPORT_COLUMNS order, by id. `params`
+    (a QueryDict) takes the holdings API filters (amc, scheme, instrument_type,
+    industry_rating, isin) and date_from / date_to on the portfolio date.
+
+    Without dates these are the current MutualFundData rows, each with the date
+    of its scheme's latest snapshot. With either date they are the SnapshotHolding
+    rows of every stored month in the range, current or not.
+    """
+    date_from, date_to = parse_date(params, 'date_from'), parse_date(params, 'date_to')
+    if date_from is None and date_to is None:
+        latest = PortfolioSnapshot.objects.filter(scheme=OuterRef('scheme_id')).order_by('-portfolio_date')
+        holdings = (filter_holdings(MutualFundData.objects.all(), params)
+                    .annotate(portfolio_date=Subquery(latest.values('portfolio_date')[:1])))
+        return holdings.order_by('id').values_list(*[lookup for _, lookup, _ in EXPORT_COLUMNS])
+
+    holdings = filter_holdings(SnapshotHolding.objects.all(), params, SNAPSHOT_FILTERS)
+    if date_from:
+        holdings = holdings.filter(snapshot__portfolio_date__gte=date_from)
+    if date_to:
+        holdings = holdings.filter(snapshot__portfolio_date__lte=date_to)
+    return holdings.order_by('id').values_list(*[lookup for _, _, lookup in EXPORT_COLUMNS])
+
+
+def iter_rows(holdings):
+    """The header, then every row of `holdings`, read CHUNK_SIZE rows at a time."""
+    yield [header for header, _, _ in EXPORT_COLUMNS]
+    yield from holdings.iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_csv(holdings):
+    """`holdings` as CSV text, one piece of up to CHUNK_SIZE rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for count, row in enumerate(iter_rows(holdings), 1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_csv(holdings, file):
+    """Write `holdings` as CSV to a text file opened with newline=''. Returns the number of data rows written."""
+    writer = csv.writer(file)
+    written = -1  # the header
+    for row in iter_rows(holdings):
+        writer.writerow(row)
+        written += 1
+    return written
+
+
+def write_xlsx(holdings, file):
+    """
+    Write `holdings` to `file` (a path or binary file) as a write-only workbook:
+    openpyxl spools each sheet's rows to a temporary file instead of keeping the
+    cells in memory, but `file` is only written once every row is, so nothing can
+    be sent before then. Returns the number of data rows written.
+    """
+    workbook = Workbook(write_only=True)
+    rows = iter_rows(holdings)
+    header = next(rows)
+    sheet = None
+    written = 0
+    for row in rows:
+        if sheet is None or sheet_rows == XLSX_MAX_ROWS:
+            sheet = workbook.create_sheet(f"Holdings {len(workbook.worksheets) + 1}" if sheet else "Holdings")
+            sheet.append(header)
+            sheet_rows = 1
+        sheet.append(row)
+        sheet_rows += 1
+        written += 1
+    if sheet is None:
+        workbook.create_sheet("Holdings").append(header)
+    workbook.save(file)
+    return written
+
+
+def export_filename(file_format):
+    return f"holdings-{datetime.date.today():%Y%m%d}.{file_format}"
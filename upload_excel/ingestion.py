@@ -0,0 +1,226 @@
+# ingestion.py
+
+import logging
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import localdate
+
+from .exposure import update_scheme_exposure
+from .instruments import instrument_ids
+from .models import HoldingLabel, MutualFundData, PortfolioSnapshot, SnapshotHolding
+from .snapshots import LABEL_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Columns compared (and rewritten) when a scheme's holdings are diffed
+HOLDING_FIELDS = [
+    'amc_id', 'file_id', 'instrument_name', 'industry_rating', 'quantity', 'market_value',
+    'percentage_to_nav', 'isin', 'yield_percentage', 'ytc', 'instrument_type', 'instrument_id',
+]
+MODEL_FIELDS = {field.attname: field for field in MutualFundData._meta.concrete_fields}
+
+
+def get_batch_size():
+    """Rows per INSERT statement when writing MutualFundData (settings.MUTUAL_FUND_DATA_BATCH_SIZE)."""
+    return getattr(settings, 'MUTUAL_FUND_DATA_BATCH_SIZE', 500)
+
+
+def get_write_mode():
+    """
+    How a scheme's holdings are written (settings.MUTUAL_FUND_DATA_WRITE_MODE):
+    "diff" updates changed rows, inserts new ones and deletes exits; "replace"
+    deletes every row of the scheme and inserts the new ones.
+    """
+    return getattr(settings, 'MUTUAL_FUND_DATA_WRITE_MODE', 'diff')
+
+
+def comparable(field, value):
+    """
+    A field value as the database stores it, so parsed and stored rows compare
+    equal: prepared by the model field (quantities truncated to int, a NaN name
+    saved as 'nan'), with a NaN number stored as NULL.
+    """
+    if value is not None:
+        value = MODEL_FIELDS[field].get_prep_value(value)
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def holding_key(isin, instrument_type):
+    return (comparable('isin', isin) or '', comparable('instrument_type', instrument_type) or '')
+
+
+def replace_holdings(scheme, instruments, batch_size):
+    deleted_count, _ = MutualFundData.objects.filter(scheme=scheme).delete()
+    MutualFundData.objects.bulk_create(instruments, batch_size=batch_size)
+    return {"inserted": len(instruments), "updated": 0, "deleted": deleted_count, "unchanged": 0}
+
+
+def diff_holdings(scheme, instruments, batch_size):
+    """
+    Write `instruments` as a diff against the scheme's stored rows, keyed on
+    (ISIN, instrument_type). Rows sharing a key (e.g. the blank-ISIN section rows)
+    are paired up in order. Returns the number of inserted/updated/deleted/unchanged rows.
+    """
+    stored = defaultdict(list)
+    for row in MutualFundData.objects.filter(scheme=scheme).order_by('id').values('id', *HOLDING_FIELDS):
+        stored[holding_key(row['isin'], row['instrument_type'])].append(row)
+
+    to_create, to_update = [], []
+    unchanged = 0
+    for instrument in instruments:
+        existing = stored.get(holding_key(instrument.isin, instrument.instrument_type))
+        if not existing:
+            to_create.append(instrument)
+            continue
+        row = existing.pop(0)
+        if all(comparable(field, getattr(instrument, field)) == comparable(field, row[field])
+               for field in HOLDING_FIELDS):
+            unchanged += 1
+            continue
+        instrument.pk = row['id']
+        to_update.append(instrument)
+
+    exits = [row['id'] for rows in stored.values() for row in rows]
+    deleted_count = 0
+    for start in range(0, len(exits), batch_size):
+        count, _ = MutualFundData.objects.filter(id__in=exits[start:start + batch_size]).delete()
+        deleted_count += count
+
+    # bulk_update() skips auto_now, so stamp processed_at on the rewritten rows explicitly
+    update_fields = [field.removesuffix('_id') for field in HOLDING_FIELDS] + ['processed_at']
+    processed_at = MutualFundData._meta.get_field('processed_at')
+    for instrument in to_update:
+        processed_at.pre_save(instrument, add=False)
+    MutualFundData.objects.bulk_update(to_update, update_fields, batch_size=batch_size)
+    MutualFundData.objects.bulk_create(to_create, batch_size=batch_size)
+
+    return {"inserted": len(to_create), "updated": len(to_update), "deleted": deleted_count, "unchanged": unchanged}
+
+
+def label_key(instrument):
+    return tuple(comparable(field, getattr(instrument, field)) or '' for field in LABEL_FIELDS)
+
+
+def resolve_labels(keys, batch_size, isin_ids=None):
+    """HoldingLabel id of every label key (creating the missing labels, linked to their Instrument via `isin_ids`)."""
+    keys = set(keys)
+    ids = {}
+
+    def fetch(names):
+        names = list(names)
+        for start in range(0, len(names), batch_size):
+            rows = HoldingLabel.objects.filter(instrument_name__in=names[start:start + batch_size])
+            for row in rows.values_list('id', *LABEL_FIELDS):
+                if row[1:] in keys:
+                    ids[row[1:]] = row[0]
+
+    fetch({key[0] for key in keys})
+    missing = keys - ids.keys()
+    if missing:
+        isin_ids = isin_ids or {}
+        HoldingLabel.objects.bulk_create(
+            [HoldingLabel(**dict(zip(LABEL_FIELDS, key)), instrument_id=isin_ids.get(key[1])) for key in missing],
+            batch_size=batch_size, ignore_conflicts=True)
+        fetch({key[0] for key in missing})
+    return ids
+
+
+def link_instruments(instruments, batch_size):
+    """Point each row with an ISIN at its Instrument. Returns ISIN -> Instrument id."""
+    ids = instrument_ids(((comparable('isin', instrument.isin), instrument.instrument_name, instrument.industry_rating)
+                          for instrument in instruments), batch_size)
+    for instrument in instruments:
+        instrument.instrument_id = ids.get(comparable('isin', instrument.isin))
+    return ids
+
+
+def save_snapshot(scheme, instruments, uploaded_file, portfolio_date, summary, batch_size, isin_ids=None):
+    """Store `instruments` and the summary as the scheme's snapshot for `portfolio_date`, replacing it if present."""
+    snapshot, _ = PortfolioSnapshot.objects.update_or_create(
+        scheme=scheme, portfolio_date=portfolio_date,
+        defaults={'amc_id': scheme.amc_id, 'uploaded_file': uploaded_file, **summary},
+    )
+    SnapshotHolding.objects.filter(snapshot=snapshot).delete()
+
+    keys = [label_key(instrument) for instrument in instruments]
+    labels = resolve_labels(keys, batch_size, isin_ids)
+    SnapshotHolding.objects.bulk_create([
+        SnapshotHolding(
+            snapshot=snapshot,
+            label_id=labels[key],
+            quantity=instrument.quantity,
+            market_value=instrument.market_value,
+            percentage_to_nav=instrument.percentage_to_nav,
+            yield_percentage=instrument.yield_percentage,
+            ytc=instrument.ytc,
+        )
+        for key, instrument in zip(keys, instruments)
+    ], batch_size=batch_size)
+    return snapshot
+
+
+def save_scheme_holdings(scheme, instruments, uploaded_file=None, category_total=None,
+                         top_sectors=None, top_holdings=None, batch_size=None, portfolio_date=None, source=None,
+                         category_sums=None):
+    """
+    Store `instruments` as the scheme's snapshot for `portfolio_date` and, unless a
+    later month is already stored, as its current MutualFundData rows,
+    HoldingExposure rows and UploadedFile summary. All in one transaction.
+
+    A sheet that states no date replaces the scheme's latest snapshot (today's when
+    it has none), so re-uploading it never adds a snapshot per day.
+
+    `source` holds the UploadedFile fields of the file the holdings were read from
+    (file, sheet_name, file_hash); they are set on `uploaded_file` only when the
+    holdings become the current ones, so an older month never moves it backwards.
+    The snapshot keeps the `category_sums` its category_total was built from, so
+    summaries can be rebuilt from the stored rows (see summaries).
+
+    The current rows are written as a diff against the stored rows, or by
+    delete-and-reinsert (see get_write_mode()). Either everything happens or
+    nothing does, so a failed upload never leaves a scheme half written.
+
+    Returns the number of inserted, updated, deleted and unchanged current rows
+    and the snapshot's portfolio date.
+    """
+    batch_size = batch_size or get_batch_size()
+    summary = {key: value for key, value in [('category_total', category_total), ('top_sectors', top_sectors),
+                                             ('top_holdings', top_holdings), ('category_sums', category_sums)]
+               if value is not None}
+
+    with transaction.atomic():
+        if portfolio_date is None:
+            portfolio_date = (PortfolioSnapshot.objects.filter(scheme=scheme).order_by('-portfolio_date')
+                              .values_list('portfolio_date', flat=True).first()) or localdate()
+        ids = link_instruments(instruments, batch_size)
+        save_snapshot(scheme, instruments, uploaded_file, portfolio_date, summary, batch_size, ids)
+        latest_date = PortfolioSnapshot.objects.filter(scheme=scheme).latest().portfolio_date
+        if latest_date > portfolio_date:
+            logger.info("Stored the %s snapshot of %s; current holdings are from %s and stay as they are",
+                        portfolio_date, scheme.scheme_name, latest_date)
+            return {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0,
+                    "portfolio_date": portfolio_date.isoformat()}
+
+        if get_write_mode() == 'replace':
+            changes = replace_holdings(scheme, instruments, batch_size)
+        else:
+            changes = diff_holdings(scheme, instruments, batch_size)
+        logger.info("Holdings of %s: %d inserted, %d updated, %d deleted, %d unchanged", scheme.scheme_name,
+                    changes['inserted'], changes['updated'], changes['deleted'], changes['unchanged'])
+        update_scheme_exposure(scheme.id, batch_size)
+
+        if uploaded_file:
+            uploaded_file.category_total = category_total
+            uploaded_file.top_sectors = top_sectors
+            uploaded_file.top_holdings = top_holdings
+            for field, value in (source or {}).items():
+                setattr(uploaded_file, field, value)
+            uploaded_file.save(update_fields=['category_total', 'top_sectors', 'top_holdings', *(source or {})])
+
+    changes["portfolio_date"] = portfolio_date.isoformat()
+    return changes
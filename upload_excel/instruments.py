@@ -0,0 +1,77 @@
+# instruments.py
+
+from django.db import transaction
+
+from .models import Instrument
+
+# ISIN -> (Instrument id, stored name), shared by every ingestion in this process.
+# Instruments are never re-keyed or deleted, so ids stay valid; entries are only
+# added or renamed once committed.
+_instruments = {}
+
+
+def clear_instrument_cache():
+    _instruments.clear()
+
+
+def canonical_name(current, candidate):
+    """Prefer an as-printed (mixed case) name over a lowercased one."""
+    if not current:
+        return candidate
+    if current == current.lower() and candidate and candidate != candidate.lower():
+        return candidate
+    return current
+
+
+def instrument_ids(records, batch_size=500):
+    """
+    Instrument id of every ISIN in `records` ((isin, name, industry_rating) tuples),
+    creating the instruments not seen before and renaming those whose stored name
+    canonical_name() gives up for the sheet's. Cached ISINs cost no query; the rest
+    take one query per batch, plus one insert and one re-read for new instruments,
+    and renamed ones one bulk update per batch.
+
+    Instruments are never deleted: the table keeps every ISIN ever ingested.
+    """
+    seen = {}
+    for isin, name, industry_rating in records:
+        if not isin:
+            continue
+        if isin in seen:
+            seen[isin] = (canonical_name(seen[isin][0], name), seen[isin][1] or industry_rating)
+        else:
+            seen[isin] = (name, industry_rating)
+    if not seen:
+        return {}
+
+    def fetch(isins):
+        found = {}
+        for start in range(0, len(isins), batch_size):
+            found.update((isin, (id, name)) for isin, id, name in Instrument.objects.filter(
+                isin__in=isins[start:start + batch_size]).values_list('isin', 'id', 'name'))
+        return found
+
+    known = {isin: _instruments[isin] for isin in seen if isin in _instruments}
+    uncached = [isin for isin in seen if isin not in known]
+    if uncached:
+        known.update(fetch(uncached))
+    missing = [isin for isin in uncached if isin not in known]
+    if missing:
+        Instrument.objects.bulk_create(
+            [Instrument(isin=isin, name=seen[isin][0] or '', industry_rating=seen[isin][1] or '')
+             for isin in missing],
+            batch_size=batch_size, ignore_conflicts=True)
+        known.update(fetch(missing))
+
+    renamed = []
+    for isin, (id, name) in known.items():
+        better = canonical_name(name, seen[isin][0] or '')
+        if better != name:
+            renamed.append(Instrument(id=id, name=better))
+            known[isin] = (id, better)
+    if renamed:
+        Instrument.objects.bulk_update(renamed, ['name'], batch_size=batch_size)
+
+    # A rolled back ingestion must not leave ids or names that were never stored
+    transaction.on_commit(lambda: _instruments.update(known))
+    return {isin: id for isin, (id, _) in known.items()}
@@ -0,0 +1,190 @@
+# jobs.py
+
+import datetime
+import functools
+import time
+import traceback
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.timezone import now
+
+from .excel_processing import process_amc_excel_file
+from .ingestion import save_scheme_holdings
+from .models import IngestionJob, UploadEvent, UploadedFile
+from .upload_events import record_upload_event, timed_writer
+from .upload_handlers import file_content_hash
+
+
+# IngestionJob.progress once each step of run_job() is done
+PROGRESS_CLAIMED = 5
+PROGRESS_READ = 20  # file opened and hashed
+PROGRESS_PARSED = 60  # holdings and summary parsed, about to be written
+PROGRESS_WRITTEN = 95
+PROGRESS_DONE = 100
+
+
+def get_worker_count():
+    """Uploads parsed at the same time by run_ingestion_worker (settings.INGESTION_WORKERS)."""
+    return getattr(settings, 'INGESTION_WORKERS', 2)
+
+
+def get_poll_interval():
+    """Seconds the worker waits between polls of an empty queue (settings.INGESTION_POLL_INTERVAL)."""
+    return getattr(settings, 'INGESTION_POLL_INTERVAL', 2)
+
+
+def get_stale_after():
+    """
+    Seconds after which a running job is taken to be left behind by a stopped worker
+    and is put back in the queue when a worker starts (settings.INGESTION_STALE_AFTER).
+    """
+    return getattr(settings, 'INGESTION_STALE_AFTER', 1800)
+
+
+def store_upload(file):
+    """Save an uploaded file where UploadedFile.file keeps its files and return its storage name."""
+    upload_to = UploadedFile._meta.get_field('file').generate_filename(None, file.name)
+    return default_storage.save(upload_to, file)
+
+
+def enqueue_upload(amc, scheme, uploaded_file, file_hash=None, file_name=None, sheet_name=''):
+    """
+    Queue the stored upload of `scheme` for parsing and return the IngestionJob.
+    The job parses sheet `sheet_name` (default: the first) of `file_name`
+    (default: the file `uploaded_file` points at now).
+    """
+    return IngestionJob.objects.create(amc=amc, scheme=scheme, uploaded_file=uploaded_file,
+                                       file_name=file_name or uploaded_file.file.name, sheet_name=sheet_name,
+                                       file_hash=file_hash)
+
+
+def pending_upload(scheme, file_hash):
+    """The scheme's latest job if it is still queued or running and parses a file with this hash, else None."""
+    job = IngestionJob.objects.filter(scheme=scheme).order_by('-id').first()
+    if (job and job.status in (IngestionJob.QUEUED, IngestionJob.RUNNING) and not job.sheet_name
+            and job.file_hash == file_hash):
+        return job
+    return None
+
+
+def claim_next_job():
+    """
+    Mark the oldest queued job as running and return its id, or None if the queue is empty.
+
+    The status check is part of the UPDATE, so two pollers can never claim the same job.
+    """
+    while True:
+        job_id = (IngestionJob.objects.filter(status=IngestionJob.QUEUED)
+                  .order_by('id').values_list('id', flat=True).first())
+        if job_id is None:
+            return None
+        claimed = IngestionJob.objects.filter(id=job_id, status=IngestionJob.QUEUED).update(
+            status=IngestionJob.RUNNING, progress=PROGRESS_CLAIMED, started_at=now())
+        if claimed:
+            return job_id
+
+
+def requeue_stale_jobs(stale_after=None):
+    """
+    Put jobs left running by a worker that was stopped back in the queue: those
+    started more than `stale_after` seconds ago (default: get_stale_after()).
+    Jobs another worker is still running are left alone.
+    """
+    stale_after = get_stale_after() if stale_after is None else stale_after
+    return IngestionJob.objects.filter(
+        status=IngestionJob.RUNNING, started_at__lt=now() - datetime.timedelta(seconds=stale_after),
+    ).update(status=IngestionJob.QUEUED, progress=0, started_at=None)
+
+
+def fail_job(job_id, error):
+    """Mark a job failed from outside its worker, e.g. when the worker process died."""
+    return IngestionJob.objects.filter(id=job_id).update(
+        status=IngestionJob.FAILED, error=error, progress=PROGRESS_DONE, finished_at=now())
+
+
+def record_progress(job, progress):
+    """Store a job's progress straight away, so the status endpoint sees it while the job runs."""
+    job.progress = progress
+    IngestionJob.objects.filter(id=job.id).update(progress=progress)
+
+
+def progress_writer(job, writer):
+    """Wrap a save_scheme_holdings-like writer to record the job's progress before and after writing."""
+    def write(*args, **kwargs):
+        record_progress(job, PROGRESS_PARSED)
+        result = writer(*args, **kwargs)
+        record_progress(job, PROGRESS_WRITTEN)
+        return result
+    return write
+
+
+def upload_summary(uploaded_file):
+    """The summary payload upload_file_view used to return for a scheme."""
+    return {
+        "category_total": uploaded_file.category_total,
+        "top_sectors": uploaded_file.top_sectors,
+        "top_holdings": uploaded_file.top_holdings,
+        "created_at": uploaded_file.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+
+def run_job(job_id):
+    """Parse the upload of a claimed job, store its outcome and log an UploadEvent. Returns the final status."""
+    job = IngestionJob.objects.select_related('amc', 'scheme', 'uploaded_file').get(id=job_id)
+    changes, timings, rows_written = {}, {}, None
+    started = time.perf_counter()
+    try:
+        # The file queued with the job, whatever the UploadedFile points at by now
+        file_name = job.file_name or job.uploaded_file.file.name
+        with job.uploaded_file.file.storage.open(file_name, 'rb') as file:
+            job.file_hash = file_content_hash(file)  # of the bytes parsed, whatever was queued
+            record_progress(job, PROGRESS_READ)
+            # The UploadedFile moves to this file only if its holdings become the current ones.
+            # Only an ingested file may short-circuit the next identical upload, and a
+            # workbook's hash says nothing about one of its sheets.
+            source = {'file': file_name, 'sheet_name': job.sheet_name,
+                      'file_hash': None if job.sheet_name else job.file_hash}
+            write = progress_writer(job, timed_writer(functools.partial(save_scheme_holdings, source=source),
+                                                      timings, changes))
+            rows_written = process_amc_excel_file(job.amc, job.scheme, file, writer=write,
+                                                  sheet_name=job.sheet_name or None)
+        if rows_written is None:
+            raise ValueError(f"No holdings could be read for {job.scheme.scheme_name}")
+
+        uploaded_file = UploadedFile.objects.get(id=job.uploaded_file_id)
+        job.result = {**upload_summary(uploaded_file), "rows": rows_written, "changes": changes}
+        job.status = IngestionJob.DONE
+    except Exception:
+        job.error = traceback.format_exc()
+        job.status = IngestionJob.FAILED
+    elapsed = time.perf_counter() - started
+    job.progress = PROGRESS_DONE
+    job.finished_at = now()
+    job.save(update_fields=['file_hash', 'result', 'status', 'error', 'progress', 'finished_at'])
+
+    record_upload_event(
+        job.amc, job.scheme,
+        UploadEvent.INGESTED if job.status == IngestionJob.DONE else UploadEvent.FAILED,
+        uploaded_file=job.uploaded_file, job=job, file_hash=job.file_hash, rows_parsed=rows_written,
+        changes=changes if changes else None,
+        queue_seconds=(job.started_at - job.created_at).total_seconds() if job.started_at else None,
+        parse_seconds=elapsed - timings.get('write', 0),
+        write_seconds=timings.get('write'),
+        message=job.error.strip().splitlines()[-1] if job.error else '',
+    )
+    return job.status
+
+
+def job_payload(job):
+    """JSON body of the job status endpoint."""
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "progress": job.progress,
+        "scheme": job.scheme.scheme_name,
+        "created_at": job.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        "finished_at": job.finished_at.strftime('%Y-%m-%d %H:%M:%S') if job.finished_at else None,
+        "error": job.error,
+        "data": job.result if job.status == IngestionJob.DONE else None,
+    }
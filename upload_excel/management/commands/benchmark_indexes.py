@@ -0,0 +1,147 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+
+from upload_excel.models import Instrument, MutualFundData, UploadedFile
+
+INSTRUMENT_TYPES = ["Equity", "Debt", "Money Market", "Government Securities", "Others", "Net Current Assets"]
+# Columns read back, present in every schema version
+COLUMNS = ["id", "instrument_name", "isin", "quantity", "market_value", "percentage_to_nav", "instrument_type"]
+
+
+def schema_sql(models):
+    """CREATE TABLE/INDEX statements of `models`, as the default (SQLite) connection would run them."""
+    with connection.schema_editor(collect_sql=True, atomic=False) as editor:
+        for model in models:
+            editor.create_model(model)
+    return editor.collected_sql
+
+
+def queries(rng, schemes, isins, amcs, instruments):
+    """
+    (label, queryset) pairs for the access paths of the app, with random parameters.
+    With `instruments` an ISIN is looked up through the Instrument table, as the app does now.
+    """
+    scheme = rng.randrange(1, schemes + 1)
+    isin = f"INE{rng.randrange(isins):09d}"
+    holdings = MutualFundData.objects.values(*COLUMNS)
+    by_isin = MutualFundData.objects.filter(**{"instrument__isin" if instruments else "isin": isin})
+    return [
+        ("holdings of a scheme by type",
+         holdings.filter(scheme_id=scheme, instrument_type=rng.choice(INSTRUMENT_TYPES))),
+        ("ISIN across schemes", by_isin.values("scheme_id", "market_value")),
+        ("top 10 by market value", holdings.filter(scheme_id=scheme).order_by("-market_value")[:10]),
+        ("top 10 by % to NAV", holdings.filter(scheme_id=scheme).order_by("-percentage_to_nav")[:10]),
+        ("upload of a scheme",
+         UploadedFile.objects.filter(amc_id=scheme % amcs + 1, scheme_id=scheme).order_by("pk")[:1]),
+    ]
+
+
+def compiled(queryset):
+    sql, params = queryset.query.sql_with_params()
+    return sql.replace("%s", "?"), params
+
+
+class Command(BaseCommand):
+    help = ("Load synthetic holdings into two scratch SQLite databases, one with the indexes of an "
+            "earlier migration and one with the current models, and compare query plans and latencies.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2_000_000, help="Synthetic MutualFundData rows.")
+        parser.add_argument("--schemes", type=int, default=2_000, help="Schemes the rows are spread over.")
+        parser.add_argument("--isins", type=int, default=20_000, help="Distinct ISINs.")
+        parser.add_argument("--amcs", type=int, default=40, help="AMCs the schemes belong to.")
+        parser.add_argument("--repeat", type=int, default=200, help="Runs of each query (random parameters).")
+        parser.add_argument("--baseline", default="0023_file_hash",
+                            help="upload_excel migration whose schema is the 'before' side.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The benchmark compiles its schema and queries for SQLite.")
+
+        loader = MigrationLoader(connection, ignore_no_migrations=True)
+        key = ("upload_excel", options["baseline"])
+        if key not in loader.graph.nodes:
+            raise CommandError(f"Unknown migration: {options['baseline']}")
+        baseline = loader.project_state(key).apps
+        sides = [
+            (f"before ({options['baseline']})",
+             schema_sql([baseline.get_model("upload_excel", "MutualFundData"),
+                         baseline.get_model("upload_excel", "UploadedFile")])),
+            ("after (current models)", schema_sql([Instrument, MutualFundData, UploadedFile])),
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            results = []
+            for number, (label, statements) in enumerate(sides):
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                db = sqlite3.connect(os.path.join(directory, f"benchmark{number}.sqlite3"))
+                try:
+                    results.append(self.run_side(db, statements, options))
+                finally:
+                    db.close()
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Median latency (ms)"))
+        for (label, before), (_, after) in zip(*results):
+            speedup = before / after if after else float("inf")
+            self.stdout.write(f"  {label:<30} {before:>9.3f} -> {after:>9.3f}  ({speedup:.0f}x)")
+
+    def run_side(self, db, statements, options):
+        for statement in statements:
+            db.execute(statement.rstrip(";"))
+        instruments = any('"upload_excel_instrument"' in statement for statement in statements)
+
+        started = time.time()
+        self.load(db, options, instruments)
+        self.stdout.write(f"  loaded {options['rows']} holdings in {time.time() - started:.1f}s (indexes maintained)")
+        db.execute("ANALYZE")
+
+        rng = random.Random(options["seed"])
+        timings = {}
+        for run in range(options["repeat"]):
+            for label, queryset in queries(rng, options["schemes"], options["isins"], options["amcs"], instruments):
+                sql, params = compiled(queryset)
+                if run == 0:
+                    plan = " | ".join(row[3] for row in db.execute("EXPLAIN QUERY PLAN " + sql, params))
+                    self.stdout.write(f"  {label}: {plan}")
+                started = time.perf_counter()
+                db.execute(sql, params).fetchall()
+                timings.setdefault(label, []).append((time.perf_counter() - started) * 1000)
+        return [(label, statistics.median(values)) for label, values in timings.items()]
+
+    def load(self, db, options, instruments):
+        rng = random.Random(options["seed"])
+        schemes, amcs = options["schemes"], options["amcs"]
+        if instruments:
+            db.executemany('INSERT INTO "upload_excel_instrument" (id, isin, name, industry_rating) VALUES (?, ?, ?, ?)',
+                           ((number + 1, f"INE{number:09d}", f"Instrument INE{number:09d}", "Banks")
+                            for number in range(options["isins"])))
+        db.executemany(
+            'INSERT INTO "upload_excel_uploadedfile" (amc_id, scheme_id, file, top_sectors, top_holdings, '
+            'category_total, created_at) VALUES (?, ?, ?, \'{}\', \'{}\', \'{}\', \'2024-01-01\')',
+            ((scheme % amcs + 1, scheme, f"uploads/{scheme}.xlsx") for scheme in range(1, schemes + 1)))
+
+        def holdings():
+            for row in range(options["rows"]):
+                scheme = row % schemes + 1
+                number = rng.randrange(options["isins"])
+                isin = f"INE{number:09d}"
+                values = (scheme % amcs + 1, scheme, "2024-01-01", scheme, f"Instrument {isin}", "Banks",
+                          rng.randrange(1, 10_000_000), rng.uniform(0, 100_000), rng.uniform(0, 0.1), isin,
+                          rng.choice(INSTRUMENT_TYPES))
+                yield values + (number + 1,) if instruments else values
+
+        columns = ('amc_id, scheme_id, processed_at, file_id, instrument_name, industry_rating, quantity, '
+                   'market_value, percentage_to_nav, isin, instrument_type' + (', instrument_id' if instruments else ''))
+        db.executemany(
+            f'INSERT INTO "upload_excel_mutualfunddata" ({columns}) '
+            f'VALUES ({", ".join("?" * (12 if instruments else 11))})', holdings())
+        db.commit()
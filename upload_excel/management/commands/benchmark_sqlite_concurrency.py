@@ -0,0 +1,156 @@
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+# (label, journal mode of the scratch database, per-connection pragmas) of each profile
+DEFAULT_PROFILE = ("default", "delete", {})  # SQLite's rollback journal and defaults
+
+
+def setup_django(database, pragmas):
+    """Point a spawned process at the scratch database with the profile's pragmas, then set Django up."""
+    settings.DATABASES['default']['NAME'] = database
+    settings.SQLITE_PRAGMAS = pragmas
+    # Rewrite every holding on each pass so the writer really writes
+    settings.MUTUAL_FUND_DATA_WRITE_MODE = 'replace'
+    import django
+    django.setup()
+
+
+def run_writer(database, pragmas, passes, ready, start, done, results):
+    """Parse the stored uploads once, then write them `passes` times as fast as possible."""
+    setup_django(database, pragmas)
+    from django.core.management import call_command
+    from upload_excel.ingestion import save_scheme_holdings
+    from upload_excel.models import MutualFundScheme
+    from upload_excel.reingestion import parse_upload, upload_tasks
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        call_command('migrate', verbosity=0)
+        parsed = [parse_upload(task) for task in upload_tasks()]
+    writes = [(task[2], writes) for task, writes, error in parsed if error is None]
+    schemes = MutualFundScheme.objects.in_bulk([scheme_id for scheme_id, _ in writes])
+    ready.set()
+    start.wait()
+
+    rows, locked, started = 0, 0, time.perf_counter()
+    try:
+        for _ in range(passes):
+            for scheme_id, scheme_writes in writes:
+                for instruments, uploaded_file, summary in scheme_writes:
+                    try:
+                        with contextlib.redirect_stdout(io.StringIO()):
+                            save_scheme_holdings(schemes[scheme_id], instruments, uploaded_file, **summary)
+                        rows += len(instruments)
+                    except Exception as exc:
+                        if 'locked' not in str(exc):
+                            raise
+                        locked += 1
+    finally:
+        done.set()
+    results.put(('writer', {'rows': rows, 'seconds': time.perf_counter() - started, 'locked': locked}))
+
+
+def run_reader(database, pragmas, seed, start, done, results):
+    """Read a random scheme's top holdings, and the scheme list of its AMC, until the writer is done."""
+    setup_django(database, pragmas)
+    from upload_excel.models import MutualFundData, MutualFundScheme
+
+    scheme_ids = list(MutualFundData.objects.values_list('scheme_id', flat=True).distinct())
+    amc_ids = list(MutualFundScheme.objects.values_list('amc_id', flat=True).distinct())
+    rng = random.Random(seed)
+    latencies, locked = [], 0
+    start.wait()
+    while not done.is_set():
+        started = time.perf_counter()
+        try:
+            list(MutualFundData.objects.filter(scheme_id=rng.choice(scheme_ids))
+                 .order_by('-market_value').values('instrument_name', 'isin', 'market_value')[:50])
+            list(MutualFundScheme.objects.filter(amc_id=rng.choice(amc_ids)).values('id', 'scheme_name'))
+        except Exception as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+    results.put(('reader', {'latencies': latencies, 'locked': locked}))
+
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Command(BaseCommand):
+    help = ("Measure reader latency and writer throughput on a scratch copy of the database: one "
+            "process re-writes every stored upload while N processes query holdings, once per "
+            "pragma profile (SQLite defaults, then WAL with settings.SQLITE_PRAGMAS).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--readers", type=int, default=4, help="Reader processes.")
+        parser.add_argument("--passes", type=int, default=3, help="Times the writer writes the corpus.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark is for the SQLite backend.")
+
+        profiles = [DEFAULT_PROFILE, ("tuned", "wal", dict(settings.SQLITE_PRAGMAS))]
+        context = multiprocessing.get_context("spawn")
+        with tempfile.TemporaryDirectory() as directory:
+            for label, mode, pragmas in profiles:
+                database = os.path.join(directory, f"{label}.sqlite3")
+                # The backup API also copies pages still in the live database's WAL
+                source, target = sqlite3.connect(settings.DATABASES['default']['NAME']), sqlite3.connect(database)
+                try:
+                    source.backup(target)
+                    target.execute(f"PRAGMA journal_mode = {mode}")
+                finally:
+                    source.close()
+                    target.close()
+
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{label}: journal_mode {mode}, {pragmas or 'defaults'}"))
+                self.report(self.run_profile(context, database, pragmas, options))
+
+    def run_profile(self, context, database, pragmas, options):
+        ready, start, done = context.Event(), context.Event(), context.Event()
+        results = context.Queue()
+        processes = [context.Process(target=run_writer,
+                                     args=(database, pragmas, options["passes"], ready, start, done, results))]
+        processes += [context.Process(target=run_reader,
+                                      args=(database, pragmas, options["seed"] + number, start, done, results))
+                      for number in range(options["readers"])]
+        for process in processes:
+            process.start()
+        ready.wait()
+        start.set()
+
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+        writer = next(result for role, result in collected if role == 'writer')
+        readers = [result for role, result in collected if role == 'reader']
+        return writer, readers
+
+    def report(self, result):
+        writer, readers = result
+        latencies = [latency for reader in readers for latency in reader['latencies']]
+        self.stdout.write(
+            f"  writer: {writer['rows']} rows in {writer['seconds']:.1f}s "
+            f"({writer['rows'] / writer['seconds']:.0f} rows/s), {writer['locked']} locked")
+        self.stdout.write(
+            f"  readers: {len(latencies)} reads, {sum(reader['locked'] for reader in readers)} locked, "
+            f"p50 {percentile(latencies, 0.5):.1f} ms, p95 {percentile(latencies, 0.95):.1f} ms, "
+            f"p99 {percentile(latencies, 0.99):.1f} ms, max {max(latencies, default=float('nan')):.1f} ms, "
+            f"mean {statistics.fmean(latencies) if latencies else float('nan'):.1f} ms")
@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from upload_excel.holdings_api import InvalidQuery
+from upload_excel.holdings_export import export_queryset, write_csv, write_xlsx
+
+
+class Command(BaseCommand):
+    help = ("Write the current holdings, or those of every stored portfolio in a date range, to a CSV or "
+            "XLSX file for downstream systems, reading them in chunks so memory stays flat however many "
+            "rows are exported.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write; '-' writes CSV to stdout.")
+        parser.add_argument("--format", choices=["csv", "xlsx"],
+                            help="File format (default: from the output's extension, else csv).")
+        parser.add_argument("--amc", action="append", default=[], help="Only these AMC ids.")
+        parser.add_argument("--scheme", action="append", default=[], help="Only these scheme ids.")
+        parser.add_argument("--instrument-type", action="append", default=[], help="Only these instrument types.")
+        parser.add_argument("--date-from", help="Holdings of every stored portfolio dated on or after this date "
+                                                "(YYYY-MM-DD), not just the current ones.")
+        parser.add_argument("--date-to", help="Holdings of every stored portfolio dated on or before this date "
+                                              "(YYYY-MM-DD), not just the current ones.")
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        file_format = options["format"] or ("xlsx" if output.lower().endswith(".xlsx") else "csv")
+        if file_format == "xlsx" and output == "-":
+            raise CommandError("XLSX needs an output file.")
+
+        params = QueryDict(mutable=True)
+        params.setlist("amc", options["amc"])
+        params.setlist("scheme", options["scheme"])
+        params.setlist("instrument_type", options["instrument_type"])
+        for name in ("date_from", "date_to"):
+            if options[name]:
+                params[name] = options[name]
+        try:
+            holdings = export_queryset(params)
+        except InvalidQuery as e:
+            raise CommandError(str(e))
+
+        if output == "-":
+            write_csv(holdings, sys.stdout)
+            return
+        if file_format == "xlsx":
+            rows = write_xlsx(holdings, output)
+        else:
+            with open(output, "w", newline="", encoding="utf-8") as file:
+                rows = write_csv(holdings, file)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} row(s) to {output}."))
@@ -0,0 +1,28 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from upload_excel.analytics_export import export_dir, export_holdings
+
+
+class Command(BaseCommand):
+    help = ("Export snapshot holdings to Parquet files partitioned by AMC and portfolio month, "
+            "rewriting only the partitions whose snapshots changed since the last export.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--amc", type=int, action="append", default=[], help="Only export these AMC ids.")
+        parser.add_argument("--full", action="store_true", help="Rewrite every partition.")
+        parser.add_argument("--directory", help="Export root (default: settings.ANALYTICS_EXPORT_DIR).")
+
+    def handle(self, *args, **options):
+        root = options["directory"] or export_dir()
+        try:
+            report = export_holdings(amc_ids=options["amc"] or None, full=options["full"], root=root)
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+        for path in report["written"]:
+            self.stdout.write(f"  wrote {path}")
+        for path in report["removed"]:
+            self.stdout.write(f"  removed {path}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{root}: {len(report['written'])} partition(s) written, {report['unchanged']} unchanged, "
+            f"{len(report['removed'])} removed."))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from upload_excel.reingestion import parse_upload, upload_tasks
+from upload_excel.sheet_cache import cache_dir, cache_stats, clear_cache
+
+
+class Command(BaseCommand):
+    help = "Show, clear or warm the parsed-sheet cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clear", action="store_true", help="Delete every cached sheet.")
+        parser.add_argument("--warm", action="store_true",
+                            help="Parse every UploadedFile (nothing is written) so its sheet is cached.")
+
+    def handle(self, *args, **options):
+        if options["clear"]:
+            self.stdout.write(f"Removed {clear_cache()} cached sheet(s).")
+
+        if options["warm"]:
+            tasks = upload_tasks()
+            started = time.time()
+            for done, task in enumerate(tasks, start=1):
+                _, _, error = parse_upload(task)
+                self.stdout.write(f"[{done}/{len(tasks)}] {task[0]}" + (f": {error}" if error else ""))
+            self.stdout.write(f"Warmed in {time.time() - started:.1f}s.")
+
+        entries, size = cache_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"{cache_dir()}: {entries} cached sheet(s), {size / 1024 / 1024:.1f} MB."))
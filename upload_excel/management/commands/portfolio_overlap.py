@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from upload_excel.holdings_api import InvalidQuery
+from upload_excel.overlap import portfolio_overlap
+
+
+class Command(BaseCommand):
+    help = ("Print the pairwise overlap by ISIN (common holdings and % of market value held in common) "
+            "of the current holdings of the given schemes and of every scheme of the given AMCs.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scheme", type=int, action="append", default=[], help="Scheme ids to compare.")
+        parser.add_argument("--amc", type=int, action="append", default=[], help="Compare every scheme of these AMC ids.")
+        parser.add_argument("--matrix", action="store_true", help="Also print the N x N weight overlap matrix.")
+        parser.add_argument("--details", action="store_true", help="List the shared holdings of each pair.")
+        parser.add_argument("--top", type=int, default=20, help="Pairs to print, largest overlap first (0: all).")
+        parser.add_argument("--json", action="store_true", help="Print the full result as JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            result = portfolio_overlap(options["scheme"], options["amc"], matrix=options["matrix"],
+                                       details=options["details"])
+        except InvalidQuery as e:
+            raise CommandError(str(e))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(result, indent=1))
+            return
+
+        names = {scheme["id"]: scheme["scheme_name"] for scheme in result["schemes"]}
+        pairs = result["pairs"][:options["top"]] if options["top"] else result["pairs"]
+        for pair in pairs:
+            self.stdout.write(f"{pair['weight_overlap']:6.2f}%  {pair['common_holdings']:4d} common  "
+                              f"{names[pair['scheme_a']]}  |  {names[pair['scheme_b']]}")
+            for holding in pair.get("common", []):
+                self.stdout.write(f"          {holding['isin']}  {holding['weight_a']:6.2f}%  "
+                                  f"{holding['weight_b']:6.2f}%  {holding['instrument_name']}")
+        if options["matrix"]:
+            ids = [scheme["id"] for scheme in result["schemes"]]
+            self.stdout.write("\n" + " " * 8 + "".join(f"{scheme_id:>8}" for scheme_id in ids))
+            for scheme_id, row in zip(ids, result["matrix"]["weight_overlap"]):
+                self.stdout.write(f"{scheme_id:>8}" + "".join(f"{value:8.2f}" for value in row))
+        self.stdout.write(self.style.SUCCESS(
+            f"Compared {len(result['schemes'])} scheme(s): {len(result['pairs'])} pair(s)."))
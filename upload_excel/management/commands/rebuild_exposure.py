@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from upload_excel.exposure import rebuild_exposure
+from upload_excel.models import MutualFundScheme
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the ISIN and industry reverse index (HoldingExposure) from the current holdings. "
+            "Ingestion keeps it up to date; run this once for holdings stored before it existed.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--amc", type=int, action="append", default=[], help="Only schemes of these AMC ids.")
+        parser.add_argument("--scheme", type=int, action="append", default=[], help="Only these scheme ids.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        scheme_ids = list(options["scheme"]) or None
+        if options["amc"]:
+            schemes = MutualFundScheme.objects.filter(amc_id__in=options["amc"])
+            if scheme_ids:
+                schemes = schemes.filter(id__in=scheme_ids)
+            scheme_ids = list(schemes.order_by("id").values_list("id", flat=True))
+
+        schemes, rows = rebuild_exposure(scheme_ids, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed the exposure of {schemes} scheme(s): {rows} row(s)."))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from upload_excel.models import MutualFundScheme
+from upload_excel.summaries import recompute_summaries, stored_summaries
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the category totals, top sectors and top holdings of every upload and of its "
+            "scheme's latest snapshot from the stored holdings, without reading any workbook.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--amc", type=int, action="append", default=[], help="Only schemes of these AMC ids.")
+        parser.add_argument("--scheme", type=int, action="append", default=[], help="Only these scheme ids.")
+        parser.add_argument("--dry-run", action="store_true", help="Print the summaries instead of saving them.")
+
+    def handle(self, *args, **options):
+        scheme_ids = list(options["scheme"])
+        if options["amc"]:
+            schemes = MutualFundScheme.objects.filter(amc_id__in=options["amc"])
+            if scheme_ids:
+                schemes = schemes.filter(id__in=scheme_ids)
+            scheme_ids = list(schemes.values_list("id", flat=True)) or [0]
+
+        if options["dry_run"]:
+            for scheme_id, (_, _, summary) in stored_summaries(scheme_ids).items():
+                self.stdout.write(f"scheme {scheme_id}: {json.dumps(summary)}")
+            return
+
+        updated = recompute_summaries(scheme_ids)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed the summaries of {updated} upload(s)."))
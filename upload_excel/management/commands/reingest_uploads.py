@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from upload_excel.ingestion import save_scheme_holdings
+from upload_excel.models import AMC, MutualFundScheme, UploadEvent
+from upload_excel.reingestion import directory_tasks, parse_upload, upload_tasks
+from upload_excel.upload_events import record_upload_event, rows_written
+
+
+class Command(BaseCommand):
+    help = ("Re-parse stored uploads (every UploadedFile, or the workbooks of a directory) "
+            "in a process pool and rewrite MutualFundData from this process.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--amc", action="append", default=[],
+                            help="AMC id or exact name; may be repeated. Required with --directory.")
+        parser.add_argument("--scheme", type=int, action="append", default=[],
+                            help="Only re-ingest these scheme ids.")
+        parser.add_argument("--directory",
+                            help="Parse every .xlsx in this directory instead of the UploadedFile records.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                            help="Parser processes (default: number of CPUs).")
+
+    def get_amcs(self, values):
+        amcs = []
+        for value in values:
+            amc = AMC.objects.filter(id=value).first() if value.isdigit() else AMC.objects.filter(name=value).first()
+            if amc is None:
+                raise CommandError(f"Unknown AMC: {value}")
+            amcs.append(amc)
+        return amcs
+
+    def handle(self, *args, **options):
+        amcs = self.get_amcs(options["amc"])
+        if options["directory"]:
+            if len(amcs) != 1:
+                raise CommandError("--directory needs exactly one --amc")
+            tasks = directory_tasks(options["directory"], amcs[0])
+        else:
+            tasks = upload_tasks(amcs, options["scheme"])
+
+        total = len(tasks)
+        self.stdout.write(f"Re-ingesting {total} workbook(s) with {options['workers']} worker process(es).")
+        started = time.time()
+        schemes = MutualFundScheme.objects.select_related('amc').in_bulk([task[2] for task in tasks if task[2]])
+        ingested, failed, rows = 0, [], 0
+        touched = 0  # rows inserted, updated or deleted
+
+        # Never hand an open DB connection to a forked worker process
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as pool:
+            futures = [pool.submit(parse_upload, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    task, writes, error = future.result()
+                except Exception as exc:  # the worker process itself died
+                    task, writes, error = tasks[futures.index(future)], [], f"worker crashed: {exc!r}"
+
+                label, scheme = task[0], schemes.get(task[2])
+                total_changes = {}
+                write_started = time.perf_counter()
+                if error is None:
+                    try:
+                        # All database writes happen here, one scheme at a time
+                        for instruments, uploaded_file, summary in writes:
+                            changes = save_scheme_holdings(scheme, instruments, uploaded_file, **summary)
+                            for key in ("inserted", "updated", "deleted"):
+                                total_changes[key] = total_changes.get(key, 0) + changes[key]
+                    except Exception as exc:
+                        error = f"write failed: {exc}"
+                if scheme is not None:
+                    succeeded = error is None
+                    record_upload_event(
+                        scheme.amc, scheme, UploadEvent.INGESTED if succeeded else UploadEvent.FAILED,
+                        uploaded_file=writes[0][1] if writes else None,
+                        rows_parsed=sum(len(instruments) for instruments, _, _ in writes) if succeeded else None,
+                        changes=total_changes if succeeded else None,
+                        write_seconds=time.perf_counter() - write_started if succeeded else None,
+                        message=f"re-ingest of {label}" + ("" if succeeded else f": {error}"))
+
+                if error is None:
+                    changed = rows_written(total_changes)
+                    ingested += 1
+                    written = sum(len(instruments) for instruments, _, _ in writes)
+                    rows += written
+                    touched += changed
+                    self.stdout.write(f"[{done}/{total}] {label} -> {scheme}: {written} rows, {changed} touched")
+                else:
+                    failed.append((label, error))
+                    self.stdout.write(self.style.WARNING(f"[{done}/{total}] {label}: {error}"))
+
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-ingested {ingested}/{total} workbook(s), {rows} rows ({touched} touched), "
+            f"in {time.time() - started:.1f}s."))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"{len(failed)} failed:"))
+            for label, error in failed:
+                self.stdout.write(f"  {label}: {error}")
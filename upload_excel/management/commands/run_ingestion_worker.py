@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from upload_excel.analytics_export import export_after_ingestion, export_holdings, parquet_engine_available
+from upload_excel.jobs import (
+    claim_next_job, fail_job, get_poll_interval, get_worker_count, requeue_stale_jobs, run_job,
+)
+
+
+class Command(BaseCommand):
+    help = "Poll the IngestionJob queue and parse queued uploads in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Uploads parsed at once (default: settings.INGESTION_WORKERS).")
+        parser.add_argument("--poll-interval", type=float, default=None,
+                            help="Seconds between polls of an empty queue (default: settings.INGESTION_POLL_INTERVAL).")
+        parser.add_argument("--once", action="store_true",
+                            help="Exit once the queue is empty instead of polling forever.")
+
+    def handle(self, *args, **options):
+        workers = options["workers"] or get_worker_count()
+        poll_interval = options["poll_interval"] or get_poll_interval()
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Re-queued {requeued} job(s) left running by a stopped worker.")
+        self.stdout.write(f"Ingestion worker started with {workers} worker process(es).")
+        if export_after_ingestion() and not parquet_engine_available():
+            self.stdout.write(self.style.WARNING(
+                "ANALYTICS_EXPORT_AFTER_INGESTION is on, but no Parquet engine is installed "
+                "(pip install pyarrow); every export will fail."))
+
+        running = {}
+        exported = True  # nothing ingested since the last analytics export
+        with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+            while True:
+                while len(running) < workers:
+                    job_id = claim_next_job()
+                    if job_id is None:
+                        break
+                    # Never hand an open DB connection to a forked worker process
+                    connections.close_all()
+                    running[pool.submit(run_job, job_id)] = job_id
+                    self.stdout.write(f"Job {job_id} started.")
+
+                if not running:
+                    if not exported and export_after_ingestion():
+                        self.export()
+                    exported = True
+                    if options["once"]:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as exc:  # the worker process itself died
+                        status = "failed"
+                        fail_job(job_id, f"Worker process crashed: {exc!r}")
+                    self.stdout.write(f"Job {job_id} {status}.")
+                    exported = False
+
+        self.stdout.write(self.style.SUCCESS("Ingestion queue is empty."))
+
+    def export(self):
+        """Export the analytics partitions the finished jobs changed; a failure never stops the worker."""
+        try:
+            report = export_holdings()
+        except Exception as exc:
+            self.stdout.write(self.style.WARNING(f"Analytics export failed: {exc}"))
+            return
+        self.stdout.write(f"Analytics export: {len(report['written'])} partition(s) written, "
+                          f"{len(report['removed'])} removed.")
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from upload_excel.sqlite_tuning import JOURNAL_MODES, journal_mode
+
+
+class Command(BaseCommand):
+    help = ("Print the SQLite database's journal mode, or switch it. The mode is stored in the database "
+            "file, so it is set once here rather than on every connection: `wal` lets readers keep "
+            "reading while an upload writes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("mode", nargs="?", choices=JOURNAL_MODES, help="Journal mode to switch to.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Journal modes are for the SQLite backend.")
+        mode = journal_mode(connection, options["mode"])
+        if options["mode"] and mode != options["mode"]:
+            raise CommandError(f"SQLite kept the {mode} journal mode (is another connection open?).")
+        self.stdout.write(self.style.SUCCESS(f"Journal mode: {mode}."))
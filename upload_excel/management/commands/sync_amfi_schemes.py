@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from upload_excel.fetch_amc_data import amfi_source, refresh_amfi
+
+
+class Command(BaseCommand):
+    help = ("Stream AMFI's NAVAll.txt and store the AMCs and schemes not stored yet (in one bulk "
+            "transaction), every AMFI scheme code and the NAVs newer than the last ones seen. "
+            "An unchanged source (ETag / Last-Modified, or file size and time) is skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--source", help="URL or local copy of NAVAll.txt (default: settings.AMFI_NAV_SOURCE).")
+        parser.add_argument("--force", action="store_true", help="Read the source even if it looks unchanged.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        source = options["source"] or amfi_source()
+        started = time.perf_counter()
+        try:
+            counts = refresh_amfi(source, force=options["force"], batch_size=options["batch_size"])
+        except OSError as exc:
+            raise CommandError(f"Cannot read {source}: {exc}")
+        elapsed = time.perf_counter() - started
+
+        if counts["not_modified"]:
+            self.stdout.write(self.style.SUCCESS(f"{source} is unchanged since the last refresh ({elapsed:.2f}s)."))
+            return
+        self.stdout.write(f"  AMFI schemes saved: {counts['amfi_schemes_saved']}, NAVs recorded: "
+                          f"{counts['navs_added']}, NAVs already stored: {counts['navs_unchanged']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['amcs_added']} AMC(s) and {counts['schemes_added']} scheme(s) added, "
+            f"{counts['amcs_unchanged']} AMC(s) and {counts['schemes_unchanged']} scheme(s) unchanged "
+            f"in {elapsed:.2f}s."))
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def merge_duplicate_uploads(apps, schema_editor):
+    """Keep the newest UploadedFile of each scheme, moving holdings and jobs of the others onto it."""
+    UploadedFile = apps.get_model('upload_excel', 'UploadedFile')
+    MutualFundData = apps.get_model('upload_excel', 'MutualFundData')
+    IngestionJob = apps.get_model('upload_excel', 'IngestionJob')
+
+    duplicated = (UploadedFile.objects.values('scheme_id')
+                  .annotate(count=models.Count('id')).filter(count__gt=1)
+                  .values_list('scheme_id', flat=True))
+    for scheme_id in list(duplicated):
+        keep, *others = UploadedFile.objects.filter(scheme_id=scheme_id).order_by('-id').values_list('id', flat=True)
+        MutualFundData.objects.filter(file_id__in=others).update(file_id=keep)
+        IngestionJob.objects.filter(uploaded_file_id__in=others).update(uploaded_file_id=keep)
+        UploadedFile.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0023_file_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mutualfunddata',
+            name='scheme',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='upload_excel.mutualfundscheme'),
+        ),
+        migrations.AlterField(
+            model_name='uploadedfile',
+            name='scheme',
+            field=models.ForeignKey(db_index=False, default=1, on_delete=django.db.models.deletion.CASCADE, to='upload_excel.mutualfundscheme'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['scheme', 'instrument_type'], name='mfdata_scheme_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['isin', 'scheme'], name='mfdata_isin_scheme_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['scheme', '-market_value'], name='mfdata_scheme_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['scheme', '-percentage_to_nav'], name='mfdata_scheme_nav_idx'),
+        ),
+        migrations.RunPython(merge_duplicate_uploads, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='uploadedfile',
+            constraint=models.UniqueConstraint(fields=('scheme',), name='uploadedfile_unique_scheme'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0024_holdings_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoldingLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instrument_name', models.CharField(max_length=255)),
+                ('isin', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('industry_rating', models.CharField(blank=True, max_length=255)),
+                ('instrument_type', models.CharField(blank=True, max_length=50)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('instrument_name', 'isin', 'industry_rating', 'instrument_type'), name='holdinglabel_unique_text')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('portfolio_date', models.DateField()),
+                ('top_sectors', models.JSONField(blank=True, default=dict)),
+                ('top_holdings', models.JSONField(blank=True, default=dict)),
+                ('category_total', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('amc', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='upload_excel.amc')),
+                ('scheme', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='upload_excel.mutualfundscheme')),
+                ('uploaded_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='snapshots', to='upload_excel.uploadedfile')),
+            ],
+            options={
+                'get_latest_by': 'portfolio_date',
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotHolding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(blank=True, null=True)),
+                ('market_value', models.FloatField(blank=True, null=True)),
+                ('percentage_to_nav', models.FloatField(blank=True, null=True)),
+                ('yield_percentage', models.FloatField(blank=True, null=True)),
+                ('ytc', models.FloatField(blank=True, null=True)),
+                ('label', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='holdings', to='upload_excel.holdinglabel')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holdings', to='upload_excel.portfoliosnapshot')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliosnapshot',
+            constraint=models.UniqueConstraint(fields=('scheme', 'portfolio_date'), name='snapshot_unique_scheme_date'),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_instruments(apps, schema_editor):
+    """One Instrument per ISIN already stored, linked from the holdings and snapshot labels."""
+    Instrument = apps.get_model('upload_excel', 'Instrument')
+    MutualFundData = apps.get_model('upload_excel', 'MutualFundData')
+    HoldingLabel = apps.get_model('upload_excel', 'HoldingLabel')
+
+    instruments = {}
+    for model, name_field in [(MutualFundData, 'instrument_name'), (HoldingLabel, 'instrument_name')]:
+        rows = (model.objects.exclude(isin__isnull=True).exclude(isin='').order_by('id')
+                .values_list('isin', name_field, 'industry_rating'))
+        for isin, name, industry_rating in rows.iterator():
+            current = instruments.setdefault(isin, ['', ''])
+            # Keep the first name, unless it was lowercased and this one is as printed
+            if not current[0] or (current[0] == current[0].lower() and name and name != name.lower()):
+                current[0] = name or ''
+            current[1] = current[1] or industry_rating or ''
+    Instrument.objects.bulk_create(
+        [Instrument(isin=isin, name=name, industry_rating=industry_rating)
+         for isin, (name, industry_rating) in instruments.items()],
+        batch_size=500)
+
+    instrument_id = models.Subquery(Instrument.objects.filter(isin=models.OuterRef('isin')).values('id')[:1])
+    MutualFundData.objects.exclude(isin__isnull=True).exclude(isin='').update(instrument_id=instrument_id)
+    HoldingLabel.objects.exclude(isin='').update(instrument_id=instrument_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0025_portfolio_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Instrument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('isin', models.CharField(max_length=50, unique=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('industry_rating', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='mutualfunddata',
+            name='mfdata_isin_scheme_idx',
+        ),
+        migrations.AlterField(
+            model_name='holdinglabel',
+            name='isin',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='holdinglabel',
+            name='instrument',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='labels', to='upload_excel.instrument'),
+        ),
+        migrations.AddField(
+            model_name='mutualfunddata',
+            name='instrument',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='holdings', to='upload_excel.instrument'),
+        ),
+        migrations.RunPython(backfill_instruments, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['instrument', 'scheme'], name='mfdata_instrument_scheme_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0026_instruments'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AmfiSource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_modified', models.CharField(blank=True, max_length=255)),
+                ('last_nav_date', models.DateField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AmfiScheme',
+            fields=[
+                ('scheme_code', models.IntegerField(primary_key=True, serialize=False)),
+                ('scheme_name', models.CharField(max_length=255)),
+                ('category', models.CharField(blank=True, max_length=255)),
+                ('isin_growth', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('isin_reinvestment', models.CharField(blank=True, db_index=True, max_length=20)),
+                ('last_nav_date', models.DateField(blank=True, null=True)),
+                ('scheme', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='amfi_schemes', to='upload_excel.mutualfundscheme')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NavHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nav_date', models.DateField()),
+                ('nav', models.FloatField(blank=True, null=True)),
+                ('amfi_scheme', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='navs', to='upload_excel.amfischeme')),
+            ],
+            options={
+                'get_latest_by': 'nav_date',
+                'constraints': [models.UniqueConstraint(fields=('amfi_scheme', 'nav_date'), name='navhistory_unique_scheme_date')],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:22
+
+import datetime
+import re
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+TIMESTAMP = re.compile(r'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+
+
+def convert_update_logs(apps, schema_editor):
+    """One UploadEvent per timestamp of the update_logs text; "identical re-upload skipped" lines were duplicates."""
+    UploadedFile = apps.get_model('upload_excel', 'UploadedFile')
+    UploadEvent = apps.get_model('upload_excel', 'UploadEvent')
+    events = []
+    for upload in UploadedFile.objects.exclude(update_logs=None).exclude(update_logs='').iterator():
+        for line in upload.update_logs.splitlines():
+            match = TIMESTAMP.search(line)
+            if not match:
+                continue
+            created_at = datetime.datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S')
+            events.append(UploadEvent(
+                created_at=created_at.replace(tzinfo=datetime.timezone.utc),
+                amc_id=upload.amc_id,
+                scheme_id=upload.scheme_id,
+                uploaded_file_id=upload.id,
+                outcome='duplicate' if 'identical re-upload skipped' in line else 'received',
+                message='from update_logs',
+            ))
+    UploadEvent.objects.bulk_create(events, batch_size=500)
+
+
+def restore_update_logs(apps, schema_editor):
+    UploadedFile = apps.get_model('upload_excel', 'UploadedFile')
+    UploadEvent = apps.get_model('upload_excel', 'UploadEvent')
+    for upload in UploadedFile.objects.all():
+        lines = [f"[{created_at:%Y-%m-%d %H:%M:%S}],{' identical re-upload skipped' if outcome == 'duplicate' else ''}\n"
+                 for created_at, outcome in upload.events.order_by('-created_at').values_list('created_at', 'outcome')]
+        if lines:
+            upload.update_logs = ''.join(lines)
+            upload.save(update_fields=['update_logs'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0027_amfi_nav_history'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('outcome', models.CharField(choices=[('received', 'Received'), ('duplicate', 'Identical re-upload skipped'), ('ingested', 'Ingested'), ('failed', 'Failed')], max_length=20)),
+                ('file_hash', models.CharField(blank=True, max_length=64)),
+                ('rows_parsed', models.PositiveIntegerField(blank=True, null=True)),
+                ('rows_written', models.PositiveIntegerField(blank=True, null=True)),
+                ('queue_seconds', models.FloatField(blank=True, null=True)),
+                ('parse_seconds', models.FloatField(blank=True, null=True)),
+                ('write_seconds', models.FloatField(blank=True, null=True)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('amc', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='upload_excel.amc')),
+                ('job', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='upload_excel.ingestionjob')),
+                ('scheme', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='upload_events', to='upload_excel.mutualfundscheme')),
+                ('uploaded_file', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='events', to='upload_excel.uploadedfile')),
+            ],
+            options={
+                'get_latest_by': 'created_at',
+                'indexes': [models.Index(fields=['scheme', '-created_at'], name='uploadevent_scheme_time_idx'), models.Index(fields=['created_at'], name='uploadevent_time_idx')],
+            },
+        ),
+        migrations.RunPython(convert_update_logs, restore_update_logs),
+        migrations.RemoveField(
+            model_name='uploadedfile',
+            name='update_logs',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0028_upload_events'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mutualfunddata',
+            name='amc',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='upload_excel.amc'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['amc', '-market_value'], name='mfdata_amc_value_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfunddata',
+            index=models.Index(fields=['-market_value'], name='mfdata_value_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0029_holdings_api_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mutualfundscheme',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='mutualfundscheme',
+            name='amc',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='schemes', to='upload_excel.amc'),
+        ),
+        migrations.AddIndex(
+            model_name='mutualfundscheme',
+            index=models.Index(fields=['amc', 'updated_at'], name='scheme_amc_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0030_scheme_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HoldingExposure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('isin', 'ISIN'), ('industry', 'Industry')], max_length=10)),
+                ('key', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('market_value', models.FloatField(default=0)),
+                ('percentage_to_nav', models.FloatField(blank=True, null=True)),
+                ('holdings', models.PositiveIntegerField(default=0)),
+                ('amc', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='upload_excel.amc')),
+                ('scheme', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='exposures', to='upload_excel.mutualfundscheme')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'key', 'amc'], name='exposure_key_amc_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scheme', 'kind', 'key'), name='exposure_unique_scheme_key')],
+            },
+        ),
+    ]
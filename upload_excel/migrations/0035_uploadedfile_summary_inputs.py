@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0034_uploadedfile_sheet_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadedfile',
+            name='summary_inputs',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
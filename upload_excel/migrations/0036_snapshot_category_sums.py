@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('upload_excel', '0035_uploadedfile_summary_inputs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='uploadedfile',
+            name='summary_inputs',
+        ),
+        migrations.AddField(
+            model_name='portfoliosnapshot',
+            name='category_sums',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,5 @@
 from django.db import models
-import datetime
+from django.utils import timezone
 
 class AMC(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -8,16 +8,27 @@ class AMC(models.Model):
         return self.name
 
 class MutualFundScheme(models.Model):
-    amc = models.ForeignKey(AMC, on_delete=models.CASCADE, related_name="schemes")
+    # Indexed by scheme_amc_updated_idx
+    amc = models.ForeignKey(AMC, on_delete=models.CASCADE, related_name="schemes", db_index=False)
     scheme_name = models.CharField(max_length=255)
+    # Also set by bulk_create, so the AMFI sync marks the schemes it adds (see scheme_search)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["amc", "updated_at"], name="scheme_amc_updated_idx"),
+        ]
 
     def __str__(self):
         return self.scheme_name
 
 class UploadedFile(models.Model):
     amc = models.ForeignKey(AMC, on_delete=models.CASCADE)
-    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE,default= 1)
+    # Indexed by the uploadedfile_unique_scheme constraint
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE,default= 1, db_index=False)
     file = models.FileField(upload_to="uploads/")
+    # Sheet of `file` with this scheme's portfolio (workbook uploads); blank for the first sheet
+    sheet_name = models.CharField(max_length=255, blank=True)
     #new added fields
     
     # total_market_value = models.FloatField(default=0)
@@ -29,29 +40,40 @@ class UploadedFile(models.Model):
     category_total = models.JSONField( default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
         
-    update_logs = models.TextField(blank=True, null=True)
+    file_hash = models.CharField(max_length=64, blank=True, null=True)  # SHA-256 of the last ingested file
     
     
 
-    def add_log(self):
-        """Function to add a timestamp log."""
-        timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_entry = f"[{timestamp}],\n"
-
-        # Append the new log entry to existing logs
-        self.update_logs = (self.update_logs or "") + log_entry
-        self.save()
-    
     def __str__(self):
         return f"{self.file.name} "
+
+    class Meta:
+        constraints = [
+            # The upload views keep a single UploadedFile per scheme and replace its file
+            models.UniqueConstraint(fields=["scheme"], name="uploadedfile_unique_scheme"),
+        ]
     
 
+class Instrument(models.Model):
+    """
+    A security, keyed by ISIN, shared by every scheme and month that holds it.
+    """
+    isin = models.CharField(max_length=50, unique=True)
+    name = models.CharField(max_length=255, blank=True)
+    industry_rating = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.isin})" if self.name else self.isin
+
+
 class MutualFundData(models.Model):
     """
     Stores processed data from the Excel file.
     """
-    amc = models.ForeignKey(AMC, on_delete=models.CASCADE, null=True) 
-    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE, null=True)
+    # Indexed by mfdata_amc_value_idx
+    amc = models.ForeignKey(AMC, on_delete=models.CASCADE, null=True, db_index=False)
+    # Indexed through the composite indexes below, which all start with scheme
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE, null=True, db_index=False)
     
     processed_at = models.DateField(auto_now=True)
     file = models.ForeignKey(UploadedFile, on_delete=models.CASCADE, null=True)
@@ -66,8 +88,246 @@ class MutualFundData(models.Model):
     yield_percentage = models.FloatField(null=True, blank=True)
     ytc = models.FloatField(null=True, blank=True)
     instrument_type = models.CharField(max_length=50 , null=True)  # Equity, Debt, Money Market, etc.
-    
-    
-    
-    
-    
+    # Set for rows with an ISIN; indexed by mfdata_instrument_scheme_idx
+    instrument = models.ForeignKey(Instrument, on_delete=models.PROTECT, null=True, blank=True,
+                                   related_name="holdings", db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["scheme", "instrument_type"], name="mfdata_scheme_type_idx"),
+            models.Index(fields=["instrument", "scheme"], name="mfdata_instrument_scheme_idx"),
+            models.Index(fields=["scheme", "-market_value"], name="mfdata_scheme_value_idx"),
+            models.Index(fields=["scheme", "-percentage_to_nav"], name="mfdata_scheme_nav_idx"),
+            # Keyset pages of the holdings API across schemes (see holdings_api)
+            models.Index(fields=["amc", "-market_value"], name="mfdata_amc_value_idx"),
+            models.Index(fields=["-market_value"], name="mfdata_value_idx"),
+        ]
+
+
+
+class PortfolioSnapshot(models.Model):
+    """
+    A scheme's portfolio as of one portfolio date, kept when later months are uploaded.
+    Its holdings are SnapshotHolding rows; MutualFundData and UploadedFile hold the latest one.
+    """
+    amc = models.ForeignKey(AMC, on_delete=models.CASCADE)
+    # Indexed by the snapshot_unique_scheme_date constraint
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE, related_name="snapshots", db_index=False)
+    portfolio_date = models.DateField()
+    uploaded_file = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name="snapshots")
+    top_sectors = models.JSONField(default=dict, blank=True)
+    top_holdings = models.JSONField(default=dict, blank=True)
+    category_total = models.JSONField(default=dict, blank=True)
+    # Market value of each section category, which category_total is built from (see summaries);
+    # null for snapshots stored before it was kept
+    category_sums = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        get_latest_by = "portfolio_date"
+        constraints = [
+            models.UniqueConstraint(fields=["scheme", "portfolio_date"], name="snapshot_unique_scheme_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.scheme} - {self.portfolio_date}"
+
+
+class HoldingLabel(models.Model):
+    """
+    The text columns of a holding, stored once and shared by every snapshot that holds it.
+    """
+    instrument_name = models.CharField(max_length=255)
+    isin = models.CharField(max_length=50, blank=True)
+    industry_rating = models.CharField(max_length=255, blank=True)
+    instrument_type = models.CharField(max_length=50, blank=True)
+    instrument = models.ForeignKey(Instrument, on_delete=models.PROTECT, null=True, blank=True,
+                                   related_name="labels")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["instrument_name", "isin", "industry_rating", "instrument_type"],
+                                    name="holdinglabel_unique_text"),
+        ]
+
+    def __str__(self):
+        return f"{self.instrument_name} ({self.isin})" if self.isin else self.instrument_name
+
+
+class SnapshotHolding(models.Model):
+    """
+    One holding of a PortfolioSnapshot: the numbers, with the text factored out into HoldingLabel.
+    """
+    snapshot = models.ForeignKey(PortfolioSnapshot, on_delete=models.CASCADE, related_name="holdings")
+    label = models.ForeignKey(HoldingLabel, on_delete=models.PROTECT, related_name="holdings")
+    quantity = models.IntegerField(null=True, blank=True)
+    market_value = models.FloatField(null=True, blank=True)
+    percentage_to_nav = models.FloatField(null=True, blank=True)
+    yield_percentage = models.FloatField(null=True, blank=True)
+    ytc = models.FloatField(null=True, blank=True)
+
+
+class IngestionJob(models.Model):
+    """
+    A queued upload, parsed in the background by the run_ingestion_worker command.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    amc = models.ForeignKey(AMC, on_delete=models.CASCADE)
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE)
+    uploaded_file = models.ForeignKey(UploadedFile, on_delete=models.CASCADE, related_name="jobs")
+    # Storage name of the file this job parses; the UploadedFile may point at a newer upload by then
+    file_name = models.CharField(max_length=255, blank=True)
+    sheet_name = models.CharField(max_length=255, blank=True)  # worksheet to parse; blank for the first one
+    file_hash = models.CharField(max_length=64, blank=True, null=True)  # SHA-256 of the queued file
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)  # 0-100, one step per stage (see jobs.PROGRESS_*)
+    result = models.JSONField(default=dict, blank=True)  # category_total / top_sectors / top_holdings
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Job {self.id} ({self.status}) - {self.scheme}"
+
+
+class UploadEvent(models.Model):
+    """
+    One step in the upload history of a scheme: a file received, an identical
+    re-upload skipped, or a parse that ingested or failed, with its row counts and
+    stage timings. Rows are only ever added.
+    """
+    RECEIVED = "received"
+    DUPLICATE = "duplicate"
+    INGESTED = "ingested"
+    FAILED = "failed"
+    OUTCOME_CHOICES = [
+        (RECEIVED, "Received"),
+        (DUPLICATE, "Identical re-upload skipped"),
+        (INGESTED, "Ingested"),
+        (FAILED, "Failed"),
+    ]
+
+    created_at = models.DateTimeField(default=timezone.now)
+    amc = models.ForeignKey(AMC, on_delete=models.CASCADE, db_index=False)
+    # Indexed by uploadevent_scheme_time_idx
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE, related_name="upload_events",
+                               db_index=False)
+    uploaded_file = models.ForeignKey(UploadedFile, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name="events", db_index=False)
+    job = models.ForeignKey(IngestionJob, on_delete=models.SET_NULL, null=True, blank=True,
+                            related_name="events", db_index=False)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    file_hash = models.CharField(max_length=64, blank=True)
+    rows_parsed = models.PositiveIntegerField(null=True, blank=True)
+    rows_written = models.PositiveIntegerField(null=True, blank=True)  # inserted + updated + deleted
+    # Stage durations in seconds: waiting in the queue, reading + parsing the sheet, writing
+    queue_seconds = models.FloatField(null=True, blank=True)
+    parse_seconds = models.FloatField(null=True, blank=True)
+    write_seconds = models.FloatField(null=True, blank=True)
+    message = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        get_latest_by = "created_at"
+        indexes = [
+            models.Index(fields=["scheme", "-created_at"], name="uploadevent_scheme_time_idx"),
+            models.Index(fields=["created_at"], name="uploadevent_time_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scheme} - {self.outcome} ({self.created_at:%Y-%m-%d %H:%M:%S})"
+
+
+class AmfiScheme(models.Model):
+    """
+    A scheme as listed in AMFI's NAVAll.txt, keyed by its AMFI scheme code. The ISINs
+    are those of the scheme's units, which is how portfolios list holdings of other funds.
+    """
+    scheme_code = models.IntegerField(primary_key=True)
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name="amfi_schemes")
+    scheme_name = models.CharField(max_length=255)
+    category = models.CharField(max_length=255, blank=True)
+    isin_growth = models.CharField(max_length=20, blank=True, db_index=True)
+    isin_reinvestment = models.CharField(max_length=20, blank=True, db_index=True)
+    last_nav_date = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.scheme_code} - {self.scheme_name}"
+
+
+class NavHistory(models.Model):
+    """One published NAV of an AMFI scheme; NAVAll.txt prints "N.A." for some, stored as NULL."""
+    # Indexed by the navhistory_unique_scheme_date constraint
+    amfi_scheme = models.ForeignKey(AmfiScheme, on_delete=models.CASCADE, related_name="navs", db_index=False)
+    nav_date = models.DateField()
+    nav = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        get_latest_by = "nav_date"
+        constraints = [
+            models.UniqueConstraint(fields=["amfi_scheme", "nav_date"], name="navhistory_unique_scheme_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.amfi_scheme_id} - {self.nav_date}: {self.nav}"
+
+
+class AmfiSource(models.Model):
+    """HTTP validators and last NAV date of a NAVAll.txt source, for conditional refreshes."""
+    source = models.CharField(max_length=500, unique=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_modified = models.CharField(max_length=255, blank=True)
+    last_nav_date = models.DateField(null=True, blank=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.source
+
+
+class HoldingExposure(models.Model):
+    """
+    Reverse index of the current holdings: per scheme, its total market value and
+    % to NAV in each ISIN and in each industry (or, for debt, rating). Rebuilt from
+    MutualFundData whenever a scheme's current holdings are written (see exposure).
+    """
+    ISIN = "isin"
+    INDUSTRY = "industry"
+    KIND_CHOICES = [
+        (ISIN, "ISIN"),
+        (INDUSTRY, "Industry"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255)  # the ISIN, or exposure.canonical_industry() of the industry
+    label = models.CharField(max_length=255, blank=True)  # instrument name or industry as printed
+    # Indexed by the exposure_unique_scheme_key constraint
+    scheme = models.ForeignKey(MutualFundScheme, on_delete=models.CASCADE, related_name="exposures",
+                               db_index=False)
+    amc = models.ForeignKey(AMC, on_delete=models.CASCADE, db_index=False)
+    market_value = models.FloatField(default=0)
+    percentage_to_nav = models.FloatField(null=True, blank=True)  # as stored by the AMC's sheets
+    holdings = models.PositiveIntegerField(default=0)  # MutualFundData rows added up
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scheme", "kind", "key"], name="exposure_unique_scheme_key"),
+        ]
+        indexes = [
+            models.Index(fields=["kind", "key", "amc"], name="exposure_key_amc_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.scheme} - {self.kind} {self.label or self.key}: {self.market_value}"
@@ -0,0 +1,216 @@
+# overlap.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Exists, Max, OuterRef, Q
+
+from .holdings_api import InvalidQuery, parse_ids
+from .models import Instrument, MutualFundData, MutualFundScheme, PortfolioSnapshot
+
+MAX_SCHEMES = 200
+MAX_CACHED_RESULTS = 32
+
+# Process-wide SchemeWeights per scheme id and overlap results per (scheme, stamp) set;
+# both are keyed on holdings_stamps, so a re-ingested scheme is read again in any process
+_weights = {}
+_results = {}
+_lock = threading.Lock()
+
+
+def holdings_stamps(scheme_ids):
+    """
+    Scheme id -> (number of snapshots, latest snapshot updated_at). Every
+    save_scheme_holdings() call creates or re-stamps a snapshot of the scheme, so
+    the stamp changes whenever its holdings may have been rewritten.
+    """
+    stamps = {scheme_id: (0, None) for scheme_id in scheme_ids}
+    for scheme_id, count, updated in (PortfolioSnapshot.objects.filter(scheme_id__in=scheme_ids)
+                                      .values('scheme_id').annotate(count=Count('id'), updated=Max('updated_at'))
+                                      .values_list('scheme_id', 'count', 'updated')):
+        stamps[scheme_id] = (count, updated)
+    return stamps
+
+
+class SchemeWeights:
+    """
+    A scheme's ISINs (sorted) with each one's share of the market value of the
+    scheme's ISIN holdings. Rows of the same ISIN are added up and short
+    positions count as zero, so weights are comparable across AMCs whatever
+    units their % to NAV column uses.
+    """
+
+    def __init__(self, stamp, isins, market_values):
+        self.stamp = stamp
+        self.isins = isins
+        total = market_values.sum()
+        self.weights = market_values / total if total > 0 else market_values
+
+
+def load_weights(scheme_ids, stamps):
+    """SchemeWeights of `scheme_ids`, read from MutualFundData in one query."""
+    rows = (MutualFundData.objects.filter(scheme_id__in=scheme_ids).exclude(Q(isin__isnull=True) | Q(isin=''))
+            .values_list('scheme_id', 'isin', 'market_value'))
+    holdings = pd.DataFrame.from_records(rows.iterator(chunk_size=5000), columns=['scheme_id', 'isin', 'market_value'])
+    per_isin = holdings['market_value'].fillna(0).groupby([holdings['scheme_id'], holdings['isin']], sort=True).sum()
+
+    weights = {scheme_id: SchemeWeights(stamps[scheme_id], np.array([], dtype=str), np.zeros(0))
+               for scheme_id in scheme_ids}
+    for scheme_id, group in per_isin.groupby(level='scheme_id', sort=False):
+        weights[scheme_id] = SchemeWeights(stamps[scheme_id], group.index.get_level_values('isin').to_numpy(dtype=str),
+                                           group.clip(lower=0).to_numpy())
+    return weights
+
+
+def scheme_weights(scheme_ids, stamps):
+    """SchemeWeights of every scheme, loading only those whose stamp changed since they were cached."""
+    cached = {scheme_id: _weights.get(scheme_id) for scheme_id in scheme_ids}
+    stale = [scheme_id for scheme_id, weights in cached.items() if weights is None or weights.stamp != stamps[scheme_id]]
+    if stale:
+        loaded = load_weights(stale, stamps)
+        with _lock:
+            _weights.update(loaded)
+        cached.update(loaded)
+    return [cached[scheme_id] for scheme_id in scheme_ids]
+
+
+def overlap_matrices(weights):
+    """
+    (common holdings, weight overlap) N x N matrices of a list of SchemeWeights.
+
+    The schemes become rows of a dense weight matrix over only the ISINs held by
+    at least two of them (no other ISIN can overlap); common holdings are then
+    one product of the presence matrix and weight overlap, the sum of the
+    smaller weight over shared ISINs, one vectorized minimum per scheme against
+    the schemes after it.
+    """
+    n = len(weights)
+    isins, positions = np.unique(np.concatenate([w.isins for w in weights] + [np.array([], dtype=str)]),
+                                 return_inverse=True)
+    rows = np.repeat(np.arange(n), [len(w.isins) for w in weights])
+    shared = np.bincount(positions, minlength=len(isins)) > 1
+    columns = np.cumsum(shared) - 1
+    keep = shared[positions]
+
+    matrix = np.zeros((n, int(shared.sum())))
+    matrix[rows[keep], columns[positions[keep]]] = np.concatenate([w.weights for w in weights] + [np.zeros(0)])[keep]
+    presence = np.zeros(matrix.shape, dtype=np.float32)
+    presence[rows[keep], columns[positions[keep]]] = 1
+
+    common = (presence @ presence.T).astype(int)
+    np.fill_diagonal(common, [len(w.isins) for w in weights])
+    weight_overlap = np.zeros((n, n))
+    for i in range(n - 1):
+        weight_overlap[i, i + 1:] = np.minimum(matrix[i], matrix[i + 1:]).sum(axis=1)
+    weight_overlap += weight_overlap.T
+    np.fill_diagonal(weight_overlap, [w.weights.sum() for w in weights])
+    return common, weight_overlap
+
+
+def common_holdings(a, b, names):
+    """
+    ISINs two SchemeWeights share, largest overlapping weight first, as
+    [{"isin", "instrument_name", "weight_a", "weight_b"}]; names come from `names` (ISIN -> name).
+    """
+    _, index_a, index_b = np.intersect1d(a.isins, b.isins, assume_unique=True, return_indices=True)
+    order = np.argsort(-np.minimum(a.weights[index_a], b.weights[index_b]), kind='stable')
+    return [{"isin": str(a.isins[i]), "instrument_name": names.get(a.isins[i], ''),
+             "weight_a": round(float(a.weights[i]) * 100, 2), "weight_b": round(float(b.weights[j]) * 100, 2)}
+            for i, j in zip(index_a[order], index_b[order])]
+
+
+def compute_overlap(schemes, weights, matrix, details):
+    common, weight_overlap = overlap_matrices(weights)
+    result = {
+        "schemes": [{"id": scheme_id, "scheme_name": name, "amc_id": amc_id, "holdings": len(w.isins)}
+                    for (scheme_id, name, amc_id), w in zip(schemes, weights)],
+        "pairs": [],
+    }
+    if details:
+        # Instrument names of the ISINs held by more than one of the schemes, in batches of 500
+        isins, counts = np.unique(np.concatenate([w.isins for w in weights]), return_counts=True)
+        isins = isins[counts > 1].tolist()
+        names = {}
+        for start in range(0, len(isins), 500):
+            names.update(Instrument.objects.filter(isin__in=isins[start:start + 500]).values_list('isin', 'name'))
+    for i, j in zip(*np.triu_indices(len(schemes), k=1)):
+        pair = {"scheme_a": schemes[i][0], "scheme_b": schemes[j][0], "common_holdings": int(common[i, j]),
+                "weight_overlap": round(float(weight_overlap[i, j]) * 100, 2)}
+        if details:
+            pair["common"] = common_holdings(weights[i], weights[j], names)
+        result["pairs"].append(pair)
+    result["pairs"].sort(key=lambda pair: pair["weight_overlap"], reverse=True)
+    if matrix:
+        result["matrix"] = {"common_holdings": common.tolist(),
+                            "weight_overlap": np.round(weight_overlap * 100, 2).tolist()}
+    return result
+
+
+def resolve_schemes(scheme_ids=(), amc_ids=()):
+    """
+    (id, scheme_name, amc_id) of the requested schemes, in id order: the given
+    ids plus every scheme of the given AMCs that has holdings.
+    """
+    schemes = MutualFundScheme.objects.none()
+    if scheme_ids:
+        schemes = MutualFundScheme.objects.filter(id__in=scheme_ids)
+    if amc_ids:
+        schemes = schemes | MutualFundScheme.objects.filter(
+            Exists(MutualFundData.objects.filter(scheme_id=OuterRef('pk'))), amc_id__in=amc_ids)
+    schemes = list(schemes.order_by('id').values_list('id', 'scheme_name', 'amc_id'))
+    missing = set(scheme_ids) - {scheme_id for scheme_id, _, _ in schemes}
+    if missing:
+        raise InvalidQuery(f"Unknown scheme(s): {', '.join(map(str, sorted(missing)))}.")
+    if len(schemes) < 2:
+        raise InvalidQuery("Overlap needs at least two schemes.")
+    if len(schemes) > MAX_SCHEMES:
+        raise InvalidQuery(f"Overlap takes at most {MAX_SCHEMES} schemes, got {len(schemes)}.")
+    return schemes
+
+
+def portfolio_overlap(scheme_ids=(), amc_ids=(), matrix=False, details=False):
+    """
+    Pairwise overlap by ISIN of the current holdings of the given schemes and
+    of the schemes of the given AMCs:
+
+        {"schemes": [{"id", "scheme_name", "amc_id", "holdings"}],
+         "pairs": [{"scheme_a", "scheme_b", "common_holdings", "weight_overlap"}],
+         "matrix": {"common_holdings": [[...]], "weight_overlap": [[...]]}}
+
+    weight_overlap is the % of market value the two schemes hold in common
+    (sum over shared ISINs of the smaller weight); pairs are largest overlap
+    first. "matrix" (N x N, rows and columns in "schemes" order) is only built
+    when asked, and `details` lists the shared holdings of every pair.
+
+    Weights and results are cached per process and reused until one of the
+    schemes is ingested again (see holdings_stamps).
+    """
+    schemes = resolve_schemes(scheme_ids, amc_ids)
+    ids = [scheme_id for scheme_id, _, _ in schemes]
+    stamps = holdings_stamps(ids)
+    key = (tuple((*scheme, stamps[scheme[0]]) for scheme in schemes), bool(matrix), bool(details))
+    result = _results.get(key)
+    if result is None:
+        result = compute_overlap(schemes, scheme_weights(ids, stamps), matrix, details)
+        with _lock:
+            while len(_results) >= MAX_CACHED_RESULTS:
+                del _results[next(iter(_results))]
+            _results[key] = result
+    return result
+
+
+def parse_flag(value):
+    return (value or '').lower() in ('1', 'true', 'yes')
+
+
+def overlap_query(params):
+    """portfolio_overlap() of a QueryDict: scheme and amc (repeatable ids), matrix and details (flags)."""
+    return portfolio_overlap(parse_ids(params, 'scheme'), parse_ids(params, 'amc'),
+                             matrix=parse_flag(params.get('matrix')), details=parse_flag(params.get('details')))
+
+
+def clear_overlap_cache():
+    with _lock:
+        _weights.clear()
+        _results.clear()
@@ -0,0 +1,100 @@
+# reingestion.py
+
+import logging
+import os
+
+from .excel_processing import process_amc_excel_file
+from .models import AMC, MutualFundScheme, UploadedFile
+from .workbook_ingestion import build_scheme_index, match_sheet_scheme
+from .workbook_reader import open_workbook
+
+logger = logging.getLogger(__name__)
+
+
+class ParseErrors(logging.Handler):
+    """Collects the warnings and errors the parsers log while one workbook is parsed."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def upload_tasks(amcs=None, scheme_ids=None):
+    """
+    (label, amc_id, scheme_id, path, sheet_name) for every UploadedFile, optionally
+    filtered. Workbook uploads name the scheme's own sheet; sheet_name None is the first one.
+    """
+    uploads = UploadedFile.objects.select_related('scheme').order_by('id')
+    if amcs:
+        uploads = uploads.filter(amc__in=amcs)
+    if scheme_ids:
+        uploads = uploads.filter(scheme_id__in=scheme_ids)
+    return [(f"{upload.file.name} [{upload.sheet_name}]" if upload.sheet_name else upload.file.name,
+             upload.amc_id, upload.scheme_id, upload.file.path if upload.file else '', upload.sheet_name or None)
+            for upload in uploads]
+
+
+def directory_tasks(directory, amc):
+    """
+    (label, amc_id, scheme_id, path, sheet_name) for every workbook in `directory`.
+
+    The scheme is taken from the first sheet's tab name / title rows; files no
+    scheme of `amc` matches get scheme_id None and are reported as failures.
+    """
+    scheme_index = build_scheme_index(amc)
+    tasks = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.lower().endswith('.xlsx') or not os.path.isfile(path):
+            continue
+        scheme_id = None
+        try:
+            workbook = open_workbook(path)
+            try:
+                scheme_id = match_sheet_scheme(workbook.worksheets[0], scheme_index, amc.name)
+            finally:
+                workbook.close()
+        except Exception as e:
+            logger.warning("Could not open %s: %s", name, e)
+        tasks.append((name, amc.id, scheme_id, path, None))
+    return tasks
+
+
+def parse_upload(task):
+    """
+    Process-pool entry point: parse one workbook without writing anything.
+
+    Returns (task, writes, error) where writes are the save_scheme_holdings()
+    calls the parser asked for, to be replayed by the single writer process.
+    """
+    label, amc_id, scheme_id, path, sheet_name = task
+    if scheme_id is None:
+        return task, [], "no matching scheme"
+    if not os.path.exists(path):
+        return task, [], "file not found"
+
+    writes = []
+
+    def collect(scheme, instruments, uploaded_file=None, **summary):
+        writes.append((instruments, uploaded_file, summary))
+
+    amc = AMC.objects.get(id=amc_id)
+    scheme = MutualFundScheme.objects.get(id=scheme_id)
+    # The parsers log why a sheet was rejected; keep it for the error message
+    errors = ParseErrors()
+    parser_logger = logging.getLogger('upload_excel')
+    parser_logger.addHandler(errors)
+    try:
+        with open(path, 'rb') as file:
+            process_amc_excel_file(amc, scheme, file, writer=collect, sheet_name=sheet_name)
+    except Exception as e:
+        return task, [], str(e)
+    finally:
+        parser_logger.removeHandler(errors)
+
+    if not writes:
+        return task, [], errors.messages[-1] if errors.messages else "nothing parsed"
+    return task, writes, None
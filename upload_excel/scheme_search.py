@@ -0,0 +1,90 @@
+# scheme_search.py
+
+import bisect
+import hashlib
+import itertools
+import threading
+
+from django.db.models import Count, Max
+
+from .models import MutualFundScheme
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Process-wide search index per AMC id, rebuilt when the AMC's scheme_list_stamp changes
+_indexes = {}
+_lock = threading.Lock()
+
+
+def normalize(text):
+    return ' '.join(str(text).casefold().split())
+
+
+def scheme_list_stamp(amc_id):
+    """
+    (number of schemes, latest updated_at) of an AMC: one aggregate over
+    scheme_amc_updated_idx, which changes whenever a scheme is added, renamed
+    or removed, in any process.
+    """
+    stamp = MutualFundScheme.objects.filter(amc_id=amc_id).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return stamp['count'], stamp['updated']
+
+
+class SchemeIndex:
+    """The schemes of one AMC sorted by normalized name, for prefix (bisect) and word searches."""
+
+    def __init__(self, stamp, schemes):
+        self.stamp = stamp
+        self.entries = sorted((normalize(name), name, scheme_id) for scheme_id, name in schemes)
+        self.keys = [key for key, _, _ in self.entries]
+
+    def search(self, query, limit):
+        """
+        Up to `limit` (id, name) pairs: names starting with the query first, then
+        names containing every word of it, each alphabetically. Returns (matches, more).
+        """
+        query = normalize(query)
+        if not query:
+            matches = self.entries[:limit + 1]
+        else:
+            start = bisect.bisect_left(self.keys, query)
+            end = bisect.bisect_left(self.keys, query + '\U0010ffff', lo=start)
+            matches = self.entries[start:min(end, start + limit + 1)]
+            if len(matches) <= limit:
+                # The longest word rules out most names with a single substring test
+                first, *rest = sorted(query.split(), key=len, reverse=True)
+                found = (entry for entry in self.entries
+                         if first in entry[0] and all(word in entry[0] for word in rest)
+                         and not entry[0].startswith(query))
+                matches += itertools.islice(found, limit + 1 - len(matches))
+        return [(scheme_id, name) for _, name, scheme_id in matches[:limit]], len(matches) > limit
+
+
+def scheme_index(amc_id, stamp=None):
+    """The AMC's SchemeIndex, loaded again only if its stamp changed since it was built."""
+    stamp = stamp or scheme_list_stamp(amc_id)
+    index = _indexes.get(amc_id)
+    if index is None or index.stamp != stamp:
+        index = SchemeIndex(stamp, MutualFundScheme.objects.filter(amc_id=amc_id).values_list('id', 'scheme_name'))
+        with _lock:
+            _indexes[amc_id] = index
+    return index
+
+
+def clear_scheme_indexes():
+    with _lock:
+        _indexes.clear()
+
+
+def parse_limit(value):
+    try:
+        return min(max(int(value), 1), MAX_LIMIT)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+
+
+def search_etag(amc_id, stamp, query, limit):
+    count, updated = stamp
+    key = f'{amc_id}:{count}:{updated.isoformat() if updated else ""}:{normalize(query)}:{limit}'
+    return hashlib.sha1(key.encode()).hexdigest()
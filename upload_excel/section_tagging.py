@@ -0,0 +1,113 @@
+# section_tagging.py
+
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+
+def strip_column(series):
+    """Vectorized safe_strip: NaN becomes '', everything else str() and stripped."""
+    return series.fillna('').astype(str).str.strip()
+
+
+def get_column(df, column, default=None):
+    """Return df[column], or a Series filled with `default` when the column is missing."""
+    if column in df.columns:
+        return df[column]
+    return pd.Series([default] * len(df), index=df.index, dtype=object)
+
+
+RULE_PATTERNS = {
+    "startswith": lambda keyword: re.escape(keyword),
+    "contains": lambda keyword: '.*?' + re.escape(keyword),
+    "exact": lambda keyword: re.escape(keyword) + r'\Z',
+    "word": lambda keyword: r'.*?\b' + re.escape(keyword) + r'\b',
+}
+
+
+@lru_cache(maxsize=None)
+def compile_rules(rules):
+    """
+    Compile a tuple of (kind, keyword) rules on lowercased names into one regex.
+
+    kind is one of:
+      "startswith" - name starts with keyword
+      "contains"   - keyword appears anywhere in the name
+      "exact"      - name equals keyword
+      "word"       - keyword appears as a whole word (regex \\b boundaries)
+
+    Rule i becomes the group r<i> and every alternative is anchored at the start of
+    the name. Alternatives are tried in order, so the one group that takes part in a
+    match is the first matching rule - the same answer as testing the rules one by one.
+    """
+    alternatives = []
+    for i, (kind, keyword) in enumerate(rules):
+        if kind not in RULE_PATTERNS:
+            raise ValueError(f"Unknown match kind: {kind}")
+        alternatives.append(f'(?P<r{i}>{RULE_PATTERNS[kind](keyword)})')
+    return re.compile(r'(?s)\A(?:' + '|'.join(alternatives) + ')')
+
+
+@lru_cache(maxsize=None)
+def compile_sections(sections):
+    """compile_rules() of a tuple of (kind, keyword, category) rules. Returns (pattern, categories by rule)."""
+    return compile_rules(tuple((kind, keyword) for kind, keyword, _ in sections)), [c for _, _, c in sections]
+
+
+def first_rules(names, pattern):
+    """
+    Index of the first rule of a compile_rules() pattern matching each name, -1
+    where none does (missing names match nothing): one str.extract over the column.
+    """
+    if not pattern.groups:
+        return np.full(len(names), -1)
+    hits = names.str.extract(pattern).notna().to_numpy()
+    return np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+
+
+def match_sections(names, sections):
+    """Category of the first rule matching each name (None where no rule matches)."""
+    pattern, categories = compile_sections(tuple(sections))
+    section = np.array(categories + [None], dtype=object)[first_rules(names, pattern)]
+    return pd.Series(section, index=names.index, dtype=object)
+
+
+def terminator_position(names, terminators):
+    """Position of the first row matching any terminator, or len(names) if none does."""
+    if not terminators or names.empty:
+        return len(names)
+    hits = (first_rules(names, compile_rules(tuple(tuple(rule) for rule in terminators))) >= 0).nonzero()[0]
+    return int(hits[0]) if len(hits) else len(names)
+
+
+def tag_sections(names, sections, terminators=(), passthrough=()):
+    """
+    Tag every row of a sheet with its section in one pass of whole-column operations.
+
+    names       - Series of cleaned, lowercased instrument names (one per sheet row)
+    sections    - ordered list of (kind, keyword, category) header rules; the first
+                  matching rule wins, exactly like an if/elif chain
+    terminators - list of (kind, keyword); the sheet is cut off at the first match
+    passthrough - categories whose header rows do not change the current category
+
+    Returns a DataFrame (cut off at the terminator row) with columns:
+      name      - the input names
+      section   - category of the matching header rule, None for non-header rows
+      is_header - True for rows matched by a header rule
+      category  - current category of every row (headers forward filled)
+    """
+    names = names.iloc[:terminator_position(names, terminators)]
+    section = match_sections(names, sections)
+
+    is_header = section.notna()
+    category = section.where(~section.isin(list(passthrough))).ffill()
+    category = category.astype(object).where(category.notna(), None)
+
+    return pd.DataFrame({
+        'name': names,
+        'section': section,
+        'is_header': is_header,
+        'category': category,
+    })
@@ -0,0 +1,165 @@
+# sheet_cache.py
+
+import datetime
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+
+from django.conf import settings
+
+# Bump when the reader or the table normalization changes; old entries are then never hit again
+CACHE_VERSION = 3
+
+CACHE_SUFFIX = '.json'
+LEGACY_SUFFIXES = ('.pkl',)  # entries of earlier versions, only ever evicted
+
+# Cell values JSON has no type for, tagged as {tag: text}
+CELL_TYPES = [
+    ('datetime', datetime.datetime, datetime.datetime.fromisoformat),
+    ('date', datetime.date, datetime.date.fromisoformat),
+    ('time', datetime.time, datetime.time.fromisoformat),
+]
+CELL_PARSERS = {tag: parse for tag, _, parse in CELL_TYPES}
+
+
+def cache_enabled():
+    """Whether parsed sheets are cached (settings.PARSED_SHEET_CACHE)."""
+    return getattr(settings, 'PARSED_SHEET_CACHE', True)
+
+
+def cache_dir():
+    return str(getattr(settings, 'PARSED_SHEET_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'parsed_sheets')))
+
+
+def cache_max_bytes():
+    """Size above which the least recently used entries are evicted (settings.PARSED_SHEET_CACHE_MAX_BYTES)."""
+    return getattr(settings, 'PARSED_SHEET_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+
+def describe_option(value):
+    """JSON-able, stable description of a read option (column predicates by their dotted name)."""
+    if isinstance(value, re.Pattern):
+        return value.pattern
+    if callable(value):
+        return f"{value.__module__}.{value.__qualname__}"
+    if isinstance(value, (list, tuple)):
+        return [describe_option(item) for item in value]
+    return value
+
+
+def sheet_cache_key(file_hash, sheet, **read_options):
+    """
+    Cache key of one parsed sheet: the workbook's content hash, the sheet and the
+    parser's read options (header row, columns, terminators), which change
+    whenever an AMC parser's layout changes.
+    """
+    options = {name: describe_option(value) for name, value in read_options.items()}
+    payload = json.dumps([CACHE_VERSION, file_hash, sheet, options], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_path(key):
+    return os.path.join(cache_dir(), key[:2], key + CACHE_SUFFIX)
+
+
+def encode_cell(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return {'float': repr(value)}
+    for tag, cell_type, _ in CELL_TYPES:
+        if isinstance(value, cell_type):
+            return {tag: value.isoformat()}
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    raise TypeError(f"cannot cache a {type(value).__name__} cell")
+
+
+def decode_cell(value):
+    if isinstance(value, dict):
+        (tag, text), = value.items()
+        return float(text) if tag == 'float' else CELL_PARSERS[tag](text)
+    return value
+
+
+def load_sheet(key):
+    """
+    The cached (rows, portfolio_date) for `key`, or None on a miss. rows are the
+    header row and the table rows as the streaming reader yielded them.
+    """
+    path = cache_path(key)
+    try:
+        with open(path, encoding='utf-8') as file:
+            entry = json.load(file)
+        rows = [[decode_cell(value) for value in row] for row in entry['rows']]
+        portfolio_date = entry['portfolio_date'] and datetime.date.fromisoformat(entry['portfolio_date'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    try:
+        os.utime(path)  # mark as recently used for eviction
+    except OSError:
+        pass
+    return rows, portfolio_date
+
+
+def store_sheet(key, rows, portfolio_date):
+    """Write a sheet's rows and portfolio date to the cache atomically, then evict down to the size limit."""
+    try:
+        # Plain JSON, so loading an entry can never run code; floats keep their exact value
+        payload = json.dumps({'rows': [[encode_cell(value) for value in row] for row in rows],
+                              'portfolio_date': portfolio_date.isoformat() if portfolio_date else None})
+    except TypeError:
+        return  # a cell type JSON cannot carry: the sheet is simply not cached
+    path = cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as tmp:
+        tmp.write(payload)
+    os.replace(tmp_path, path)
+    evict(cache_max_bytes())
+
+
+def cache_entries():
+    """(path, size, last_used) of every cached sheet."""
+    entries = []
+    root = cache_dir()
+    if not os.path.isdir(root):
+        return entries
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith((CACHE_SUFFIX, *LEGACY_SUFFIXES)):
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+    return entries
+
+
+def evict(max_bytes):
+    """Delete least recently used entries until the cache fits in `max_bytes`. Returns the number removed."""
+    entries = cache_entries()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def clear_cache():
+    """Delete every cached sheet. Returns the number removed."""
+    return evict(0)
+
+
+def cache_stats():
+    entries = cache_entries()
+    return len(entries), sum(size for _, size, _ in entries)
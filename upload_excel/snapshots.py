@@ -0,0 +1,33 @@
+# snapshots.py
+
+from django.db.models import F
+
+from .models import PortfolioSnapshot, SnapshotHolding
+
+LABEL_FIELDS = ['instrument_name', 'isin', 'industry_rating', 'instrument_type']
+NUMBER_FIELDS = ['quantity', 'market_value', 'percentage_to_nav', 'yield_percentage', 'ytc']
+
+
+def latest_snapshot(scheme):
+    """The scheme's most recent snapshot (one index seek on scheme, portfolio_date), or None."""
+    return PortfolioSnapshot.objects.filter(scheme=scheme).order_by('-portfolio_date').first()
+
+
+def scheme_history(scheme):
+    """Portfolio date and summary of every snapshot of the scheme, newest first."""
+    return (PortfolioSnapshot.objects.filter(scheme=scheme).order_by('-portfolio_date')
+            .values('id', 'portfolio_date', 'category_total', 'top_sectors', 'top_holdings'))
+
+
+def snapshot_holdings(snapshot):
+    """The holdings of a snapshot as dicts with the MutualFundData column names, largest first."""
+    return (SnapshotHolding.objects.filter(snapshot=snapshot).order_by('-market_value', 'id')
+            .values(*NUMBER_FIELDS, **{field: F(f'label__{field}') for field in LABEL_FIELDS}))
+
+
+def isin_history(isin):
+    """Every snapshot holding of an ISIN: scheme, portfolio date and numbers, newest first."""
+    return (SnapshotHolding.objects.filter(label__instrument__isin=isin)
+            .order_by('-snapshot__portfolio_date', 'snapshot__scheme_id')
+            .values(*NUMBER_FIELDS, scheme_id=F('snapshot__scheme_id'),
+                    portfolio_date=F('snapshot__portfolio_date')))
@@ -0,0 +1,46 @@
+# sqlite_tuning.py
+
+import re
+
+from django.conf import settings
+
+# Pragma values are plain numbers or keywords (e.g. "normal"), never SQL
+PRAGMA_VALUE = re.compile(r'^-?\w+$')
+JOURNAL_MODES = ['delete', 'truncate', 'persist', 'memory', 'wal', 'off']
+
+
+def get_pragmas():
+    """PRAGMAs run on every new SQLite connection (settings.SQLITE_PRAGMAS)."""
+    return getattr(settings, 'SQLITE_PRAGMAS', {})
+
+
+def pragma_statements(pragmas):
+    statements = []
+    for name, value in pragmas.items():
+        value = str(value)
+        if not name.isidentifier() or not PRAGMA_VALUE.match(value):
+            raise ValueError(f"Invalid SQLite pragma: {name} = {value}")
+        if name == 'journal_mode':
+            # Stored in the database file, so setting it per connection would rewrite the file
+            raise ValueError("journal_mode is not a per-connection pragma; set it with "
+                             "`python manage.py sqlite_journal_mode`")
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+def journal_mode(connection, mode=None):
+    """The database's journal mode, after switching it to `mode` if given (a WAL database stays WAL)."""
+    if mode is not None and mode not in JOURNAL_MODES:
+        raise ValueError(f"Invalid SQLite journal mode: {mode}")
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA journal_mode = {mode}" if mode else "PRAGMA journal_mode")
+        return cursor.fetchone()[0]
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """connection_created receiver: tune each new SQLite connection with the configured pragmas."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(get_pragmas()):
+            cursor.execute(statement)
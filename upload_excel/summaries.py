@@ -0,0 +1,156 @@
+# summaries.py
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import F, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce, NullIf
+
+from .amc_layouts import compile_layout
+from .models import MutualFundData, PortfolioSnapshot, UploadedFile
+
+TOP_N = 5
+
+
+def top_sectors(sectors, market_values, n=TOP_N):
+    """
+    The n sectors with the largest summed market value, as [{"industry", "investment"}].
+    Sums are accumulated in row order and ties keep first-appearance order.
+    """
+    sectors = pd.Series(sectors, dtype=object)
+    keep = (sectors != '') & sectors.notna()
+    codes, names = pd.factorize(sectors[keep], sort=False)
+    if not len(names):
+        return []
+    totals = np.bincount(codes, weights=np.asarray(market_values, dtype=float)[keep.to_numpy()], minlength=len(names))
+    order = np.argsort(-totals, kind='stable')[:n]
+    return [{"industry": names[i], "investment": round(float(totals[i]), 2)} for i in order]
+
+
+def top_holdings(names, nav_percentages, n=TOP_N):
+    """The n holdings with the largest % to NAV, as [{"instrument_name", "nav_percentage"}]; ties keep row order."""
+    navs = np.asarray(nav_percentages, dtype=float)
+    order = np.argsort(-navs, kind='stable')[:n]
+    names = pd.Series(names, dtype=object).tolist()
+    return [{"instrument_name": names[i], "nav_percentage": round(float(navs[i]), 2)} for i in order]
+
+
+def category_totals(category_sums, layout):
+    """The layout's category_total keys (see amc_layouts) from per-category market value sums."""
+    if layout['category_total'] is None:
+        return {category: category_sums.get(category, 0) for category in layout['section_categories']}
+    totals = {}
+    for key, parts in layout['category_total'].items():
+        total = category_sums.get(parts[0], 0)
+        for part in parts[1:]:
+            total = total + category_sums.get(part, 0)
+        totals[key] = total
+    return totals
+
+
+def build_summary(holdings, category_sums, layout):
+    """
+    The summary of a scheme: category_total, top_sectors and top_holdings.
+
+    `holdings` is a DataFrame of the scheme's holdings in row order with the columns
+    name, isin, sector, market_value and nav_percentage; only rows with an ISIN
+    count towards the top sectors and top holdings. `category_sums` maps section
+    categories to their market value.
+    """
+    with_isin = holdings[(holdings['isin'] != '') & holdings['isin'].notna()]
+    return {
+        "category_total": category_totals(category_sums, layout),
+        "top_sectors": top_sectors(with_isin['sector'], with_isin['market_value']),
+        "top_holdings": top_holdings(with_isin['name'], with_isin['nav_percentage']),
+    }
+
+
+def stored_category_sums(category_sums):
+    """`category_sums` as JSON for PortfolioSnapshot.category_sums; categories outside any section are dropped."""
+    return {category: total.item() if isinstance(total, np.generic) else total
+            for category, total in category_sums.items() if category is not None}
+
+
+def stored_summary(scheme_id, layout, n=TOP_N):
+    """
+    The top holdings and top sectors of a scheme, from its current MutualFundData
+    rows with an ISIN, with one ORDER BY ... LIMIT query and one GROUP BY query.
+    Ties go by row id: the sheet's order, except for rows a diff rewrote in
+    place (build_summary() keeps the sheet's order). Sectors are grouped on the
+    stored industry/rating (the Instrument's when blank, as HoldingExposure
+    groups them).
+
+    Only what the rows store is returned: no top holdings for layouts that name
+    them as printed rather than as stored, no top sectors for layouts that group
+    them on a sector column of their own (see amc_layouts).
+    """
+    rows = MutualFundData.objects.filter(scheme_id=scheme_id).exclude(Q(isin__isnull=True) | Q(isin=''))
+    summary = {}
+    if layout['top_holding_names'] == 'stored':
+        holdings = (rows.order_by(F('percentage_to_nav').desc(nulls_last=True), 'id')
+                    .values_list('instrument_name', 'percentage_to_nav')[:n])
+        summary["top_holdings"] = [
+            {"instrument_name": name, "nav_percentage": round(nav, 2) if nav is not None else nav}
+            for name, nav in holdings
+        ]
+    if 'sector' not in layout['columns']:
+        sectors = (
+            rows.annotate(sector=Coalesce(NullIf('industry_rating', Value('')), F('instrument__industry_rating')))
+            .exclude(Q(sector__isnull=True) | Q(sector=''))
+            .values('sector')
+            .annotate(total=Sum('market_value'), first=Min('id'))
+            .order_by(F('total').desc(nulls_last=True), 'first')[:n]
+        )
+        summary["top_sectors"] = [{"industry": row['sector'], "investment": round(row['total'] or 0, 2)}
+                                  for row in sectors]
+    return summary
+
+
+def stored_summaries(scheme_ids=None):
+    """
+    Scheme id -> (UploadedFile, latest PortfolioSnapshot, summary) of every
+    scheme with an UploadedFile and a layout, the summary rebuilt from the stored
+    rows without reading any workbook: the category totals from the snapshot's
+    category_sums with the AMC's current layout, the rest from stored_summary().
+    What the rows cannot give keeps its stored value, as do the category totals
+    of snapshots stored before category_sums was kept.
+    """
+    uploads = UploadedFile.objects.all()
+    if scheme_ids:
+        uploads = uploads.filter(scheme_id__in=scheme_ids)
+    summaries = {}
+    for upload in uploads.select_related('amc').only('scheme_id', 'amc__name', 'category_total', 'top_sectors',
+                                                     'top_holdings'):
+        layout = compile_layout(upload.amc.name)
+        snapshot = PortfolioSnapshot.objects.filter(scheme_id=upload.scheme_id).order_by('-portfolio_date').first()
+        if layout is None or snapshot is None:
+            continue
+        summary = stored_summary(upload.scheme_id, layout)
+        if snapshot.category_sums is None:
+            summary['category_total'] = upload.category_total
+        else:
+            summary['category_total'] = category_totals(snapshot.category_sums, layout)
+        summary.setdefault('top_sectors', upload.top_sectors)
+        summary.setdefault('top_holdings', upload.top_holdings)
+        summaries[upload.scheme_id] = (upload, snapshot, summary)
+    return summaries
+
+
+def recompute_summaries(scheme_ids=None, batch_size=500):
+    """
+    Rewrite the summaries of the UploadedFiles and of their schemes' latest
+    PortfolioSnapshot from the stored rows (see stored_summaries), in one
+    transaction. Returns the number of uploads rewritten.
+    """
+    fields = ['category_total', 'top_sectors', 'top_holdings']
+    uploads, snapshots = [], []
+    for upload, snapshot, summary in stored_summaries(scheme_ids).values():
+        for record in (upload, snapshot):
+            for field in fields:
+                setattr(record, field, summary[field])
+        uploads.append(upload)
+        snapshots.append(snapshot)
+    with transaction.atomic():
+        UploadedFile.objects.bulk_update(uploads, fields, batch_size=batch_size)
+        PortfolioSnapshot.objects.bulk_update(snapshots, fields, batch_size=batch_size)
+    return len(uploads)
@@ -1,3 +1,952 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import shutil
+import tempfile
+import unittest
 
-# Create your tests here.
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+from openpyxl import Workbook, load_workbook
+
+from .amc_layouts import AMC_LAYOUTS, COLUMN_DEFAULTS, compile_layout, resolve_columns
+from .analytics_export import MANIFEST, PARTITION_FILE, parquet_engine_available
+from .fetch_amc_data import iter_navall, latest_navs, refresh_amfi, sync_schemes
+from .ingestion import save_scheme_holdings
+from .instruments import clear_instrument_cache, instrument_ids
+from .jobs import claim_next_job, requeue_stale_jobs, run_job
+from .models import (AMC, AmfiScheme, IngestionJob, Instrument, MutualFundData, MutualFundScheme, PortfolioSnapshot,
+                     UploadEvent, UploadedFile)
+from .overlap import clear_overlap_cache
+from .management.commands.benchmark_section_tagging import per_rule_sections
+from .reingestion import parse_upload, upload_tasks
+from .scheme_search import clear_scheme_indexes
+from .section_tagging import tag_sections
+from .sheet_cache import cache_path, cache_stats, load_sheet, store_sheet
+from .sqlite_tuning import apply_pragmas, journal_mode, pragma_statements
+from .upload_events import timing_trends, upload_history
+from .upload_handlers import file_content_hash
+from .workbook_ingestion import enqueue_workbook
+from .workbook_reader import read_portfolio_sheet
+
+SBI_HEADER = ['Name of the Instrument / Issuer', 'ISIN', 'Rating / Industry^', 'Quantity',
+              'Market value\n(Rs. in Lakhs)', '% to AUM', 'YTM %', 'YTC %##']
+
+HDFC = ('HDFC Bank Ltd.', 'INE040A01034', 'Banks', 100, 600.0, 60.0)
+INFOSYS = ('Infosys Ltd.', 'INE009A01021', 'IT - Software', 50, 400.0, 40.0)
+TCS = ('Tata Consultancy Services Ltd.', 'INE467B01029', 'IT - Software', 20, 300.0, 30.0)
+
+
+def add_sbi_sheet(workbook, title, scheme_name, portfolio_date, holdings):
+    """A sheet laid out like SBI's monthly portfolio: title rows, the header on row 6, one equity section."""
+    sheet = workbook.create_sheet(title)
+    sheet.append([None])
+    sheet.append(['SBI Mutual Fund'])
+    sheet.append(['SCHEME NAME :', scheme_name])
+    sheet.append(['PORTFOLIO STATEMENT AS ON :', portfolio_date])
+    sheet.append([None])
+    sheet.append(SBI_HEADER)
+    sheet.append(['EQUITY & EQUITY RELATED'])
+    for name, isin, industry, quantity, market_value, nav in holdings:
+        sheet.append([name, isin, industry, quantity, market_value, nav, None, None])
+    sheet.append(['Total', None, None, None, sum(h[4] for h in holdings), sum(h[5] for h in holdings)])
+    sheet.append(['Grand Total', None, None, None, sum(h[4] for h in holdings), 100])
+    return sheet
+
+
+def sbi_workbook(*sheets, name='portfolio.xlsx'):
+    """An uploadable .xlsx of (title, scheme name, portfolio date, holdings) sheets."""
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for title, scheme_name, portfolio_date, holdings in sheets:
+        add_sbi_sheet(workbook, title, scheme_name, portfolio_date, holdings)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+def rows_workbook(rows, name='portfolio.xlsx'):
+    """An uploadable .xlsx of one sheet with these rows, for the layouts of other AMCs."""
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+
+
+def scheme_workbook(scheme, portfolio_date, holdings):
+    return sbi_workbook(('Portfolio', scheme.scheme_name, portfolio_date, holdings))
+
+
+def store_holdings(scheme, holdings, portfolio_date=datetime.date(2025, 1, 31)):
+    """save_scheme_holdings() of (name, ISIN, industry, quantity, market value, % to NAV) equity holdings."""
+    instruments = [MutualFundData(amc=scheme.amc, scheme=scheme, instrument_name=name, isin=isin,
+                                  industry_rating=industry, quantity=quantity, market_value=market_value,
+                                  percentage_to_nav=nav, instrument_type='Equity')
+                   for name, isin, industry, quantity, market_value, nav in holdings]
+    return save_scheme_holdings(scheme, instruments, portfolio_date=portfolio_date)
+
+
+class IngestionTestCase(TestCase):
+    """Uploads land in a temporary MEDIA_ROOT and are parsed without the parsed-sheet cache."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root, PARSED_SHEET_CACHE=False)
+        cls.settings_override.enable()
+        logging.disable(logging.INFO)  # ingestion progress; parse warnings still show
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        self.amc = AMC.objects.create(name='SBI Mutual Fund')
+        self.scheme = MutualFundScheme.objects.create(amc=self.amc, scheme_name='SBI Blue Chip Fund')
+        self.other_scheme = MutualFundScheme.objects.create(amc=self.amc, scheme_name='SBI Small Cap Fund')
+
+    def upload(self, file, scheme=None):
+        scheme = scheme or self.scheme
+        return self.client.post(reverse('upload_file'), {'amc': scheme.amc_id, 'scheme': scheme.id, 'file': file})
+
+    def holdings(self, scheme=None):
+        return sorted(MutualFundData.objects.filter(scheme=scheme or self.scheme).values_list('isin', 'market_value'))
+
+
+class IngestionJobTests(IngestionTestCase):
+    def test_upload_is_queued_and_parsed_by_the_worker(self):
+        response = self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC, INFOSYS]))
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertEqual(self.holdings(), [])
+
+        self.assertEqual(run_job(job_id), IngestionJob.DONE)
+        self.assertEqual(self.holdings(), [('INE009A01021', 400.0), ('INE040A01034', 600.0)])
+        status = self.client.get(response.json()['status_url']).json()
+        self.assertEqual(status['status'], IngestionJob.DONE)
+        self.assertEqual(status['data']['rows'], 2)
+
+    def test_job_parses_the_file_it_was_queued_with(self):
+        first = scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC])
+        second = scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [INFOSYS])
+        first_job = self.upload(first).json()['job_id']
+        second_job = self.upload(second).json()['job_id']
+
+        # Each job reads its own file and moves the UploadedFile to it once ingested
+        first_name, second_name = IngestionJob.objects.order_by('id').values_list('file_name', flat=True)
+        run_job(first_job)
+        self.assertEqual(self.holdings(), [('INE040A01034', 600.0)])
+        uploaded_file = UploadedFile.objects.get(scheme=self.scheme)
+        self.assertEqual((uploaded_file.file.name, uploaded_file.file_hash), (first_name, file_content_hash(first)))
+
+        run_job(second_job)
+        self.assertEqual(self.holdings(), [('INE009A01021', 400.0)])
+        uploaded_file.refresh_from_db()
+        self.assertEqual((uploaded_file.file.name, uploaded_file.file_hash), (second_name, file_content_hash(second)))
+
+    def test_progress_is_recorded_after_each_step(self):
+        job_id = self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC])).json()['job_id']
+        self.assertEqual(claim_next_job(), job_id)
+        with CaptureQueriesContext(connection) as queries:
+            run_job(job_id)
+        steps = [int(step) for query in queries if query['sql'].startswith('UPDATE "upload_excel_ingestionjob"')
+                 for step in re.findall(r'"progress" = (\d+)', query['sql'])]
+        self.assertEqual(steps, [20, 60, 95, 100])
+
+    def test_starting_worker_only_requeues_stale_jobs(self):
+        first = self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC])).json()['job_id']
+        second = self.upload(scheme_workbook(self.other_scheme, datetime.date(2025, 1, 31), [INFOSYS]),
+                             scheme=self.other_scheme).json()['job_id']
+        self.assertEqual(claim_next_job(), first)
+
+        # A second worker starting up leaves the first worker's job running and takes the next one
+        self.assertEqual(requeue_stale_jobs(), 0)
+        self.assertEqual(claim_next_job(), second)
+        self.assertEqual(IngestionJob.objects.get(id=first).status, IngestionJob.RUNNING)
+
+        # Once the first worker has been gone for longer than INGESTION_STALE_AFTER, its job is queued again
+        IngestionJob.objects.filter(id=first).update(started_at=now() - datetime.timedelta(hours=1))
+        with self.settings(INGESTION_STALE_AFTER=1800):
+            self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual(IngestionJob.objects.get(id=first).status, IngestionJob.QUEUED)
+        self.assertEqual(IngestionJob.objects.get(id=second).status, IngestionJob.RUNNING)
+
+
+class SnapshotTests(IngestionTestCase):
+    def ingest(self, file):
+        return run_job(self.upload(file).json()['job_id'])
+
+    def test_dateless_sheet_replaces_the_latest_snapshot(self):
+        self.ingest(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC]))
+        self.ingest(scheme_workbook(self.scheme, None, [INFOSYS]))
+        self.ingest(scheme_workbook(self.scheme, None, [HDFC, INFOSYS]))
+
+        snapshot = PortfolioSnapshot.objects.get(scheme=self.scheme)
+        self.assertEqual(snapshot.portfolio_date, datetime.date(2025, 1, 31))
+        self.assertEqual(self.holdings(), [('INE009A01021', 400.0), ('INE040A01034', 600.0)])
+
+    def test_older_month_does_not_move_the_uploaded_file_back(self):
+        february = scheme_workbook(self.scheme, datetime.date(2025, 2, 28), [INFOSYS])
+        self.ingest(february)
+        uploaded_file = UploadedFile.objects.get(scheme=self.scheme)
+        current = (uploaded_file.file.name, uploaded_file.file_hash, uploaded_file.category_total)
+
+        self.assertEqual(self.ingest(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC])),
+                         IngestionJob.DONE)
+        uploaded_file.refresh_from_db()
+        self.assertEqual((uploaded_file.file.name, uploaded_file.file_hash, uploaded_file.category_total), current)
+        self.assertEqual(uploaded_file.file_hash, file_content_hash(february))
+        self.assertEqual(self.holdings(), [('INE009A01021', 400.0)])
+        self.assertEqual(list(PortfolioSnapshot.objects.filter(scheme=self.scheme).order_by('portfolio_date')
+                              .values_list('portfolio_date', flat=True)),
+                         [datetime.date(2025, 1, 31), datetime.date(2025, 2, 28)])
+
+
+class AmcLayoutTests(IngestionTestCase):
+    """The layout specs, and the JM and ICICI paths of parse_portfolio_sheet on small sheets laid out like theirs."""
+
+    def ingest(self, amc_name, rows):
+        amc = AMC.objects.create(name=amc_name)
+        scheme = MutualFundScheme.objects.create(amc=amc, scheme_name=f'{amc_name} Scheme')
+        self.assertEqual(run_job(self.upload(rows_workbook(rows), scheme=scheme).json()['job_id']), IngestionJob.DONE)
+        rows = MutualFundData.objects.filter(scheme=scheme).order_by('id').values_list(
+            'instrument_name', 'isin', 'industry_rating', 'market_value', 'instrument_type')
+        return list(rows), UploadedFile.objects.get(scheme=scheme)
+
+    def test_jm_counts_each_total_once_per_block(self):
+        rows, uploaded_file = self.ingest('JM Financial Mutual Fund', [
+            ['JM Financial Mutual Fund'],
+            ['JM Flexicap Fund'],
+            ['Monthly Portfolio Statement for the period ended 31.01.2025'],
+            ['Name of the Instruments', 'Industry/Rating', 'Quantity', 'Market Value (Rs. In Lakhs)', '% age to NAV',
+             'ISIN', 'Yield %', '^YTC (AT1/Tier 2 bonds)'],
+            ['EQUITY & EQUITY RELATED'],
+            ['a) Listed/Awaiting Listing On Stock Exchange'],
+            ['HDFC Bank Ltd.', 'Banks', 100, 600, 46.15, 'INE040A01034'],
+            ['Infosys Ltd.', 'IT - Software', 50, 400, 30.77, 'INE009A01021'],
+            ['Sub Total:', None, None, 1000, 76.92],
+            ['Total:', None, None, 1000, 76.92],
+            ['MONEY MARKET INSTRUMENTS'],
+            ['Punjab National Bank CD', 'CARE A1+', 500, 250, 19.23, 'INE160A16QA8', 7.25],
+            ['Sub Total:', None, None, 250, 19.23],
+            ['TREPS-Triparty Repo', None, 0, 40, 3.08, '', 6.64],
+            ['Sub Total:', None, None, 40, 3.08],
+            ['Total:', None, None, 290, 22.31],
+            ['Net Current Assets', None, None, 10, 0.77],
+            ['Net Assets', None, None, 1300, 100],
+        ])
+        self.assertEqual(rows, [
+            ('hdfc bank ltd.', 'INE040A01034', 'Banks', 600.0, 'Equity'),
+            ('infosys ltd.', 'INE009A01021', 'IT - Software', 400.0, 'Equity'),
+            ('punjab national bank cd', 'INE160A16QA8', 'CARE A1+', 250.0, 'Money Market'),
+        ])
+        # Each sub total counts once; a "Total:" row repeating a counted category does not
+        self.assertEqual(uploaded_file.category_total,
+                         {'Equity': 1000, 'Debt': 0, 'Others': 300, 'Total Market Value': 1300})
+        self.assertEqual(uploaded_file.top_sectors, [{'industry': 'Banks', 'investment': 600.0},
+                                                     {'industry': 'IT - Software', 'investment': 400.0},
+                                                     {'industry': 'CARE A1+', 'investment': 250.0}])
+        self.assertEqual(uploaded_file.top_holdings[0], {'instrument_name': 'hdfc bank ltd.', 'nav_percentage': 46.15})
+
+    def test_layout_specs_are_consistent(self):
+        self.assertIsNone(compile_layout('Unknown Mutual Fund'))
+        for amc_name in AMC_LAYOUTS:
+            with self.subTest(amc_name):
+                layout = compile_layout(amc_name)
+                categories = set(layout['section_categories'])
+                self.assertIn('name', layout['columns'])
+                self.assertLessEqual(set(layout['passthrough']), categories)
+                self.assertLessEqual(layout['header_totals'], categories)
+                for parts in (layout['category_total'] or {}).values():
+                    self.assertLessEqual(set(parts), categories)
+                self.assertLessEqual(set(layout['columns']), set(COLUMN_DEFAULTS) | {'sector'})
+
+    def test_columns_resolve_by_alias_then_pattern(self):
+        layout = compile_layout('SBI Mutual Fund')
+        columns = ['Name of the Instrument / Issuer', 'ISIN', 'Rating / Industry^', 'Quantity',
+                   'Market Value as on 31.01.2025', '% to AUM', 'YTM %']
+        self.assertEqual(resolve_columns(layout, columns), {
+            'name': 'Name of the Instrument / Issuer', 'isin': 'ISIN', 'sector': 'Rating / Industry^',
+            'quantity': 'Quantity', 'market_value': 'Market Value as on 31.01.2025', 'nav': '% to AUM',
+            'yield': 'YTM %',
+        })
+        layout = compile_layout('ICICI Prudential Mutual Fund')
+        self.assertEqual(resolve_columns(layout, ['Exposure/MarketValue(Rs.Lakh)'])['market_value'],
+                         'Exposure/MarketValue(Rs.Lakh)')
+
+    def test_sheet_without_a_required_column_is_rejected(self):
+        header = [column for column in SBI_HEADER if column != '% to AUM']
+        workbook = rows_workbook([[None], ['SBI Mutual Fund'], ['SCHEME NAME :', self.scheme.scheme_name], [None],
+                                  [None], header, ['EQUITY & EQUITY RELATED'], [*HDFC[:2], *HDFC[2:5]]])
+        with self.assertLogs('upload_excel', 'WARNING') as logs:
+            self.assertEqual(run_job(self.upload(workbook).json()['job_id']), IngestionJob.FAILED)
+        self.assertIn('required columns not found: nav', '\n'.join(logs.output))
+        self.assertEqual(self.holdings(), [])
+
+    def test_icici_takes_totals_from_section_headers(self):
+        header = [None, 'Company/Issuer/Instrument Name', 'ISIN', 'Coupon', 'Industry/Rating', 'Quantity',
+                  'Exposure/Market Value(Rs.Lakh)', '% to Nav', 'Yield of the instrument', 'Yield to Call @']
+        rows, uploaded_file = self.ingest('ICICI Prudential Mutual Fund', [
+            [None, 'ICICI Prudential Mutual Fund'],
+            [None, 'ICICI PRUDENTIAL BLUECHIP FUND'],
+            [None, 'Portfolio as on Jan 31,2025'],
+            header,
+            [None, 'Equity & Equity Related Instruments', '', '', '', '', 1000, 0.8, '', ''],
+            [None, 'HDFC Bank Ltd.', 'INE040A01034', '', 'Banks', 100, 600, 0.48, '', ''],
+            [None, 'Infosys Ltd.', 'INE009A01021', '', 'IT - Software', 50, 400, 0.32, '', ''],
+            [None, 'TREPS', '', '', '', '', 200, 0.16, '', ''],
+            [None, 'Net Current Assets', '', '', '', '', 50, 0.04, '', ''],
+            [None, 'Total Net Assets', '', '', '', '', 1250, 1, '', ''],
+        ])
+        # Every row is stored, headers included, with the industry/rating column left blank
+        self.assertEqual([(name, isin, market_value, category) for name, isin, _, market_value, category in rows], [
+            ('equity & equity related instruments', '', 1000.0, 'Equity'),
+            ('hdfc bank ltd.', 'INE040A01034', 600.0, 'Equity'),
+            ('infosys ltd.', 'INE009A01021', 400.0, 'Equity'),
+            ('treps', '', 200.0, 'Treps'),
+            ('net current assets', '', 50.0, 'Net Current Assets'),
+        ])
+        self.assertEqual({category: total for category, total in uploaded_file.category_total.items() if total},
+                         {'Equity': 1000, 'Treps': 200, 'Net Current Assets': 50})
+        self.assertEqual(uploaded_file.top_sectors, [{'industry': 'Banks', 'investment': 600.0},
+                                                     {'industry': 'IT - Software', 'investment': 400.0}])
+        # Top holdings keep the names as printed
+        self.assertEqual([holding['instrument_name'] for holding in uploaded_file.top_holdings],
+                         ['HDFC Bank Ltd.', 'Infosys Ltd.'])
+
+
+class UploadEventTests(IngestionTestCase):
+    def test_each_stage_of_an_upload_is_logged(self):
+        run_job(self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC, INFOSYS])).json()['job_id'])
+        workbook = Workbook()
+        workbook.active.append(['Not a portfolio'])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        with self.assertLogs('upload_excel', 'ERROR'):
+            run_job(self.upload(SimpleUploadedFile('notes.xlsx', buffer.getvalue())).json()['job_id'])
+
+        history = upload_history(self.scheme)
+        self.assertEqual([event['outcome'] for event in history],
+                         [UploadEvent.FAILED, UploadEvent.RECEIVED, UploadEvent.INGESTED, UploadEvent.RECEIVED])
+        failed, ingested = history[0], history[2]
+        self.assertEqual(failed['message'], 'ValueError: No holdings could be read for SBI Blue Chip Fund')
+        self.assertEqual((ingested['rows_parsed'], ingested['rows_written']), (2, 2))
+        self.assertIsNotNone(ingested['write_seconds'])
+        self.assertEqual([day['uploads'] for day in timing_trends(amc=self.amc)], [1])
+
+
+class WorkbookUploadTests(IngestionTestCase):
+    def upload_workbook(self, file):
+        return self.client.post(reverse('upload_workbook'), {'amc': self.amc.id, 'file': file})
+
+    def test_workbook_is_queued_one_job_per_sheet(self):
+        workbook = sbi_workbook(('BLUECHIP', self.scheme.scheme_name, datetime.date(2025, 1, 31), [HDFC]),
+                                ('SMALLCAP', self.other_scheme.scheme_name, datetime.date(2025, 1, 31), [INFOSYS]),
+                                ('NOTES', 'Disclaimer', None, [TCS]))
+        response = self.upload_workbook(workbook)
+        self.assertEqual(response.status_code, 202)
+        report = response.json()['data']
+        self.assertEqual(report['unmatched'], ['NOTES'])
+        self.assertEqual([(entry['sheet'], entry['scheme_id'], entry['status']) for entry in report['queued']],
+                         [('BLUECHIP', self.scheme.id, 'queued'), ('SMALLCAP', self.other_scheme.id, 'queued')])
+        self.assertEqual(MutualFundData.objects.count(), 0)
+
+        for entry in report['queued']:
+            self.assertEqual(run_job(entry['job_id']), IngestionJob.DONE)
+            self.assertEqual(self.client.get(entry['status_url']).json()['status'], IngestionJob.DONE)
+        self.assertEqual(self.holdings(), [('INE040A01034', 600.0)])
+        self.assertEqual(self.holdings(self.other_scheme), [('INE009A01021', 400.0)])
+
+    def test_sheets_are_matched_to_schemes_by_title(self):
+        direct = MutualFundScheme.objects.create(amc=self.amc, scheme_name='SBI Blue Chip Fund - Direct Plan')
+        UploadedFile.objects.create(amc=self.amc, scheme=direct, file='uploads/old.xlsx')
+        workbook = sbi_workbook(
+            # Matches both plans of the fund; the one uploaded to before wins
+            ('BLUECHIP', 'SBI BLUE CHIP FUND (An open ended equity scheme)', datetime.date(2025, 1, 31), [HDFC]),
+            ('BLUECHIP DIRECT', 'SBI Blue Chip Fund - Direct Plan', datetime.date(2025, 1, 31), [HDFC]),
+            ('SMALLCAP', 'Small cap', datetime.date(2025, 1, 31), [INFOSYS]),
+            ('NOTES', 'Disclaimer', None, [TCS]),
+        )
+        report = enqueue_workbook(self.amc, workbook, 'uploads/portfolio.xlsx',
+                                  sheet_schemes={'SMALLCAP': self.other_scheme.id, 'NOTES': 999999})
+
+        self.assertEqual([(entry['sheet'], entry['scheme_id']) for entry in report['queued']],
+                         [('BLUECHIP', direct.id), ('SMALLCAP', self.other_scheme.id)])
+        self.assertEqual([(entry['sheet'], entry['reason']) for entry in report['skipped']],
+                         [('BLUECHIP DIRECT', 'scheme already queued from another sheet'),
+                          ('NOTES', 'unknown scheme')])
+        self.assertEqual(report['unmatched'], [])
+        # A new scheme's UploadedFile points at its sheet; an existing one moves only once ingested
+        self.assertEqual(UploadedFile.objects.get(scheme=self.other_scheme).sheet_name, 'SMALLCAP')
+        self.assertEqual(UploadedFile.objects.get(scheme=direct).file.name, 'uploads/old.xlsx')
+        self.assertEqual(list(IngestionJob.objects.order_by('id').values_list('scheme_id', 'sheet_name')),
+                         [(direct.id, 'BLUECHIP'), (self.other_scheme.id, 'SMALLCAP')])
+
+
+class ReingestionTests(IngestionTestCase):
+    def test_reingest_parses_each_scheme_sheet_of_a_workbook(self):
+        workbook = sbi_workbook(('BLUECHIP', self.scheme.scheme_name, datetime.date(2025, 1, 31), [HDFC]),
+                                ('SMALLCAP', self.other_scheme.scheme_name, datetime.date(2025, 1, 31), [INFOSYS]))
+        response = self.client.post(reverse('upload_workbook'), {'amc': self.amc.id, 'file': workbook})
+        for entry in response.json()['data']['queued']:
+            run_job(entry['job_id'])
+        self.assertEqual(list(UploadedFile.objects.order_by('scheme_id').values_list('sheet_name', flat=True)),
+                         ['BLUECHIP', 'SMALLCAP'])
+
+        tasks = upload_tasks()
+        self.assertEqual([task[4] for task in tasks], ['BLUECHIP', 'SMALLCAP'])
+        schemes = MutualFundScheme.objects.in_bulk([task[2] for task in tasks])
+        for task in tasks:
+            _, writes, error = parse_upload(task)
+            self.assertIsNone(error)
+            for instruments, uploaded_file, summary in writes:
+                save_scheme_holdings(schemes[task[2]], instruments, uploaded_file, **summary)
+
+        self.assertEqual(self.holdings(), [('INE040A01034', 600.0)])
+        self.assertEqual(self.holdings(self.other_scheme), [('INE009A01021', 400.0)])
+        self.assertEqual(UploadedFile.objects.get(scheme=self.other_scheme).top_holdings,
+                         [{'instrument_name': 'Infosys Ltd.', 'nav_percentage': 40.0}])
+
+
+class DuplicateUploadTests(IngestionTestCase):
+    def test_identical_upload_while_queued_points_at_the_pending_job(self):
+        content = scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC]).read()
+        first = self.upload(SimpleUploadedFile('a.xlsx', content))
+        second = self.upload(SimpleUploadedFile('b.xlsx', content))
+        self.assertEqual(second.status_code, 202)
+        self.assertTrue(second.json()['duplicate'])
+        self.assertEqual(second.json()['job_id'], first.json()['job_id'])
+        self.assertEqual(IngestionJob.objects.count(), 1)
+        self.assertEqual(list(UploadEvent.objects.order_by('id').values_list('outcome', flat=True)),
+                         [UploadEvent.RECEIVED, UploadEvent.DUPLICATE])
+
+        run_job(first.json()['job_id'])
+        third = self.upload(SimpleUploadedFile('c.xlsx', content))
+        self.assertEqual(third.status_code, 200)
+        self.assertTrue(third.json()['duplicate'])
+        self.assertEqual(third.json()['data']['top_holdings'],
+                         [{'instrument_name': 'HDFC Bank Ltd.', 'nav_percentage': 60.0}])
+
+    def test_identical_upload_after_a_newer_one_is_queued_again(self):
+        first_content = scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC]).read()
+        self.upload(SimpleUploadedFile('a.xlsx', first_content))
+        self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [INFOSYS]))
+        again = self.upload(SimpleUploadedFile('a.xlsx', first_content))
+        self.assertNotIn('duplicate', again.json())
+        self.assertEqual(IngestionJob.objects.count(), 3)
+
+    def test_file_hash_is_taken_from_the_parsed_file(self):
+        response = self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC]))
+        job = IngestionJob.objects.get(id=response.json()['job_id'])
+        job.file_hash = 'not the hash of the stored file'
+        job.save()
+        run_job(job.id)
+
+        uploaded_file = UploadedFile.objects.get(scheme=self.scheme)
+        with uploaded_file.file.open('rb') as file:
+            self.assertEqual(uploaded_file.file_hash, file_content_hash(file))
+        job.refresh_from_db()
+        self.assertEqual(job.file_hash, uploaded_file.file_hash)
+
+
+class HoldingsExportTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        for portfolio_date, holdings in [(datetime.date(2025, 1, 31), [HDFC]), (datetime.date(2025, 2, 28), [INFOSYS])]:
+            run_job(self.upload(scheme_workbook(self.scheme, portfolio_date, holdings)).json()['job_id'])
+
+    def export(self, **params):
+        response = self.client.get(reverse('holdings_export_csv'), params)
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        return sorted((row['portfolio_date'], row['isin'], row['market_value']) for row in rows)
+
+    def test_export_is_the_current_holdings_with_their_portfolio_date(self):
+        self.assertEqual(self.export(), [('2025-02-28', 'INE009A01021', '400.0')])
+
+    def test_dates_select_stored_portfolios_by_portfolio_date(self):
+        self.assertEqual(self.export(date_to='2025-01-31'), [('2025-01-31', 'INE040A01034', '600.0')])
+        self.assertEqual(self.export(date_from='2025-01-01', scheme=self.scheme.id),
+                         [('2025-01-31', 'INE040A01034', '600.0'), ('2025-02-28', 'INE009A01021', '400.0')])
+        self.assertEqual(self.export(date_from='2025-01-01', isin='INE009A01021'),
+                         [('2025-02-28', 'INE009A01021', '400.0')])
+        self.assertEqual(self.export(date_from='2025-03-01'), [])
+
+    @override_settings(HOLDINGS_EXPORT_XLSX_MAX_ROWS=1)
+    def test_xlsx_above_the_row_limit_points_to_csv(self):
+        response = self.client.get(reverse('holdings_export_xlsx'))
+        self.assertEqual(response.status_code, 200)
+        sheet = load_workbook(io.BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual([row[6] for row in sheet.iter_rows(values_only=True)], ['isin', 'INE009A01021'])
+
+        response = self.client.get(reverse('holdings_export_xlsx'), {'date_from': '2025-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(reverse('holdings_export_csv'), response.json()['message'])
+
+    def test_invalid_date_is_rejected(self):
+        response = self.client.get(reverse('holdings_export_csv'), {'date_from': '31-01-2025'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['message'], 'date_from must be a date (YYYY-MM-DD).')
+
+
+class DiffWriteTests(IngestionTestCase):
+    def save(self, holdings):
+        changes = store_holdings(self.scheme, holdings)
+        return {key: changes[key] for key in ('inserted', 'updated', 'deleted', 'unchanged')}
+
+    def test_only_changed_holdings_are_written(self):
+        self.assertEqual(self.save([HDFC, INFOSYS]), {'inserted': 2, 'updated': 0, 'deleted': 0, 'unchanged': 0})
+        hdfc_id = MutualFundData.objects.get(isin=HDFC[1]).id
+
+        self.assertEqual(self.save([HDFC[:4] + (650.0, 65.0), TCS]),
+                         {'inserted': 1, 'updated': 1, 'deleted': 1, 'unchanged': 0})
+        self.assertEqual(self.holdings(), [('INE040A01034', 650.0), ('INE467B01029', 300.0)])
+        self.assertEqual(MutualFundData.objects.get(isin=HDFC[1]).id, hdfc_id)
+
+        self.assertEqual(self.save([HDFC[:4] + (650.0, 65.0), TCS]),
+                         {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 2})
+
+    @override_settings(MUTUAL_FUND_DATA_WRITE_MODE='replace')
+    def test_replace_mode_rewrites_every_row(self):
+        self.save([HDFC, INFOSYS])
+        self.assertEqual(self.save([HDFC, INFOSYS]), {'inserted': 2, 'updated': 0, 'deleted': 2, 'unchanged': 0})
+        self.assertEqual(self.holdings(), [('INE009A01021', 400.0), ('INE040A01034', 600.0)])
+
+    @override_settings(MUTUAL_FUND_DATA_BATCH_SIZE=2)
+    def test_batch_size_sets_the_rows_per_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.save([HDFC, INFOSYS, TCS])
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "upload_excel_')]
+        self.assertEqual(sum(sql.startswith('INSERT INTO "upload_excel_mutualfunddata"') for sql in inserts), 2)
+        self.assertEqual(sum(sql.startswith('INSERT INTO "upload_excel_snapshotholding"') for sql in inserts), 2)
+        self.assertEqual(MutualFundData.objects.filter(scheme=self.scheme).count(), 3)
+
+
+class HoldingsApiTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        store_holdings(self.scheme, [HDFC, INFOSYS, TCS])
+        store_holdings(self.other_scheme, [TCS])
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_follow_the_cursor_largest_market_value_first(self):
+        url = reverse('scheme_holdings', args=[self.scheme.id])
+        page = self.get(url, limit=2, fields='isin,market_value')
+        self.assertEqual(page['results'], [{'isin': 'INE040A01034', 'market_value': 600.0},
+                                           {'isin': 'INE009A01021', 'market_value': 400.0}])
+        page = self.get(url, limit=2, fields='isin', cursor=page['next_cursor'])
+        self.assertEqual(page, {'results': [{'isin': 'INE467B01029'}], 'next_cursor': None, 'limit': 2})
+
+    def test_filters_across_schemes(self):
+        page = self.get(reverse('holdings'), amc=self.amc.id, isin='INE467B01029', fields='scheme_id')
+        self.assertEqual(sorted(row['scheme_id'] for row in page['results']), [self.scheme.id, self.other_scheme.id])
+
+    def test_invalid_queries_are_rejected(self):
+        for params in ({'fields': 'isin,secret'}, {'cursor': 'not-a-cursor'}, {'scheme': 'x'}):
+            response = self.client.get(reverse('holdings'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('message', response.json())
+        self.assertEqual(self.client.get(reverse('scheme_holdings', args=[0])).status_code, 404)
+
+
+class OverlapTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        store_holdings(self.scheme, [HDFC, INFOSYS])
+        store_holdings(self.other_scheme, [HDFC, TCS])
+        self.addCleanup(clear_overlap_cache)
+
+    def overlap(self, **params):
+        response = self.client.get(reverse('overlap'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_overlap_of_an_amcs_schemes(self):
+        result = self.overlap(amc=self.amc.id, matrix=1, details=1)
+        self.assertEqual([scheme['holdings'] for scheme in result['schemes']], [2, 2])
+        self.assertEqual(result['pairs'], [{
+            'scheme_a': self.scheme.id, 'scheme_b': self.other_scheme.id, 'common_holdings': 1, 'weight_overlap': 60.0,
+            'common': [{'isin': 'INE040A01034', 'instrument_name': 'HDFC Bank Ltd.', 'weight_a': 60.0,
+                        'weight_b': 66.67}],
+        }])
+        self.assertEqual(result['matrix'], {'common_holdings': [[2, 1], [1, 2]],
+                                            'weight_overlap': [[100.0, 60.0], [60.0, 100.0]]})
+
+    def test_reingested_scheme_is_read_again(self):
+        params = {'scheme': [self.scheme.id, self.other_scheme.id]}
+        self.assertEqual(self.overlap(**params)['pairs'][0]['weight_overlap'], 60.0)
+        store_holdings(self.other_scheme, [INFOSYS, TCS], portfolio_date=datetime.date(2025, 2, 28))
+        self.assertEqual(self.overlap(**params)['pairs'][0]['weight_overlap'], 40.0)
+
+    def test_invalid_scheme_sets_are_rejected(self):
+        for params in ({'scheme': self.scheme.id}, {'scheme': [self.scheme.id, 0]}, {'amc': 'x'}):
+            response = self.client.get(reverse('overlap'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('message', response.json())
+
+
+class ExposureTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.jm = AMC.objects.create(name='JM Financial Mutual Fund')
+        self.jm_scheme = MutualFundScheme.objects.create(amc=self.jm, scheme_name='JM Flexicap Fund')
+        store_holdings(self.scheme, [HDFC, INFOSYS, TCS])
+        store_holdings(self.other_scheme, [TCS])
+        store_holdings(self.jm_scheme, [('TCS Ltd', 'INE467B01029', 'IT -  SOFTWARE', 10, 150.0, 15.0)])
+
+    def exposure(self, **params):
+        response = self.client.get(reverse('exposure'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_isin_exposure_per_amc_and_scheme(self):
+        result = self.exposure(isin='ine467b01029')
+        self.assertEqual((result['key'], result['label'], result['market_value'], result['schemes']),
+                         ('INE467B01029', 'Tata Consultancy Services Ltd.', 750.0, 3))
+        self.assertEqual([(amc['amc_id'], amc['market_value'], amc['schemes']) for amc in result['amcs']],
+                         [(self.amc.id, 600.0, 2), (self.jm.id, 150.0, 1)])
+        self.assertEqual(self.exposure(isin='INE467B01029', amc=self.jm.id)['market_value'], 150.0)
+
+    def test_industries_match_across_case_and_spacing(self):
+        result = self.exposure(industry='it - software')
+        self.assertEqual((result['key'], result['market_value'], result['holdings']), ('it - software', 1150.0, 4))
+        self.assertEqual([(row['scheme_id'], row['market_value']) for row in result['by_scheme']],
+                         [(self.scheme.id, 700.0), (self.other_scheme.id, 300.0), (self.jm_scheme.id, 150.0)])
+
+    def test_rebuilt_index_matches_the_incremental_one(self):
+        before = self.exposure(industry='IT - Software')
+        call_command('rebuild_exposure', stdout=io.StringIO())
+        self.assertEqual(self.exposure(industry='IT - Software'), before)
+
+    def test_exactly_one_of_isin_and_industry(self):
+        for params in ({}, {'isin': 'INE467B01029', 'industry': 'Banks'}):
+            response = self.client.get(reverse('exposure'), params)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['message'], 'Give exactly one of isin and industry.')
+
+
+class QueryIndexTests(IngestionTestCase):
+    def test_lookups_use_their_indexes(self):
+        holdings = MutualFundData.objects.filter(scheme=self.scheme)
+        self.assertIn('mfdata_scheme_value_idx', holdings.order_by('-market_value', 'id')[:10].explain())
+        self.assertIn('mfdata_scheme_type_idx', holdings.filter(instrument_type='Equity').explain())
+        self.assertIn('mfdata_instrument_scheme_idx',
+                      MutualFundData.objects.filter(instrument__isin='INE040A01034').explain())
+        # The uploadedfile_unique_scheme constraint's index
+        self.assertIn('USING INDEX', UploadedFile.objects.filter(scheme=self.scheme).explain())
+
+
+class SchemeSearchTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        MutualFundScheme.objects.create(amc=self.amc, scheme_name='SBI Magnum Midcap Fund')
+        self.url = reverse('get_schemes', args=[self.amc.id])
+        self.addCleanup(clear_scheme_indexes)
+
+    def search(self, **params):
+        return [scheme['scheme_name'] for scheme in self.client.get(self.url, params).json()['schemes']]
+
+    def test_prefix_matches_come_before_word_matches(self):
+        self.assertEqual(self.search(q='sbi  SMALL'), ['SBI Small Cap Fund'])
+        self.assertEqual(self.search(q='fund cap'), ['SBI Magnum Midcap Fund', 'SBI Small Cap Fund'])
+        response = self.client.get(self.url, {'q': 'sbi', 'limit': 2}).json()
+        self.assertEqual((len(response['schemes']), response['more']), (2, True))
+
+    def test_unchanged_scheme_list_revalidates_with_the_etag(self):
+        response = self.client.get(self.url, {'q': 'sbi'})
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, {'q': 'sbi'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        MutualFundScheme.objects.filter(id=self.scheme.id).update(scheme_name='SBI Bluechip Fund',
+                                                                  updated_at=now() + datetime.timedelta(seconds=1))
+        response = self.client.get(self.url, {'q': 'sbi'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('SBI Bluechip Fund', [scheme['scheme_name'] for scheme in response.json()['schemes']])
+
+
+class SummaryTests(IngestionTestCase):
+    def test_recompute_matches_the_upload_time_summary(self):
+        run_job(self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC, INFOSYS, TCS]))
+                .json()['job_id'])
+        uploaded_file = UploadedFile.objects.get(scheme=self.scheme)
+        parsed = (uploaded_file.category_total, uploaded_file.top_sectors, uploaded_file.top_holdings)
+        self.assertEqual(parsed[2][0], {'instrument_name': 'HDFC Bank Ltd.', 'nav_percentage': 60.0})
+
+        blank = {'category_total': {}, 'top_holdings': []}
+        UploadedFile.objects.filter(id=uploaded_file.id).update(**blank)
+        PortfolioSnapshot.objects.filter(scheme=self.scheme).update(**blank)
+        out = io.StringIO()
+        with self.assertNumQueries(7):
+            call_command('recompute_summaries', stdout=out)
+        self.assertIn('Recomputed the summaries of 1 upload(s).', out.getvalue())
+        uploaded_file.refresh_from_db()
+        snapshot = PortfolioSnapshot.objects.get(scheme=self.scheme)
+        self.assertEqual((uploaded_file.category_total, uploaded_file.top_sectors, uploaded_file.top_holdings), parsed)
+        self.assertEqual((snapshot.category_total, snapshot.top_sectors, snapshot.top_holdings), parsed)
+
+    def test_summary_comes_from_the_stored_rows(self):
+        # JM's layout groups the top sectors on the stored industry/rating
+        amc = AMC.objects.create(name='JM Financial Mutual Fund')
+        scheme = MutualFundScheme.objects.create(amc=amc, scheme_name='JM Flexicap Fund')
+        UploadedFile.objects.create(amc=amc, scheme=scheme, file='uploads/old.xlsx', category_total={'Equity': 1.0})
+        store_holdings(scheme, [TCS, HDFC, INFOSYS])
+        call_command('recompute_summaries', stdout=io.StringIO())
+        uploaded_file = UploadedFile.objects.get(scheme=scheme)
+        self.assertEqual(uploaded_file.top_sectors, [{'industry': 'IT - Software', 'investment': 700.0},
+                                                     {'industry': 'Banks', 'investment': 600.0}])
+        self.assertEqual([holding['instrument_name'] for holding in uploaded_file.top_holdings],
+                         ['HDFC Bank Ltd.', 'Infosys Ltd.', 'Tata Consultancy Services Ltd.'])
+        # A snapshot stored without its category sums keeps the stored category totals
+        self.assertEqual(uploaded_file.category_total, {'Equity': 1.0})
+        self.assertEqual(PortfolioSnapshot.objects.get(scheme=scheme).top_sectors, uploaded_file.top_sectors)
+
+
+class AnalyticsExportTests(IngestionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = os.path.join(self.media_root, 'exports')
+        run_job(self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC, INFOSYS])).json()['job_id'])
+
+    @unittest.skipUnless(parquet_engine_available(), "needs pyarrow or fastparquet")
+    def test_partition_and_manifest_read_back(self):
+        call_command('export_holdings', directory=self.root, stdout=io.StringIO())
+        path = os.path.join(f'amc_id={self.amc.id}', 'month=2025-01')
+        with open(os.path.join(self.root, MANIFEST)) as manifest:
+            self.assertEqual(json.load(manifest)[path]['month'], '2025-01')
+        df = pd.read_parquet(os.path.join(self.root, path, PARTITION_FILE))
+        self.assertEqual(sorted(zip(df['isin'], df['market_value'])),
+                         [('INE009A01021', 400.0), ('INE040A01034', 600.0)])
+        self.assertEqual(set(df['scheme_id']), {self.scheme.id})
+
+        out = io.StringIO()
+        call_command('export_holdings', directory=self.root, stdout=out)
+        self.assertIn('0 partition(s) written, 1 unchanged', out.getvalue())
+
+    @unittest.skipIf(parquet_engine_available(), "a Parquet engine is installed")
+    def test_missing_engine_is_a_clear_error(self):
+        with self.assertRaisesMessage(CommandError, 'pip install pyarrow'):
+            call_command('export_holdings', directory=self.root, stdout=io.StringIO())
+        self.assertFalse(os.path.exists(self.root))
+
+
+class NavAllParserTests(TestCase):
+    NAVALL = """Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date
+
+Open Ended Schemes(Equity Scheme - Large Cap Fund)
+
+360 ONE Mutual Fund
+
+152138;INF579M01AS6;-;360 ONE Focused Equity Fund - Direct Plan - Growth;48.1234;17-Oct-2025
+
+SBI Mutual Fund
+
+119598;INF200K01QX4;INF200K01QY2;SBI Blue Chip Fund - Direct Plan - Growth;N.A.;17-Oct-2025
+"""
+
+    def test_amc_names_starting_with_a_digit_are_headers(self):
+        records = list(iter_navall(self.NAVALL.splitlines()))
+        self.assertEqual([(record.amc, record.scheme_code, record.isin_reinvestment) for record in records],
+                         [('360 ONE Mutual Fund', 152138, ''), ('SBI Mutual Fund', 119598, 'INF200K01QY2')])
+        self.assertEqual(records[0].category, 'Open Ended Schemes(Equity Scheme - Large Cap Fund)')
+        self.assertEqual((records[0].nav, records[0].nav_date), (48.1234, datetime.date(2025, 10, 17)))
+        self.assertIsNone(records[1].nav)
+
+
+class AmfiRefreshTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.source = os.path.join(directory, 'NAVAll.txt')
+
+    def write(self, text):
+        with open(self.source, 'w') as navall:
+            navall.write(text)
+
+    def test_only_newer_navs_are_stored_and_unchanged_sources_are_skipped(self):
+        amc = AMC.objects.create(name='SBI Mutual Fund')
+        scheme = MutualFundScheme.objects.create(amc=amc, scheme_name='SBI Blue Chip Fund - Direct Plan - Growth')
+        self.write(NavAllParserTests.NAVALL)
+        counts = refresh_amfi(self.source)
+        self.assertEqual((counts['amfi_schemes_saved'], counts['navs_added'], counts['schemes_added']), (2, 2, 1))
+        self.assertEqual(AmfiScheme.objects.get(scheme_code=119598).scheme_id, scheme.id)
+        self.assertTrue(refresh_amfi(self.source)['not_modified'])
+
+        self.write(NavAllParserTests.NAVALL.replace('48.1234;17-Oct-2025', '48.5;18-Oct-2025'))
+        counts = refresh_amfi(self.source)
+        self.assertEqual((counts['not_modified'], counts['navs_added'], counts['navs_unchanged']), (False, 1, 1))
+        self.assertEqual(latest_navs(['INF579M01AS6'])['INF579M01AS6'],
+                         {'scheme_code': 152138, 'scheme_name': '360 ONE Focused Equity Fund - Direct Plan - Growth',
+                          'nav': 48.5, 'nav_date': datetime.date(2025, 10, 18)})
+
+
+class AmfiSyncTests(TestCase):
+    def test_only_new_amcs_and_schemes_are_inserted(self):
+        amc = AMC.objects.create(name='SBI Mutual Fund')
+        MutualFundScheme.objects.create(amc=amc, scheme_name='SBI Blue Chip Fund')
+        amc_data = {'SBI Mutual Fund': ['SBI Blue Chip Fund', 'SBI Small Cap Fund'],
+                    '360 ONE Mutual Fund': ['360 ONE Focused Equity Fund', '360 ONE Focused Equity Fund'],
+                    '': ['Nameless Fund']}
+        self.assertEqual(sync_schemes(amc_data), {'amcs_added': 1, 'amcs_unchanged': 1,
+                                                  'schemes_added': 2, 'schemes_unchanged': 1})
+        self.assertEqual(sorted(MutualFundScheme.objects.values_list('amc__name', 'scheme_name')),
+                         [('360 ONE Mutual Fund', '360 ONE Focused Equity Fund'),
+                          ('SBI Mutual Fund', 'SBI Blue Chip Fund'), ('SBI Mutual Fund', 'SBI Small Cap Fund')])
+
+        with self.assertNumQueries(4):  # two reads, no inserts, inside a savepoint
+            self.assertEqual(sync_schemes(amc_data), {'amcs_added': 0, 'amcs_unchanged': 2,
+                                                      'schemes_added': 0, 'schemes_unchanged': 3})
+
+
+class SqliteTuningTests(TestCase):
+    def test_pragmas_are_validated(self):
+        self.assertEqual(pragma_statements({'synchronous': 'normal', 'cache_size': -20000}),
+                         ['PRAGMA synchronous = normal', 'PRAGMA cache_size = -20000'])
+        # The journal mode is stored in the database file; only sqlite_journal_mode sets it
+        for pragmas in ({'cache_size': '1; DROP TABLE upload_excel_amc'}, {'cache size': 1}, {'journal_mode': 'wal'}):
+            with self.assertRaises(ValueError):
+                pragma_statements(pragmas)
+
+    @override_settings(SQLITE_PRAGMAS={'cache_size': -4000})
+    def test_new_connections_are_tuned(self):
+        mode = journal_mode(connection)
+        apply_pragmas(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4000)
+        self.assertEqual(journal_mode(connection), mode)
+
+    def test_journal_mode_is_switched_on_request(self):
+        path = os.path.join(tempfile.mkdtemp(), 'db.sqlite3')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        database = connection.copy(alias='journal_mode_test')
+        database.settings_dict = {**connection.settings_dict, 'NAME': path}
+        self.addCleanup(database.close)
+        self.assertEqual(journal_mode(database), 'delete')
+        self.assertEqual(journal_mode(database, 'wal'), 'wal')
+        with self.assertRaises(ValueError):
+            journal_mode(database, 'wal; DROP TABLE upload_excel_amc')
+
+
+class InstrumentTests(TestCase):
+    def setUp(self):
+        self.addCleanup(clear_instrument_cache)
+
+    def test_as_printed_name_replaces_a_lowercased_one(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ids = instrument_ids([('INE040A01034', 'hdfc bank ltd.', 'banks')])
+        self.assertEqual(Instrument.objects.get(id=ids['INE040A01034']).name, 'hdfc bank ltd.')
+
+        # The ISIN is cached now; the sheet's name is still weighed against the stored one
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(instrument_ids([('INE040A01034', 'HDFC Bank Ltd.', 'Banks')]), ids)
+        self.assertEqual(Instrument.objects.get(id=ids['INE040A01034']).name, 'HDFC Bank Ltd.')
+
+        with self.assertNumQueries(0):
+            instrument_ids([('INE040A01034', 'hdfc bank limited', 'banks')])
+        self.assertEqual(Instrument.objects.get(id=ids['INE040A01034']).name, 'HDFC Bank Ltd.')
+
+
+class SectionTaggingTests(TestCase):
+    SECTIONS = [('startswith', 'equity', 'Equity'), ('contains', 'debt', 'Debt'), ('exact', 'treps', 'Treps'),
+                ('word', 'reit', 'REITs')]
+    TERMINATORS = [('startswith', 'grand total')]
+
+    def test_first_matching_rule_wins_and_passthrough_keeps_the_category(self):
+        names = pd.Series(['equity & equity related', 'hdfc bank ltd.', 'equity linked debt', 'ncd of x',
+                           'treps', 'reit units', 'reits', None, 'grand total', 'notes'])
+        tags = tag_sections(names, self.SECTIONS, self.TERMINATORS, passthrough=['Treps'])
+        self.assertEqual(tags['section'].tolist(), ['Equity', None, 'Equity', None, 'Treps', 'REITs', None, None])
+        self.assertEqual(tags['category'].tolist(),
+                         ['Equity', 'Equity', 'Equity', 'Equity', 'Equity', 'REITs', 'REITs', 'REITs'])
+        self.assertEqual(tags['is_header'].tolist(), [True, False, True, False, True, True, False, False])
+
+        names = pd.Series(['debt instruments', 'ncd of x', 'treps', 'tbill'])
+        tags = tag_sections(names, self.SECTIONS, passthrough=['Treps'])
+        self.assertTrue(tags.equals(per_rule_sections(names, self.SECTIONS, passthrough=['Treps'])))
+        self.assertEqual(tags['category'].tolist(), ['Debt', 'Debt', 'Debt', 'Debt'])
+
+
+class WorkbookReaderTests(TestCase):
+    def test_streaming_reader_stops_at_the_terminator(self):
+        upload = sbi_workbook(('Portfolio', 'SBI Blue Chip Fund', datetime.datetime(2025, 1, 31), [HDFC, INFOSYS]))
+        with override_settings(PARSED_SHEET_CACHE=False):
+            df = read_portfolio_sheet(upload, header=None, name_column=['Name of Instrument',
+                                                                         'Name of the Instrument / Issuer'],
+                                      usecols=['Name of the Instrument / Issuer', 'ISIN'],
+                                      terminators=[('startswith', 'grand total')])
+        self.assertEqual(list(df.columns), ['Name of the Instrument / Issuer', 'ISIN'])
+        self.assertEqual(df['Name of the Instrument / Issuer'].tolist(),
+                         ['EQUITY & EQUITY RELATED', 'HDFC Bank Ltd.', 'Infosys Ltd.', 'Total'])
+        self.assertEqual(df.attrs['portfolio_date'], datetime.date(2025, 1, 31))
+
+
+class SheetCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def test_cached_sheet_reads_like_the_workbook(self):
+        upload = sbi_workbook(('Portfolio', 'SBI Blue Chip Fund', datetime.datetime(2025, 1, 31), [HDFC, INFOSYS]))
+        options = dict(header=5, name_column='Name of the Instrument / Issuer',
+                       terminators=[('startswith', 'grand total')])
+        with override_settings(PARSED_SHEET_CACHE=False):
+            fresh = read_portfolio_sheet(upload, **options)
+        with override_settings(PARSED_SHEET_CACHE=True, PARSED_SHEET_CACHE_DIR=self.cache_dir):
+            read_portfolio_sheet(upload, **options)
+            self.assertEqual(cache_stats()[0], 1)
+            cached = read_portfolio_sheet(upload, **options)
+        pd.testing.assert_frame_equal(cached, fresh)
+        self.assertEqual(cached.attrs['portfolio_date'], datetime.date(2025, 1, 31))
+
+    def test_entries_are_json_with_tagged_cells(self):
+        rows = [['Name', 'Value', 'When'], ['a', 1, datetime.datetime(2025, 1, 31, 10, 30)],
+                ['b', 0.1 + 0.2, datetime.date(2025, 2, 28)], ['', float('nan'), '']]
+        with override_settings(PARSED_SHEET_CACHE_DIR=self.cache_dir):
+            store_sheet('ab' * 32, rows, datetime.date(2025, 1, 31))
+            with open(cache_path('ab' * 32), encoding='utf-8') as file:
+                self.assertEqual(json.load(file)['rows'][1][2], {'datetime': '2025-01-31T10:30:00'})
+            loaded_rows, portfolio_date = load_sheet('ab' * 32)
+        self.assertEqual(loaded_rows[:3], rows[:3])
+        self.assertTrue(math.isnan(loaded_rows[3][1]))
+        self.assertEqual(portfolio_date, datetime.date(2025, 1, 31))
+
+    def test_unreadable_entry_is_a_miss(self):
+        with override_settings(PARSED_SHEET_CACHE_DIR=self.cache_dir):
+            os.makedirs(os.path.dirname(cache_path('cd' * 32)))
+            with open(cache_path('cd' * 32), 'wb') as file:
+                file.write(pickle.dumps(object()))
+            self.assertIsNone(load_sheet('cd' * 32))
+
+
+class SectionTaggingBenchmarkTests(IngestionTestCase):
+    def test_benchmark_checks_both_taggers_agree(self):
+        response = self.upload(scheme_workbook(self.scheme, datetime.date(2025, 1, 31), [HDFC, INFOSYS]))
+        run_job(response.json()['job_id'])
+        out = io.StringIO()
+        call_command('benchmark_section_tagging', repeat=1, stdout=out)
+        self.assertIn('SBI Mutual Fund: 1 sheet(s)', out.getvalue())
+        self.assertIn('tag every sheet identically', out.getvalue())
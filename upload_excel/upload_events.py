@@ -0,0 +1,80 @@
+# upload_events.py
+
+import datetime
+import time
+
+from django.db.models import Avg, Count, Max
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import UploadEvent
+
+HISTORY_FIELDS = ['id', 'created_at', 'outcome', 'file_hash', 'rows_parsed', 'rows_written',
+                  'queue_seconds', 'parse_seconds', 'write_seconds', 'message', 'uploaded_file_id', 'job_id']
+
+
+def rows_written(changes):
+    """Rows a save_scheme_holdings() call inserted, updated or deleted."""
+    return changes.get('inserted', 0) + changes.get('updated', 0) + changes.get('deleted', 0)
+
+
+def record_upload_event(amc, scheme, outcome, uploaded_file=None, job=None, file_hash=None, rows_parsed=None,
+                        changes=None, queue_seconds=None, parse_seconds=None, write_seconds=None, message=''):
+    """Append one UploadEvent (a single INSERT) and return it."""
+    return UploadEvent.objects.create(
+        amc=amc,
+        scheme=scheme,
+        outcome=outcome,
+        uploaded_file=uploaded_file,
+        job=job,
+        file_hash=file_hash or '',
+        rows_parsed=rows_parsed,
+        rows_written=rows_written(changes) if changes is not None else None,
+        queue_seconds=queue_seconds,
+        parse_seconds=parse_seconds,
+        write_seconds=write_seconds,
+        message=message[:255],
+    )
+
+
+def timed_writer(writer, timings, changes):
+    """
+    Wrap a save_scheme_holdings-like writer so the seconds spent in it are added
+    to timings["write"] and its returned counts to `changes`.
+    """
+    def write(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = writer(*args, **kwargs)
+        finally:
+            timings['write'] = timings.get('write', 0) + time.perf_counter() - started
+        if isinstance(result, dict):
+            for key, value in result.items():
+                changes[key] = changes.get(key, 0) + value if isinstance(value, int) else value
+        return result
+    return write
+
+
+def upload_history(scheme, limit=50):
+    """The scheme's latest upload events as dicts, newest first (one seek on uploadevent_scheme_time_idx)."""
+    return list(UploadEvent.objects.filter(scheme=scheme).order_by('-created_at', '-id').values(*HISTORY_FIELDS)[:limit])
+
+
+def timing_trends(days=30, amc=None):
+    """
+    Per day of the last `days` days: number of ingested uploads, rows parsed and
+    average / worst stage durations, oldest day first.
+    """
+    events = UploadEvent.objects.filter(outcome=UploadEvent.INGESTED,
+                                        created_at__gte=timezone.now() - datetime.timedelta(days=days))
+    if amc is not None:
+        events = events.filter(amc=amc)
+    return list(events.annotate(day=TruncDate('created_at')).values('day').annotate(
+        uploads=Count('id'),
+        avg_rows_parsed=Avg('rows_parsed'),
+        avg_queue_seconds=Avg('queue_seconds'),
+        avg_parse_seconds=Avg('parse_seconds'),
+        avg_write_seconds=Avg('write_seconds'),
+        max_parse_seconds=Max('parse_seconds'),
+        max_write_seconds=Max('write_seconds'),
+    ).order_by('day'))
@@ -0,0 +1,53 @@
+# upload_handlers.py
+
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class ContentHashMixin:
+    """
+    Hash an uploaded file while its chunks stream in.
+
+    The finished file gets a `content_hash` attribute (SHA-256 hex digest), so the
+    view can compare it with the last ingested upload without reading the file again.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(ContentHashMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(ContentHashMixin, TemporaryFileUploadHandler):
+    pass
+
+
+def file_content_hash(file):
+    """SHA-256 of a file: the hash computed during the upload, or read from the file."""
+    content_hash = getattr(file, 'content_hash', None)
+    if content_hash:
+        return content_hash
+    hasher = hashlib.sha256()
+    file.seek(0)
+    if hasattr(file, 'chunks'):
+        chunks = file.chunks()
+    else:
+        chunks = iter(lambda: file.read(1024 * 1024), b'')
+    for chunk in chunks:
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
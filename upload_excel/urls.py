@@ -1,8 +1,18 @@
 from django.urls import path
-from .views import upload_file_view, get_schemes,success_page
+from .views import (upload_file_view, upload_workbook_view, job_status_view, get_schemes, success_page,
+                    scheme_holdings_view, holdings_view, overlap_view,
+                    exposure_view, holdings_export_view)
 
 urlpatterns = [
     path("", upload_file_view, name="upload_file"),
+    path("upload-workbook/", upload_workbook_view, name="upload_workbook"),
+    path("jobs/<int:job_id>/", job_status_view, name="job_status"),
     path('success_page', success_page, name= 'success_page'),
     path("get-schemes/<int:amc_id>/", get_schemes, name="get_schemes"),
+    path("schemes/<int:scheme_id>/holdings/", scheme_holdings_view, name="scheme_holdings"),
+    path("holdings/", holdings_view, name="holdings"),
+    path("holdings/export.csv", holdings_export_view, {"file_format": "csv"}, name="holdings_export_csv"),
+    path("holdings/export.xlsx", holdings_export_view, {"file_format": "xlsx"}, name="holdings_export_xlsx"),
+    path("overlap/", overlap_view, name="overlap"),
+    path("exposure/", exposure_view, name="exposure"),
 ]
@@ -1,12 +1,24 @@
 # from django.shortcuts import render, redirect
-from django.http import HttpResponse
+import tempfile
+from django.http import HttpResponse, FileResponse, StreamingHttpResponse
 import matplotlib.pyplot as plt
 from django.http import JsonResponse
 from django.utils.timezone import now
-from .models import UploadedFile, AMC, MutualFundScheme, MutualFundData
-from .forms import UploadFileForm
-from .excel_processing import process_amc_excel_file
-from django.shortcuts import render, redirect
+from .models import UploadedFile, AMC, MutualFundScheme, MutualFundData, IngestionJob, UploadEvent
+from .forms import UploadFileForm, UploadWorkbookForm
+from .workbook_ingestion import enqueue_workbook
+from .jobs import enqueue_upload, job_payload, pending_upload, store_upload, upload_summary
+from .upload_handlers import file_content_hash
+from .upload_events import record_upload_event
+from .holdings_api import InvalidQuery, holdings_page
+from .exposure import exposure_query
+from .holdings_export import export_filename, export_queryset, iter_csv, write_xlsx, xlsx_row_limit
+from .overlap import overlap_query
+from .scheme_search import parse_limit as parse_scheme_limit, scheme_index, scheme_list_stamp, search_etag
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
 def upload_file_view(request):
     amcs = AMC.objects.all()
@@ -18,55 +30,56 @@ def upload_file_view(request):
             scheme = form.cleaned_data["scheme"]  # Get selected Scheme
             uploaded_file = form.cleaned_data["file"]  # Get uploaded file
 
+            file_hash = file_content_hash(uploaded_file)
+
             # Check if an entry already exists for the same Scheme
             existing_entry = UploadedFile.objects.filter(scheme=scheme).first()
 
-            if existing_entry:
-                # Update the existing entry (Replace old file & update date)
-                existing_entry.file = uploaded_file
-               
-                timestamp = now().strftime('%Y-%m-%d %H:%M:%S')
-                existing_entry.update_logs = f"[{timestamp}],\n" + (existing_entry.update_logs or "") 
-                existing_entry.save()
-            else:
+            if existing_entry and existing_entry.file_hash == file_hash:
+                # Byte-identical to the file already ingested: no parse, no rewrite
+                record_upload_event(amc, scheme, UploadEvent.DUPLICATE, uploaded_file=existing_entry,
+                                    file_hash=file_hash)
+                return JsonResponse({
+                    "data": upload_summary(existing_entry),
+                    "duplicate": True,
+                    "message": "This file was already ingested for the scheme; returning the stored summary.",
+                })
+
+            pending_job = pending_upload(scheme, file_hash)
+            if pending_job:
+                # Byte-identical to a file still waiting to be parsed: point at that job
+                record_upload_event(amc, scheme, UploadEvent.DUPLICATE, uploaded_file=existing_entry,
+                                    job=pending_job, file_hash=file_hash)
+                return JsonResponse({
+                    "job_id": pending_job.id,
+                    "status": pending_job.status,
+                    "status_url": reverse("job_status", args=[pending_job.id]),
+                    "duplicate": True,
+                    "message": "This file is already queued for the scheme.",
+                }, status=202)
+
+            file_name = store_upload(uploaded_file)
+            if not existing_entry:
                 # Create a new entry if it doesn’t exist
-                UploadedFile.objects.create(
+                existing_entry = UploadedFile.objects.create(
                     amc=amc,
                     scheme=scheme,
-                    file=uploaded_file,
-                    update_logs=now(),
+                    file=file_name,
                 )
+            # An existing entry keeps its file until the job has ingested the new one as the
+            # scheme's current holdings (an older month only adds a snapshot)
+
+            # Parsing happens in the run_ingestion_worker command; poll the status URL for the result
+            job = enqueue_upload(amc, scheme, existing_entry, file_hash, file_name=file_name)
+            record_upload_event(amc, scheme, UploadEvent.RECEIVED, uploaded_file=existing_entry, job=job,
+                                file_hash=file_hash)
 
-             # Trigger processing function based on AMC
-            process_amc_excel_file(amc, scheme, uploaded_file)
-            
-            
-            updated_entry = UploadedFile.objects.filter(scheme=scheme).first()   
-             # Prepare JSON response with selected scheme data
-            result = {
-                #"scheme": scheme.name,  # Assuming scheme has a name field
-                #"amc": amc.name,  # Assuming AMC has a name field
-                #"file_url": existing_entry.file.url if existing_entry.file else None,
-                #"total_market_value": existing_entry.total_market_value,
-                # "equity_total": existing_entry.equity_total,
-                # "debt_total": existing_entry.debt_total,
-                # "other_total": existing_entry.other_total,
-                "category_total": updated_entry.category_total,
-                "top_sectors": updated_entry.top_sectors,
-                "top_holdings": updated_entry.top_holdings,
-                "created_at": updated_entry.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                #"update_logs": existing_entry.update_logs
-            }
-
-            return JsonResponse({"data": result, "message": "Scheme data fetched successfully!"})
-
-        print("File uploaded successfully message from view!")
-            
-            
-            
-
-            #return redirect("success_page")  # Redirect after successful upload
-            
+            return JsonResponse({
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": reverse("job_status", args=[job.id]),
+                "message": "File uploaded, processing queued.",
+            }, status=202)
 
     else:
         form = UploadFileForm()
@@ -74,62 +87,142 @@ def upload_file_view(request):
     return render(request, "upload.html", {"form": form, "amcs": amcs})
 
 
-def get_schemes(request, amc_id):
-    schemes = MutualFundScheme.objects.filter(amc_id=amc_id).values("id", "scheme_name")
-    return JsonResponse({"schemes": list(schemes)})
-    print(schemes)
+def upload_workbook_view(request):
+    """Queue a whole "Monthly Portfolio of Schemes" workbook, one IngestionJob per matched sheet."""
+    if request.method != "POST":
+        return redirect("upload_file")
+
+    form = UploadWorkbookForm(request.POST, request.FILES)
+    if not form.is_valid():
+        return JsonResponse({"errors": form.errors, "message": "Invalid workbook upload."}, status=400)
+
+    amc = form.cleaned_data["amc"]
+    uploaded_file = form.cleaned_data["file"]
+
+    # Store the workbook once; the job of every matched sheet parses it
+    file_name = store_upload(uploaded_file)
+
+    # Only the sheet titles are read here; parsing happens in the run_ingestion_worker command
+    report = enqueue_workbook(amc, uploaded_file, file_name)
+    for entry in report["queued"]:
+        entry["status_url"] = reverse("job_status", args=[entry["job_id"]])
+    return JsonResponse({
+        "data": report,
+        "message": f"Workbook uploaded, {len(report['queued'])} sheet(s) queued.",
+    }, status=202)
 
 
-def success_page(request):
-     return HttpResponse('File uploaded successfully!')
+def job_status_view(request, job_id):
+    """Progress of a queued upload, with its category_total/top_sectors/top_holdings once done."""
+    job = get_object_or_404(IngestionJob.objects.select_related("scheme"), id=job_id)
+    return JsonResponse(job_payload(job))
 
 
+def holdings_response(request, scheme_id=None):
+    try:
+        return JsonResponse(holdings_page(request.GET, scheme_id=scheme_id))
+    except InvalidQuery as e:
+        return JsonResponse({"message": str(e)}, status=400)
 
 
+def scheme_holdings_view(request, scheme_id):
+    """
+    Holdings of one scheme, largest market value first, one page at a time.
+    ?fields=a,b&instrument_type=&industry_rating=&isin=&limit=&cursor= (see holdings_api.holdings_page).
+    """
+    get_object_or_404(MutualFundScheme, id=scheme_id)
+    return holdings_response(request, scheme_id)
 
 
-   
+def holdings_view(request):
+    """Holdings across schemes, optionally filtered by ?amc= and ?scheme=, paginated like scheme_holdings_view."""
+    return holdings_response(request)
 
-# def process_amc_excel_file(amc, scheme, file):
-#     """
-#     Determines which function to call based on the AMC.
-#     """
-#     amc_functions = {
-#         "Aditya Birla Sun Life Mutual Fund": process_48kc_excel,
-#        # "AnotherAMC": process_another_amc_excel,
-#     }
-#     print(amc.name)
-#     processing_function = amc_functions.get(amc.name, default_excel_processing)
-#     processing_function(file, scheme)
 
-# def process_48kc_excel(file, scheme):
-    
-#     print("Processes the Excel file for AMC  and stores data in MutualFundData.")
-    
-#     df = pd.read_excel(file)
-
-#     for _, row in df.iterrows():
-#         column1 = row["Column1"]
-#         column2 = row["Column2"]
-
-#         # Check if data exists for this scheme
-#         existing_entry = MutualFundData.objects.filter(scheme=scheme, column1=column1).first()
-
-#         if existing_entry:
-#             existing_entry.column2 = column2
-#             existing_entry.processed_at = now()
-#             existing_entry.save()
-#         else:
-#             MutualFundData.objects.create(
-#                 scheme=scheme,
-#                 column1=column1,
-#                 column2=column2,
-#                 processed_at=now(),
-#             )
-#         print("Data saved successfully!")
-# def default_excel_processing(file, scheme):
-#     """
-#     Default function for AMCs without specific processing logic.
-#     """
-#     print("Default processing for AMC")
-#     print(f"Processing file for {scheme.scheme_name} (Default method)")
\ No newline at end of file
+def overlap_view(request):
+    """
+    Pairwise ISIN overlap of the current holdings of ?scheme= (repeatable) and of
+    every scheme of ?amc=; &matrix=1 adds the N x N matrices and &details=1 the
+    shared holdings of each pair (see overlap.portfolio_overlap).
+    """
+    try:
+        return JsonResponse(overlap_query(request.GET))
+    except InvalidQuery as e:
+        return JsonResponse({"message": str(e)}, status=400)
+
+
+def holdings_export_view(request, file_format):
+    """
+    The current holdings matching ?amc=&scheme=&instrument_type=, or with ?date_from= /
+    ?date_to= those of every stored portfolio dated in the range (see
+    holdings_export.export_queryset), as a CSV or XLSX download. Rows are read
+    in chunks and CSV is streamed as it is written. XLSX is not streamed: a
+    workbook is a zip archive that is only complete once saved, so the whole file
+    is built in a temporary file before the response starts, and exports of more
+    than HOLDINGS_EXPORT_XLSX_MAX_ROWS rows are refused in favour of CSV.
+    """
+    try:
+        holdings = export_queryset(request.GET)
+    except InvalidQuery as e:
+        return JsonResponse({"message": str(e)}, status=400)
+
+    if file_format == "csv":
+        response = StreamingHttpResponse(iter_csv(holdings), content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="{export_filename("csv")}"'
+        return response
+
+    limit = xlsx_row_limit()
+    if holdings[:limit + 1].count() > limit:
+        return JsonResponse({"message": f"More than {limit} rows match; narrow the filters or download "
+                                        f"{reverse('holdings_export_csv')} instead."}, status=400)
+
+    workbook = tempfile.TemporaryFile()
+    write_xlsx(holdings, workbook)
+    workbook.seek(0)
+    return FileResponse(workbook, as_attachment=True, filename=export_filename("xlsx"),
+                        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+def exposure_view(request):
+    """
+    Exposure of the schemes to one ?isin= or ?industry=, in total, per AMC and per
+    scheme, optionally only for ?amc= / ?scheme= (see exposure.exposure).
+    """
+    try:
+        return JsonResponse(exposure_query(request.GET))
+    except InvalidQuery as e:
+        return JsonResponse({"message": str(e)}, status=400)
+
+
+def scheme_search_stamp(request, amc_id):
+    """scheme_list_stamp of the AMC, read once per request (ETag, Last-Modified and the index share it)."""
+    if not hasattr(request, "_scheme_stamp"):
+        request._scheme_stamp = scheme_list_stamp(amc_id)
+    return request._scheme_stamp
+
+
+def get_schemes_etag(request, amc_id):
+    return search_etag(amc_id, scheme_search_stamp(request, amc_id), request.GET.get("q", ""),
+                       parse_scheme_limit(request.GET.get("limit")))
+
+
+def get_schemes_last_modified(request, amc_id):
+    return scheme_search_stamp(request, amc_id)[1]
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=get_schemes_etag, last_modified_func=get_schemes_last_modified)
+def get_schemes(request, amc_id):
+    """
+    Schemes of an AMC matching ?q= (name prefix first, then names containing every word),
+    at most ?limit= of them; "more" tells the picker to ask for a narrower search.
+    Served from an in-memory index and revalidated by the browser with ETag / Last-Modified.
+    """
+    index = scheme_index(amc_id, scheme_search_stamp(request, amc_id))
+    schemes, more = index.search(request.GET.get("q", ""), parse_scheme_limit(request.GET.get("limit")))
+    return JsonResponse({"schemes": [{"id": scheme_id, "scheme_name": name} for scheme_id, name in schemes],
+                         "more": more})
+
+
+def success_page(request):
+     return HttpResponse('File uploaded successfully!')
@@ -0,0 +1,134 @@
+# workbook_ingestion.py
+
+import logging
+import re
+
+from .jobs import enqueue_upload
+from .models import MutualFundScheme, UploadEvent, UploadedFile
+from .upload_events import record_upload_event
+from .workbook_reader import open_workbook
+
+logger = logging.getLogger(__name__)
+
+TITLE_ROWS = 6  # Rows at the top of a sheet searched for the scheme title
+
+
+def normalize_scheme_name(name):
+    """Lowercase, '&' -> 'and', punctuation dropped: 'SBI BLUE CHIP FUND-DIRECT' -> 'sbi blue chip fund direct'."""
+    name = str(name).lower().replace('&', ' and ')
+    return ' '.join(re.findall(r'[a-z0-9]+', name))
+
+
+def sheet_titles(sheet):
+    """Candidate scheme titles of a sheet: its tab name and the text cells of its first rows."""
+    titles = [sheet.title]
+    for row in sheet.iter_rows(max_row=TITLE_ROWS, values_only=True):
+        for value in row:
+            if isinstance(value, str) and value.strip():
+                # "JM Flexicap Fund (An open ended dynamic equity scheme...)"
+                titles.append(value.split('(')[0])
+                titles.append(value)
+    return titles
+
+
+def build_scheme_index(amc):
+    """
+    Normalized (name, id) pairs for the AMC's schemes, loaded once per workbook.
+
+    Schemes that already have an UploadedFile come first so a fund keeps landing on
+    the plan it was uploaded to before; the rest are ordered by id.
+    """
+    uploaded = set(UploadedFile.objects.filter(amc=amc).values_list('scheme_id', flat=True))
+    index = [(normalize_scheme_name(name), scheme_id)
+             for scheme_id, name in MutualFundScheme.objects.filter(amc=amc).values_list('id', 'scheme_name')]
+    index.sort(key=lambda item: (item[1] not in uploaded, item[1]))
+    return index
+
+
+def match_sheet_scheme(sheet, scheme_index, amc_name=''):
+    """
+    Return the id of the scheme a sheet belongs to, or None.
+
+    A scheme matches a title when its normalized name equals the title or starts
+    with it; the longest matching title wins. Titles that are just (part of) the
+    AMC name, or a single word, are ignored.
+    """
+    amc_name = normalize_scheme_name(amc_name)
+    best_title, best_scheme = '', None
+    for title in sheet_titles(sheet):
+        title = normalize_scheme_name(title)
+        if len(title) <= len(best_title) or ' ' not in title or amc_name.startswith(title):
+            continue
+        for name, scheme_id in scheme_index:
+            if name == title or name.startswith(title + ' '):
+                best_title, best_scheme = title, scheme_id
+                break
+    return best_scheme
+
+
+def record_upload(amc, scheme, file_name, sheet_name):
+    """
+    The scheme's UploadedFile, created pointing at its sheet of the stored workbook
+    if needed. An existing one is moved to the sheet by the job, once ingested.
+    """
+    uploaded_file = UploadedFile.objects.filter(scheme=scheme).first()
+    if not uploaded_file:
+        uploaded_file = UploadedFile.objects.create(
+            amc=amc,
+            scheme=scheme,
+            file=file_name,
+            sheet_name=sheet_name,
+        )
+    return uploaded_file
+
+
+def enqueue_workbook(amc, file, file_name, sheet_schemes=None):
+    """
+    Queue every sheet of a "Monthly Portfolio of Schemes" workbook for parsing.
+
+    The workbook is opened once to match each sheet to its MutualFundScheme
+    (sheet_schemes may map sheet names to scheme ids to override the matching);
+    each matched scheme gets an IngestionJob that parses its sheet of the stored
+    workbook `file_name` in the run_ingestion_worker command.
+
+    Returns {"queued": [...], "skipped": [...], "unmatched": [...]}.
+    """
+    report = {"queued": [], "skipped": [], "unmatched": []}
+    sheet_schemes = sheet_schemes or {}
+    scheme_index = build_scheme_index(amc)
+
+    workbook = open_workbook(file)
+    try:
+        matches = []
+        for sheet in workbook.worksheets:
+            scheme_id = sheet_schemes.get(sheet.title) or match_sheet_scheme(sheet, scheme_index, amc.name)
+            if scheme_id is None:
+                report["unmatched"].append(sheet.title)
+            else:
+                matches.append((sheet.title, scheme_id))
+    finally:
+        workbook.close()
+
+    schemes = MutualFundScheme.objects.in_bulk([scheme_id for _, scheme_id in matches])
+    seen = set()
+    for title, scheme_id in matches:
+        scheme = schemes.get(scheme_id)
+        entry = {"sheet": title, "scheme_id": scheme_id, "scheme": scheme.scheme_name if scheme else None}
+        if scheme is None:
+            report["skipped"].append({**entry, "reason": "unknown scheme"})
+            continue
+        if scheme_id in seen:
+            report["skipped"].append({**entry, "reason": "scheme already queued from another sheet"})
+            continue
+        seen.add(scheme_id)
+
+        uploaded_file = record_upload(amc, scheme, file_name, title)
+        # No file hash: the workbook's hash says nothing about this scheme's sheet
+        job = enqueue_upload(amc, scheme, uploaded_file, file_name=file_name, sheet_name=title)
+        record_upload_event(amc, scheme, UploadEvent.RECEIVED, uploaded_file=uploaded_file, job=job,
+                            message=f"sheet {title}")
+        report["queued"].append({**entry, "job_id": job.id, "status": job.status})
+
+    logger.info("Workbook %s: %d sheet(s) queued, %d skipped, %d unmatched", file_name, len(report["queued"]),
+                len(report["skipped"]), len(report["unmatched"]))
+    return report
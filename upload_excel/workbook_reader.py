@@ -0,0 +1,261 @@
+# workbook_reader.py
+
+import datetime
+import re
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+from openpyxl.worksheet.worksheet import Worksheet
+from pandas.io.parsers import TextParser
+
+from .section_tagging import compile_rules
+from .sheet_cache import cache_enabled, load_sheet, sheet_cache_key, store_sheet
+from .upload_handlers import file_content_hash
+
+
+# Rows above the table searched for the portfolio date when the header row is not known
+TITLE_ROWS = 10
+
+MONTHS = {name: number for number, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+
+# "31.01.2025" / "31-01-2025", "Jan 31,2025" / "January 31, 2025", "31 Jan 2025" / "31st January, 2025"
+DATE_PATTERNS = [
+    (re.compile(r'\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b'), ('day', 'month', 'year')),
+    (re.compile(r'\b([A-Za-z]{3,9})\.?\s*(\d{1,2})\s*,?\s*(\d{4})\b'), ('month', 'day', 'year')),
+    (re.compile(r'\b(\d{1,2})(?:st|nd|rd|th)?[\s-]+([A-Za-z]{3,9})\.?[\s,-]+(\d{4})\b'), ('day', 'month', 'year')),
+]
+
+
+def streaming_enabled():
+    """Whether uploads are read with the streaming reader (settings.EXCEL_STREAMING_READER)."""
+    return getattr(settings, 'EXCEL_STREAMING_READER', True)
+
+
+def open_workbook(file):
+    """Open an upload in openpyxl read-only mode, the same way pandas does."""
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return load_workbook(file, read_only=True, data_only=True, keep_links=False)
+
+
+def convert_cell(cell):
+    """Convert an openpyxl cell exactly like pandas' openpyxl reader does."""
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        if value == cell.value:
+            return value
+        return float(cell.value)
+    return cell.value
+
+
+def clean_column_name(value):
+    return str(value).strip().replace('\n', ' ')
+
+
+def column_selector(usecols):
+    """
+    Turn usecols into a predicate on the cleaned column name. usecols is a predicate,
+    or a list of column names and compiled regexes (matched from the start of the name).
+    """
+    if usecols is None:
+        return lambda name: True
+    if callable(usecols):
+        return usecols
+    wanted = {clean_column_name(column) for column in usecols if isinstance(column, str)}
+    patterns = [column for column in usecols if isinstance(column, re.Pattern)]
+    return lambda name: name in wanted or any(pattern.match(name) for pattern in patterns)
+
+
+def name_column_index(values, name_column):
+    """Position of the name column (a header name or a list of aliases) in a row, or None."""
+    cleaned = [clean_column_name(value) for value in values]
+    for name in ([name_column] if isinstance(name_column, str) else name_column or []):
+        if name in cleaned:
+            return cleaned.index(name)
+    return None
+
+
+def iter_table_rows(sheet, header, usecols=None, name_column=None, terminators=()):
+    """
+    Lazily yield the holdings table of `sheet`, one normalized row (list) at a time.
+
+    The first row yielded is the header row (row `header` of the sheet, like
+    pd.read_excel(header=header); with header=None, the first row containing the
+    `name_column`). Only the columns accepted by `usecols` are built.
+    Iteration stops before the first row whose `name_column` cell matches one of the
+    `terminators`, so footnotes after "Grand Total" are never read. Blank rows are
+    only emitted when more data follows them, matching pandas' trailing-row trim.
+    """
+    if hasattr(sheet, 'reset_dimensions'):
+        sheet.reset_dimensions()  # read-only sheets may carry a stale dimension
+    rows = sheet.iter_rows()
+
+    if header is None:
+        for header_row in rows:
+            header_values = [convert_cell(cell) for cell in header_row]
+            if name_column_index(header_values, name_column) is not None:
+                break
+        else:
+            return
+    else:
+        for _ in range(header):
+            if next(rows, None) is None:
+                return
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        header_values = [convert_cell(cell) for cell in header_row]
+
+    accept = column_selector(usecols)
+    indexes = [i for i, value in enumerate(header_values) if value != '' and accept(clean_column_name(value))]
+    yield [header_values[i] for i in indexes]
+
+    name_index = name_column_index(header_values, name_column) if terminators else None
+    terminator = compile_rules(tuple(tuple(rule) for rule in terminators)) if terminators else None
+
+    pending_blank = []
+    for row in rows:
+        if name_index is not None and name_index < len(row):
+            name = str(convert_cell(row[name_index])).strip().lower()
+            if terminator.match(name):
+                return
+
+        if all(cell.value is None or cell.value == '' for cell in row):
+            pending_blank.append([''] * len(indexes))
+            continue
+        if pending_blank:
+            yield from pending_blank
+            pending_blank = []
+        yield [convert_cell(row[i]) if i < len(row) else '' for i in indexes]
+
+
+def parse_date_text(text):
+    """The first date written out in `text` (see DATE_PATTERNS), or None."""
+    for pattern, parts in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            values = dict(zip(parts, match.groups()))
+            month = values['month']
+            month = int(month) if month.isdigit() else MONTHS.get(month[:3].lower())
+            try:
+                return datetime.date(int(values['year']), month, int(values['day']))
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def find_portfolio_date(rows):
+    """The portfolio date stated in the title rows of a sheet (a date cell or date text), or None."""
+    for row in rows:
+        for value in row:
+            if isinstance(value, datetime.datetime):
+                return value.date()
+            if isinstance(value, datetime.date):
+                return value
+            if isinstance(value, str):
+                date = parse_date_text(value)
+                if date:
+                    return date
+    return None
+
+
+def title_row_count(header):
+    return TITLE_ROWS if header is None else header
+
+
+def is_worksheet(file):
+    """True for an openpyxl worksheet (as opposed to an uploaded workbook file)."""
+    return isinstance(file, (Worksheet, ReadOnlyWorksheet))
+
+
+def rows_to_frame(rows):
+    """Type streamed rows with pandas' own TextParser, as pd.read_excel would."""
+    if not rows:
+        return pd.DataFrame()
+    parser = TextParser(rows, header=0, skip_blank_lines=False)
+    return parser.read()
+
+
+def table_frame(rows, portfolio_date):
+    df = rows_to_frame(rows)
+    df.attrs['portfolio_date'] = portfolio_date
+    return df
+
+
+def worksheet_table(sheet, header, usecols=None, name_column=None, terminators=()):
+    """(rows, portfolio_date) of an open worksheet: its streamed table rows and the date in its title rows."""
+    rows = list(iter_table_rows(sheet, header, usecols, name_column, terminators))
+    return rows, find_portfolio_date(sheet.iter_rows(max_row=title_row_count(header), values_only=True))
+
+
+def read_worksheet(sheet, header, usecols=None, name_column=None, terminators=()):
+    """The holdings table of an open worksheet, with its portfolio date in df.attrs['portfolio_date']."""
+    return table_frame(*worksheet_table(sheet, header, usecols, name_column, terminators))
+
+
+def read_table(file, header, usecols=None, name_column=None, terminators=(), sheet_name=None):
+    """worksheet_table() of a sheet (the first one by default) of an uploaded workbook."""
+    workbook = open_workbook(file)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        return worksheet_table(sheet, header, usecols, name_column, terminators)
+    finally:
+        workbook.close()
+
+
+def read_sheet(file, header, usecols=None, name_column=None, terminators=(), sheet_name=None):
+    if not streaming_enabled():
+        title = pd.read_excel(file, header=None, nrows=title_row_count(header), sheet_name=sheet_name or 0)
+        file.seek(0)
+        if header is None:
+            raw = pd.read_excel(file, header=None, sheet_name=sheet_name or 0)
+            header = next((i for i, row in enumerate(raw.itertuples(index=False))
+                           if name_column_index([value for value in row if pd.notna(value)], name_column) is not None), 0)
+            file.seek(0)
+        df = pd.read_excel(file, header=header, sheet_name=sheet_name or 0)
+        df.attrs['portfolio_date'] = find_portfolio_date(title.itertuples(index=False))
+        return df
+    return table_frame(*read_table(file, header, usecols, name_column, terminators, sheet_name))
+
+
+def read_portfolio_sheet(file, header, usecols=None, name_column=None, terminators=(), sheet_name=None):
+    """
+    Read the holdings table of an uploaded workbook into a DataFrame.
+
+    `file` may also be a worksheet of a workbook that is already open (see
+    workbook_ingestion), in which case it is always streamed.
+
+    With the streaming reader (the default) the sheet is iterated in openpyxl
+    read-only mode, only the used columns are built and reading stops at the
+    terminator row; the rows are then typed by pandas' own TextParser so the
+    frame matches what pd.read_excel would have produced for those rows.
+    Otherwise this is pd.read_excel(file, header=header).
+
+    `name_column` may be a list of aliases; header=None finds the header row by it.
+    The date found in the title rows above the table (see find_portfolio_date) is
+    returned in df.attrs['portfolio_date'].
+
+    With the streaming reader, uploaded files go through the parsed-sheet cache
+    (see sheet_cache): the streamed rows of a workbook read before with the same
+    options are loaded from there instead of from openpyxl.
+    """
+    if is_worksheet(file):
+        return read_worksheet(file, header, usecols, name_column, terminators)
+    if not cache_enabled() or not streaming_enabled():
+        return read_sheet(file, header, usecols, name_column, terminators, sheet_name)
+
+    key = sheet_cache_key(file_content_hash(file), sheet_name or 0, header=header, usecols=usecols,
+                          name_column=name_column, terminators=terminators)
+    table = load_sheet(key)
+    if table is None:
+        table = read_table(file, header, usecols, name_column, terminators, sheet_name)
+        store_sheet(key, *table)
+    return table_frame(*table)